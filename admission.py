@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Admission control, deadlines and graceful degradation for expensive requests.
+
+Every route or isochrone request takes a slot in the REQUESTS lane, and a
+route starting outside the cached areas (OSM network + buildings download)
+also takes one in the much smaller DOWNLOADS lane. Tile cache misses have a
+TILES lane of their own, so panning a map can't crowd out route requests. A lane runs at most
+`capacity` requests and keeps at most `queue` more waiting; a request that
+finds the queue full, or is still waiting when its deadline passes, is
+turned away with 503 and Retry-After instead of tying up a thread.
+
+Each admitted request carries a Deadline (COOLRIDE_REQUEST_DEADLINE_S). The
+pipeline checks it between stages and unwinds with 504 once it has passed.
+Optional stages (building shadows, weather history backfill, amenities) run
+only if the remaining budget covers their STAGE_ESTIMATES_S; skipped ones
+are recorded and reported in the response as skipped_layers.
+"""
+
+import os
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+REQUEST_DEADLINE_S = float(os.environ.get("COOLRIDE_REQUEST_DEADLINE_S", "60"))
+MIN_DEADLINE_S = 1.0  # shortest deadline_s a request may ask for
+RETRY_AFTER_S = 5
+
+# Rough worst-case seconds of each optional stage when it has to go to the network
+STAGE_ESTIMATES_S = {
+    "buildings": float(os.environ.get("COOLRIDE_BUILDINGS_ESTIMATE_S", "20")),
+    "history": float(os.environ.get("COOLRIDE_HISTORY_ESTIMATE_S", "10")),
+    "amenities": float(os.environ.get("COOLRIDE_AMENITIES_ESTIMATE_S", "5")),
+}
+
+
+class AdmissionError(Exception):
+    """Request refused or abandoned by admission control; status is the HTTP code"""
+    status = 503
+    reason = "overloaded"
+
+
+class Overloaded(AdmissionError):
+    def __init__(self, lane):
+        super().__init__(f"Server busy ({lane}), please retry shortly")
+        self.lane = lane
+
+
+class InvalidDeadline(AdmissionError):
+    status = 400
+    reason = "invalid"
+
+    def __init__(self, value):
+        super().__init__(f"deadline_s must be a finite number of seconds, not {value!r}")
+
+
+class DeadlineExceeded(AdmissionError):
+    status = 504
+    reason = "deadline"
+
+    def __init__(self, stage):
+        super().__init__(f"Request deadline exceeded (at {stage})")
+        self.stage = stage
+
+
+class Deadline:
+    """Time budget of one request, checked cooperatively between pipeline stages"""
+
+    def __init__(self, budget_s=None):
+        self.budget_s = REQUEST_DEADLINE_S if budget_s is None else budget_s
+        self.start = time.monotonic()
+        self.skipped = []
+
+    def remaining(self):
+        return self.budget_s - (time.monotonic() - self.start)
+
+    def check(self, stage):
+        """Raise DeadlineExceeded if the budget is spent (call before starting `stage`)"""
+        if self.remaining() <= 0:
+            print(f"   ⏰ Deadline exceeded before {stage} ({self.budget_s:.0f}s budget)")
+            raise DeadlineExceeded(stage)
+
+    def allows(self, stage):
+        """Whether optional `stage` fits in the remaining budget"""
+        return self.remaining() >= STAGE_ESTIMATES_S[stage]
+
+    def budget_for(self, stage):
+        """Seconds optional `stage` may take: its estimate, or what is left if less"""
+        return max(min(STAGE_ESTIMATES_S[stage], self.remaining()), 0.0)
+
+    def skip(self, layer):
+        """Record an optional layer left out of the response"""
+        if layer not in self.skipped:
+            self.skipped.append(layer)
+            print(f"   ⏭️ Skipping {layer} ({self.remaining():.1f}s of budget left)")
+
+
+def request_budget(data):
+    """Deadline for a request: REQUEST_DEADLINE_S, or a shorter `deadline_s` it asks for
+    (at least MIN_DEADLINE_S). Raises InvalidDeadline (400) unless it is a finite number."""
+    value = data.get('deadline_s')
+    if value is None:
+        return REQUEST_DEADLINE_S
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        raise InvalidDeadline(value)
+    if not math.isfinite(budget):
+        raise InvalidDeadline(value)
+    return min(max(budget, MIN_DEADLINE_S), REQUEST_DEADLINE_S)
+
+
+class Lane:
+    """At most `capacity` requests at once, at most `queue` more waiting for a slot"""
+
+    def __init__(self, name, capacity, queue):
+        self.name = name
+        self.capacity = capacity
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def admit(self, deadline):
+        with self._cond:
+            if self.active >= self.capacity:
+                if self.waiting >= self.queue:
+                    self.rejected += 1
+                    print(f"   🚫 {self.name} lane full ({self.active} active, {self.waiting} queued)")
+                    raise Overloaded(self.name)
+                self.waiting += 1
+                try:
+                    free = self._cond.wait_for(lambda: self.active < self.capacity,
+                                               timeout=max(deadline.remaining(), 0))
+                finally:
+                    self.waiting -= 1
+                if not free:
+                    self.rejected += 1
+                    print(f"   🚫 {self.name} lane: no slot before the deadline")
+                    raise Overloaded(self.name)
+            self.active += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify()
+
+    def stats(self):
+        return {"capacity": self.capacity, "queue": self.queue, "active": self.active,
+                "waiting": self.waiting, "admitted": self.admitted, "rejected": self.rejected}
+
+
+# Per process: with gunicorn, every worker has its own lanes. Routing holds the GIL,
+# so a few active requests per worker is enough; gunicorn.conf.py gives each worker
+# threads for every active and queued request plus spares, or requests beyond the
+# thread count would wait in gunicorn's queue where the lane can't turn them away
+REQUESTS = Lane("requests", int(os.environ.get("COOLRIDE_MAX_ACTIVE", "2")),
+                int(os.environ.get("COOLRIDE_MAX_QUEUED", "4")))
+TILES = Lane("tiles", int(os.environ.get("COOLRIDE_MAX_TILE_RENDERS", "1")),
+             int(os.environ.get("COOLRIDE_MAX_TILES_QUEUED", "2")))
+SPARE_THREADS = 2  # /ready, cached tiles and other cheap requests
+# Taken inside a REQUESTS slot, so it needs no threads of its own
+DOWNLOADS = Lane("downloads", int(os.environ.get("COOLRIDE_MAX_DOWNLOADS", "1")),
+                 int(os.environ.get("COOLRIDE_MAX_DOWNLOADS_QUEUED", "1")))
+
+
+def lane_threads():
+    """Threads that the REQUESTS and TILES lanes can hold: every active and queued slot"""
+    return sum(lane.capacity + lane.queue for lane in (REQUESTS, TILES))
+
+
+def admission_stats():
+    """JSON-able snapshot of every lane"""
+    return {lane.name: lane.stats() for lane in (REQUESTS, TILES, DOWNLOADS)}
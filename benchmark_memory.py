@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Resident memory per cached area: osmnx MultiDiGraph vs the CompactGraph
+request path.
+
+Each measurement runs in a fresh child process and reports the growth of its
+resident set size (RSS), so GEOS geometries, Python objects and touched mmap
+pages all count. The networkx figure is loading the GraphML; the compact
+figure is everything a route request builds for an area: the graph arrays,
+adjacency lists, edge geometries, SnapIndex, CH search lists, the CCH
+topology and one customized CCH. cg.nbytes() (the raw arrays alone) is shown
+for reference.
+
+Usage: python benchmark_memory.py [area ...]
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_bytes():
+    """Resident set size of this process (Linux)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def measure_networkx(name):
+    import osmnx as ox
+    from networks import network_path
+    before = rss_bytes()
+    G = ox.load_graphml(network_path(name))
+    return {"networkx": rss_bytes() - before, "nodes": len(G), "edges": G.number_of_edges()}
+
+
+def measure_compact(name):
+    import shapely  # noqa: F401
+    import ch, cch, snapping  # noqa: F401
+    from networks import load_compact, load_snap_index, load_hierarchy, load_cch
+    stages = {}
+    last = before = rss_bytes()
+
+    def mark(stage):
+        nonlocal last
+        now = rss_bytes()
+        stages[stage] = now - last
+        last = now
+
+    cg = load_compact(name)
+    cg.edge_length.sum(), cg.indptr.sum(), cg.geom_xy.sum()  # touch the mapped pages
+    mark("arrays")
+    cg.adjacency()
+    mark("adjacency")
+    cg.edge_geometries()
+    mark("geometries")
+    load_snap_index(name)
+    mark("snap_index")
+    load_hierarchy(name)._search_lists()
+    mark("ch")
+    topology = load_cch(name)
+    topology._directed_arrays()
+    topology.customize(cg.edge_length)._search_lists()
+    mark("cch")
+    return {"compact": rss_bytes() - before, "nbytes": cg.nbytes(), "stages": stages}
+
+
+def run_child(kind, name):
+    """One measurement in a fresh interpreter"""
+    out = subprocess.check_output([sys.executable, __file__, "--child", kind, name], text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    if sys.argv[1:2] == ["--child"]:
+        kind, name = sys.argv[2], sys.argv[3]
+        result = measure_networkx(name) if kind == "networkx" else measure_compact(name)
+        print(json.dumps(result))
+        return
+
+    from networks import available_networks
+    names = sys.argv[1:] or available_networks()
+    print("📊 Resident memory per area (RSS growth, MB)\n")
+    print(f"{'area':<18}{'nodes':>8}{'edges':>8}{'networkx':>10}{'request path':>14}"
+          f"{'arrays':>8}{'snap':>7}{'ratio':>7}   nbytes")
+
+    total_nx = total_compact = 0
+    for name in names:
+        nx_result = run_child("networkx", name)
+        compact = run_child("compact", name)
+        total_nx += nx_result["networkx"]
+        total_compact += compact["compact"]
+        stages = compact["stages"]
+        print(f"{name:<18}{nx_result['nodes']:>8}{nx_result['edges']:>8}{nx_result['networkx'] / 1e6:>10.1f}"
+              f"{compact['compact'] / 1e6:>14.1f}{stages['arrays'] / 1e6:>8.1f}{stages['snap_index'] / 1e6:>7.1f}"
+              f"{nx_result['networkx'] / max(compact['compact'], 1):>6.1f}x   {compact['nbytes'] / 1e6:.2f}")
+        print("   " + ", ".join(f"{stage} {size / 1e6:.1f}" for stage, size in stages.items()))
+
+    print(f"\n{'total':<34}{total_nx / 1e6:>10.1f}{total_compact / 1e6:>14.1f}"
+          f"{'':>15}{total_nx / max(total_compact, 1):>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Route query benchmark and randomized correctness check.
+
+For each cached area, random origin/destination pairs are routed with
+  - nx.shortest_path on the GraphML network (reference)
+  - Dijkstra over the CompactGraph
+  - the contraction hierarchy
+and every CH path must match the reference distance and be a connected edge
+sequence. Snapped (mid-edge) routes are also compared CH vs Dijkstra.
+
+The cool route is checked the same way: the area's CCH is customized with a
+random cool_cost-like metric (length x factors in [0.35, 1]) and every CCH
+path must cost the same as Dijkstra under that metric.
+
+Usage: python benchmark_routing.py [--pairs 200] [--areas bedok orchard]
+"""
+
+import sys
+import time
+import random
+import argparse
+import numpy as np
+import networkx as nx
+from networks import available_networks, load_network, load_compact, load_hierarchy, load_snap_index, load_cch
+from snapping import snapped_route
+
+
+def reference_length(G, path):
+    return sum(min(d['length'] for d in G[u][v].values()) for u, v in zip(path[:-1], path[1:]))
+
+
+def check_area(name, pairs, rng):
+    G = load_network(name)
+    cg = load_compact(name)
+    hierarchy = load_hierarchy(name)
+    hierarchy._search_lists()
+    cg.adjacency()
+    ids = cg.node_ids.tolist()
+    failures = 0
+    t_nx = t_dijkstra = t_ch = 0.0
+
+    for _ in range(pairs):
+        a, b = rng.randrange(cg.num_nodes), rng.randrange(cg.num_nodes)
+        t0 = time.perf_counter()
+        try:
+            ref = nx.shortest_path(G, ids[a], ids[b], weight='length')
+        except nx.NetworkXNoPath:
+            ref = None
+        t1 = time.perf_counter()
+        dij = cg.shortest_path(a, b)
+        t2 = time.perf_counter()
+        path = hierarchy.shortest_path(a, b)
+        t3 = time.perf_counter()
+        t_nx += t1 - t0
+        t_dijkstra += t2 - t1
+        t_ch += t3 - t2
+
+        if ref is None or path is None:
+            failures += (ref is None) != (path is None)
+            continue
+        connected = all(cg.edge_v[x] == cg.edge_u[y] for x, y in zip(path[:-1], path[1:]))
+        ends_ok = not path or (cg.edge_u[path[0]] == a and cg.edge_v[path[-1]] == b)
+        if not (connected and ends_ok) or abs(cg.edge_length[path].sum() - reference_length(G, ref)) > 1e-6:
+            failures += 1
+
+    # Mid-edge endpoints: CH and Dijkstra must agree on the snapped route length
+    index = load_snap_index(name)
+    minx, miny, maxx, maxy = cg.bounds()
+    lons = [rng.uniform(minx, maxx) for _ in range(2 * pairs)]
+    lats = [rng.uniform(miny, maxy) for _ in range(2 * pairs)]
+    snaps = index.snap(lons, lats)
+    for i in range(pairs):
+        o, d = snaps[2 * i], snaps[2 * i + 1]
+        r_dij = snapped_route(index, o, d)
+        r_ch = snapped_route(index, o, d, search=hierarchy.search)
+        if (r_dij is None) != (r_ch is None):
+            failures += 1
+        elif r_dij is not None and abs(r_dij.length(cg) - r_ch.length(cg)) > 1e-6:
+            failures += 1
+
+    # Cool route: customize the CCH with a random metric and compare against Dijkstra
+    topology = load_cch(name)
+    factors = np.random.default_rng(rng.randrange(2**32)).uniform(0.35, 1.0, cg.num_edges)
+    cool_cost = cg.edge_length * factors
+    t0 = time.perf_counter()
+    customized = topology.customize(cool_cost)
+    customized._search_lists()
+    t_customize = time.perf_counter() - t0
+    t_cch = t_cool_dijkstra = 0.0
+    for _ in range(pairs):
+        a, b = rng.randrange(cg.num_nodes), rng.randrange(cg.num_nodes)
+        t0 = time.perf_counter()
+        path = customized.shortest_path(a, b)
+        t1 = time.perf_counter()
+        ref = cg.shortest_path(a, b, cool_cost)
+        t2 = time.perf_counter()
+        t_cch += t1 - t0
+        t_cool_dijkstra += t2 - t1
+        if (path is None) != (ref is None):
+            failures += 1
+        elif path is not None and abs(cool_cost[path].sum() - cool_cost[ref].sum()) > 1e-6:
+            failures += 1
+
+    ms = 1000.0 / pairs
+    print(f"{name:<18}{cg.num_nodes:>7}{t_nx * ms:>11.2f}{t_dijkstra * ms:>11.2f}{t_ch * ms:>9.3f}"
+          f"{t_cool_dijkstra * ms:>11.2f}{t_customize * 1000:>11.1f}{t_cch * ms:>9.3f}"
+          f"{'OK' if not failures else f'{failures} FAIL':>9}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--areas", nargs="*", default=None)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print("📊 Query time per pair (ms); customization per metric (ms)\n")
+    print(f"{'':<25}{'---------- fast ----------':>31}{'------------ cool ------------':>31}")
+    print(f"{'area':<18}{'nodes':>7}{'networkx':>11}{'dijkstra':>11}{'CH':>9}"
+          f"{'dijkstra':>11}{'customize':>11}{'CCH':>9}{'check':>9}")
+    failures = sum(check_area(name, args.pairs, rng) for name in (args.areas or available_networks()))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
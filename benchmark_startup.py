@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: launch the server the way the container does and time
+  - process start -> /ready returns 200
+  - process start -> first successful /calculate_route
+Each run is appended to output/startup_benchmark.jsonl so regressions show up
+against earlier runs.
+
+Usage: python benchmark_startup.py [--dev] [--port 8090]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+import requests
+
+RESULTS_FILE = "output/startup_benchmark.jsonl"
+# Literal coordinates skip Nominatim, so only the server itself is measured
+ROUTE_BODY = {"start": "1.3236, 103.9273", "end": "1.3300, 103.9350", "time": "13:00"}
+
+
+def wait_for(fn, timeout_s, interval_s=0.1):
+    """Poll fn() until it returns truthy; returns seconds waited or None"""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout_s:
+        try:
+            if fn():
+                return time.monotonic() - start
+        except requests.RequestException:
+            pass
+        time.sleep(interval_s)
+    return None
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--dev", action="store_true", help="benchmark `python simple_server.py` instead of gunicorn")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PORT=str(args.port), PYTHONUNBUFFERED="1")
+    env.setdefault("WEB_CONCURRENCY", "1")
+    if args.dev:
+        cmd = [sys.executable, "simple_server.py"]
+        base = "http://127.0.0.1:5001"
+    else:
+        cmd = ["gunicorn", "--config", "gunicorn.conf.py", "simple_server:app"]
+        base = f"http://127.0.0.1:{args.port}"
+
+    print(f"🚀 Starting: {' '.join(cmd)}")
+    t0 = time.monotonic()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        def route_ok():
+            resp = requests.post(f"{base}/calculate_route", json=ROUTE_BODY, timeout=args.timeout)
+            return resp.status_code == 200 and resp.json().get("status") == "success"
+
+        ready_s = wait_for(lambda: requests.get(f"{base}/ready", timeout=2).status_code == 200, args.timeout)
+        first_route_s = wait_for(route_ok, args.timeout, interval_s=0.5)
+        readiness = requests.get(f"{base}/ready", timeout=2).json() if ready_s is not None else {}
+        # Both timings are from process start
+        ready_from_start = ready_s
+        route_from_start = time.monotonic() - t0 if first_route_s is not None else None
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "mode": "dev" if args.dev else "gunicorn",
+        "workers": env["WEB_CONCURRENCY"],
+        "time_to_ready_s": round(ready_from_start, 2) if ready_from_start is not None else None,
+        "time_to_first_route_s": round(route_from_start, 2) if route_from_start is not None else None,
+        "warmup_s": readiness.get("duration_s"),
+        "warmup_status": readiness.get("status"),
+    }
+
+    history = []
+    if os.path.exists(RESULTS_FILE):
+        with open(RESULTS_FILE) as f:
+            history = [json.loads(line) for line in f if line.strip()]
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    print("\n📊 STARTUP BENCHMARK")
+    print(f"   Time to /ready:        {record['time_to_ready_s']}s")
+    print(f"   Time to first route:   {record['time_to_first_route_s']}s")
+    print(f"   Warm-up:               {record['warmup_s']}s ({record['warmup_status']})")
+    previous = [r for r in history if r.get("mode") == record["mode"] and r.get("time_to_first_route_s")]
+    if previous and record["time_to_first_route_s"]:
+        last = previous[-1]
+        delta = record["time_to_first_route_s"] - last["time_to_first_route_s"]
+        print(f"   vs {last['revision']} ({last['timestamp']}): {delta:+.2f}s")
+
+
+if __name__ == "__main__":
+    main()
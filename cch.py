@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Customizable contraction hierarchy (CCH) for the time-varying cool_cost metric.
+
+cool_cost changes with the sun, so a witness-pruned CH (ch.py) cannot be
+reused across requests. A CCH splits the work in two:
+  - preprocessing (once per area, persisted beside the network): a
+    metric-independent min-degree elimination order, the resulting upward
+    arcs and every lower triangle between them;
+  - customization (per cool_cost vector, vectorized NumPy): original edge
+    weights are dropped onto their arcs and triangles are relaxed level by
+    level, producing a ch.Hierarchy that answers queries with the same
+    bidirectional search as the distance hierarchy.
+Customized hierarchies are cached per (area, sun-position bucket).
+"""
+
+import os
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from ch import Hierarchy
+
+CCH_ARRAYS = ('rank', 'arc_low', 'arc_high', 'ptr', 'edge_arc', 'edge_forward',
+              'tri_target', 'tri_first', 'tri_second', 'level_ptr')
+
+CUSTOMIZATION_CACHE_SIZE = int(os.environ.get("COOLRIDE_CCH_CACHE_SIZE", "64"))
+
+
+class CCHTopology:
+    """Metric-independent part of a CCH.
+
+    Undirected arc i joins arc_low[i] and arc_high[i] (rank low < rank high);
+    arcs of node v are ptr[v]:ptr[v+1]. Original edge e maps to arc
+    edge_arc[e], in the low -> high direction if edge_forward[e] (-1 for
+    self-loops). Triangle j says arc tri_target[j] = (a, b) can be reached
+    through the lower node x shared by tri_first[j] = (x, a) and
+    tri_second[j] = (x, b); triangles are grouped into dependency levels
+    level_ptr[k]:level_ptr[k+1].
+    """
+
+    def __init__(self, rank, arc_low, arc_high, ptr, edge_arc, edge_forward,
+                 tri_target, tri_first, tri_second, level_ptr):
+        self.rank = rank
+        self.arc_low = arc_low
+        self.arc_high = arc_high
+        self.ptr = ptr
+        self.edge_arc = edge_arc
+        self.edge_forward = edge_forward
+        self.tri_target = tri_target
+        self.tri_first = tri_first
+        self.tri_second = tri_second
+        self.level_ptr = level_ptr
+        self._directed = None
+
+    @property
+    def num_arcs(self):
+        return len(self.arc_low)
+
+    @property
+    def num_triangles(self):
+        return len(self.tri_target)
+
+    def save(self, directory, prefix='cch'):
+        os.makedirs(directory, exist_ok=True)
+        for attr in CCH_ARRAYS:
+            np.save(os.path.join(directory, f"{prefix}_{attr}.npy"), getattr(self, attr))
+
+    @classmethod
+    def load(cls, directory, prefix='cch', mmap=True):
+        mode = 'r' if mmap else None
+        return cls(**{attr: np.load(os.path.join(directory, f"{prefix}_{attr}.npy"), mmap_mode=mode)
+                      for attr in CCH_ARRAYS})
+
+    @staticmethod
+    def exists(directory, prefix='cch'):
+        return os.path.exists(os.path.join(directory, f"{prefix}_{CCH_ARRAYS[-1]}.npy"))
+
+    def _directed_arrays(self):
+        """Directed arc endpoints and search CSR; arc 2i is low -> high, 2i+1 is high -> low"""
+        if self._directed is None:
+            n_arcs = self.num_arcs
+            tail = np.empty(2 * n_arcs, dtype=np.int32)
+            head = np.empty(2 * n_arcs, dtype=np.int32)
+            tail[0::2] = self.arc_low
+            head[0::2] = self.arc_high
+            tail[1::2] = self.arc_high
+            head[1::2] = self.arc_low
+            ids = np.arange(n_arcs, dtype=np.int64)
+            self._directed = (tail, head, np.asarray(self.ptr), 2 * ids, 2 * ids + 1)
+        return self._directed
+
+    def customize(self, weights):
+        """Hierarchy for one edge-weight vector (the metric-dependent phase)"""
+        weights = np.asarray(weights, dtype=np.float64)
+        n_arcs = self.num_arcs
+        edge_arc = np.asarray(self.edge_arc)
+        edge_forward = np.asarray(self.edge_forward)
+
+        metrics = []
+        for forward in (True, False):
+            weight = np.full(n_arcs, np.inf)
+            edge = np.full(n_arcs, -1, dtype=np.int64)
+            # Cheapest original edge per arc and direction
+            chosen = np.flatnonzero((edge_arc >= 0) & (edge_forward == forward))
+            order = np.lexsort((weights[chosen], edge_arc[chosen]))
+            chosen = chosen[order]
+            arcs = edge_arc[chosen]
+            first = np.ones(len(arcs), dtype=bool)
+            first[1:] = arcs[1:] != arcs[:-1]
+            weight[arcs[first]] = weights[chosen[first]]
+            edge[arcs[first]] = chosen[first]
+            metrics.append((weight, edge, np.full(n_arcs, -1, dtype=np.int64), np.full(n_arcs, -1, dtype=np.int64)))
+        up, down = metrics
+
+        level_ptr = np.asarray(self.level_ptr)
+        for k in range(len(level_ptr) - 1):
+            lo, hi = level_ptr[k], level_ptr[k + 1]
+            target = np.asarray(self.tri_target[lo:hi])
+            first = np.asarray(self.tri_first[lo:hi])
+            second = np.asarray(self.tri_second[lo:hi])
+            # a -> b is a -> x (down along first) then x -> b (up along second); b -> a mirrors it
+            _relax(up, target, down[0][first] + up[0][second], 2 * first + 1, 2 * second)
+            _relax(down, target, down[0][second] + up[0][first], 2 * second + 1, 2 * first)
+
+        tail, head, ptr, up_arcs, down_arcs = self._directed_arrays()
+        weight = np.empty(2 * n_arcs)
+        edge = np.empty(2 * n_arcs, dtype=np.int64)
+        child1 = np.empty(2 * n_arcs, dtype=np.int64)
+        child2 = np.empty(2 * n_arcs, dtype=np.int64)
+        for parity, (w, e, c1, c2) in enumerate((up, down)):
+            weight[parity::2] = w
+            edge[parity::2] = e
+            child1[parity::2] = c1
+            child2[parity::2] = c2
+        return Hierarchy(np.asarray(self.rank), tail, head, weight, edge, child1, child2,
+                         ptr, up_arcs, ptr, down_arcs)
+
+
+def _relax(metric, target, candidate, child1, child2):
+    """metric[target] = min(metric[target], candidate), grouped per target arc"""
+    weight, edge, c1, c2 = metric
+    order = np.lexsort((candidate, target))
+    sorted_target = target[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_target[1:] != sorted_target[:-1]
+    best = order[first]
+    arcs = target[best]
+    better = candidate[best] < weight[arcs]
+    best, arcs = best[better], arcs[better]
+    weight[arcs] = candidate[best]
+    edge[arcs] = -1
+    c1[arcs] = child1[best]
+    c2[arcs] = child2[best]
+
+
+def min_degree_order(cg):
+    """Metric-independent elimination order and upward neighbour lists"""
+    n = cg.num_nodes
+    neighbours = [set() for _ in range(n)]
+    for u, v in zip(cg.edge_u.tolist(), cg.edge_v.tolist()):
+        if u != v:
+            neighbours[u].add(v)
+            neighbours[v].add(u)
+
+    heap = [(len(neighbours[v]), v) for v in range(n)]
+    heapq.heapify(heap)
+    eliminated = [False] * n
+    order = []
+    upward = [None] * n
+    while heap:
+        degree, v = heapq.heappop(heap)
+        if eliminated[v] or degree != len(neighbours[v]):
+            continue
+        remaining = neighbours[v]
+        upward[v] = list(remaining)
+        # Eliminating v joins all of its remaining neighbours (fill-in)
+        for u in remaining:
+            neighbours[u].discard(v)
+            neighbours[u].update(w for w in remaining if w != u)
+            heapq.heappush(heap, (len(neighbours[u]), u))
+        neighbours[v] = set()
+        eliminated[v] = True
+        order.append(v)
+    return order, upward
+
+
+def build_topology(cg):
+    """Metric-independent CCH preprocessing of a CompactGraph"""
+    n = cg.num_nodes
+    order, upward = min_degree_order(cg)
+    rank = np.empty(n, dtype=np.int32)
+    rank[np.array(order, dtype=np.int64)] = np.arange(n, dtype=np.int32)
+
+    # Arcs grouped by their lower endpoint, higher endpoints sorted by rank
+    arc_low, arc_high = [], []
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    arc_id = {}
+    for v in range(n):
+        for w in sorted(upward[v], key=lambda u: rank[u]):
+            arc_id[(v, w)] = len(arc_low)
+            arc_low.append(v)
+            arc_high.append(w)
+        ptr[v + 1] = len(arc_low)
+
+    edge_arc = np.full(cg.num_edges, -1, dtype=np.int64)
+    edge_forward = np.zeros(cg.num_edges, dtype=bool)
+    for e, (u, v) in enumerate(zip(cg.edge_u.tolist(), cg.edge_v.tolist())):
+        if u == v:
+            continue
+        if rank[u] < rank[v]:
+            edge_arc[e], edge_forward[e] = arc_id[(u, v)], True
+        else:
+            edge_arc[e], edge_forward[e] = arc_id[(v, u)], False
+
+    # Level of x: above every lower node whose triangles write x's arcs
+    level = [0] * n
+    for v in order:
+        for w in upward[v]:
+            if level[w] < level[v] + 1:
+                level[w] = level[v] + 1
+
+    triangles = []
+    for x in order:
+        ups = list(range(ptr[x], ptr[x + 1]))
+        for i, first in enumerate(ups):
+            a = arc_high[first]
+            for second in ups[i + 1:]:
+                b = arc_high[second]
+                triangles.append((level[x], arc_id[(a, b)], first, second))
+    triangles.sort()
+
+    tri = np.array([t[1:] for t in triangles], dtype=np.int64).reshape(-1, 3)
+    tri_levels = np.array([t[0] for t in triangles], dtype=np.int64)
+    # Boundaries of each non-empty level
+    level_ptr = np.unique(np.concatenate([[0], np.flatnonzero(np.diff(tri_levels)) + 1, [len(tri)]]))
+
+    return CCHTopology(rank, np.array(arc_low, dtype=np.int32), np.array(arc_high, dtype=np.int32), ptr,
+                       edge_arc, edge_forward, tri[:, 0].copy(), tri[:, 1].copy(), tri[:, 2].copy(), level_ptr)
+
+
+class CustomizationCache:
+    """LRU of customized hierarchies keyed by (area, sun bucket)"""
+
+    def __init__(self, maxsize=CUSTOMIZATION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(weights):
+        return hashlib.blake2b(np.ascontiguousarray(weights, dtype=np.float64).tobytes(), digest_size=16).digest()
+
+    def get(self, key, topology, weights):
+        """Customized hierarchy for key; re-customizes if the weights changed"""
+        digest = self.digest(weights)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == digest:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        hierarchy = topology.customize(weights)
+        hierarchy._search_lists()
+        with self._lock:
+            self._entries[key] = (digest, hierarchy)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return hierarchy
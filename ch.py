@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Contraction hierarchy (CH) for a static edge metric, used for the fastest route.
+
+The `length` weight of an area network never changes, so it is contracted
+once (at compile time, persisted next to the CompactGraph arrays) and each
+fast-route query is a bidirectional upward search over a few hundred arcs
+instead of a Dijkstra over the whole area. Shortcut arcs remember the two
+arcs they replace, so paths unpack to real edge ids.
+"""
+
+import os
+import heapq
+import numpy as np
+
+CH_ARRAYS = ('rank', 'arc_tail', 'arc_head', 'arc_weight', 'arc_edge', 'arc_child1',
+             'arc_child2', 'up_ptr', 'up_arcs', 'down_ptr', 'down_arcs')
+
+# Witness searches give up after this many settled nodes (adds a few
+# unnecessary shortcuts, never a wrong one)
+WITNESS_SETTLE_LIMIT = 60
+
+
+class Hierarchy:
+    """Arc table plus two upward CSR graphs.
+
+    up_arcs[up_ptr[v]:up_ptr[v+1]] are arcs v -> w with rank[w] > rank[v]
+    (forward search); down_arcs[down_ptr[v]:down_ptr[v+1]] are arcs u -> v
+    with rank[u] > rank[v] (backward search walks them from v up to u).
+    An arc is either an original edge (arc_edge >= 0) or a shortcut made of
+    arc_child1 followed by arc_child2. Infinite weights mark unusable arcs.
+    """
+
+    def __init__(self, rank, arc_tail, arc_head, arc_weight, arc_edge, arc_child1,
+                 arc_child2, up_ptr, up_arcs, down_ptr, down_arcs):
+        self.rank = rank
+        self.arc_tail = arc_tail
+        self.arc_head = arc_head
+        self.arc_weight = arc_weight
+        self.arc_edge = arc_edge
+        self.arc_child1 = arc_child1
+        self.arc_child2 = arc_child2
+        self.up_ptr = up_ptr
+        self.up_arcs = up_arcs
+        self.down_ptr = down_ptr
+        self.down_arcs = down_arcs
+        self._lists = None
+
+    @property
+    def num_arcs(self):
+        return len(self.arc_tail)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, directory, prefix='ch'):
+        os.makedirs(directory, exist_ok=True)
+        for attr in CH_ARRAYS:
+            np.save(os.path.join(directory, f"{prefix}_{attr}.npy"), getattr(self, attr))
+
+    @classmethod
+    def load(cls, directory, prefix='ch', mmap=True):
+        mode = 'r' if mmap else None
+        return cls(**{attr: np.load(os.path.join(directory, f"{prefix}_{attr}.npy"), mmap_mode=mode)
+                      for attr in CH_ARRAYS})
+
+    @staticmethod
+    def exists(directory, prefix='ch'):
+        return os.path.exists(os.path.join(directory, f"{prefix}_{CH_ARRAYS[-1]}.npy"))
+
+    def nbytes(self):
+        return sum(getattr(self, attr).nbytes for attr in CH_ARRAYS)
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+    def _search_lists(self):
+        """Per-node [(arc, other_node, weight)] lists for both directions (built once per process)"""
+        if self._lists is None:
+            tail = self.arc_tail.tolist()
+            head = self.arc_head.tolist()
+            weight = self.arc_weight.tolist()
+
+            def build(ptr, arcs, other):
+                ptr = ptr.tolist()
+                arcs = arcs.tolist()
+                return [[(a, other[a], weight[a]) for a in arcs[ptr[v]:ptr[v + 1]] if weight[a] != float('inf')]
+                        for v in range(len(ptr) - 1)]
+
+            self._lists = (build(self.up_ptr, self.up_arcs, head),
+                           build(self.down_ptr, self.down_arcs, tail))
+        return self._lists
+
+    def unpack(self, arc):
+        """Original edge ids of an arc, in travel order"""
+        edge = self.arc_edge
+        child1 = self.arc_child1
+        child2 = self.arc_child2
+        path, stack = [], [int(arc)]
+        while stack:
+            a = stack.pop()
+            e = int(edge[a])
+            if e >= 0:
+                path.append(e)
+            else:
+                stack.append(int(child2[a]))
+                stack.append(int(child1[a]))
+        return path
+
+    def search(self, sources, targets):
+        """Bidirectional upward search; same contract as CompactGraph.search"""
+        up, down = self._search_lists()
+        inf = float('inf')
+        dist_f, dist_b = dict(sources), dict(targets)
+        pred_f, pred_b = {}, {}
+        heap_f = [(d, v) for v, d in sources.items()]
+        heap_b = [(d, v) for v, d in targets.items()]
+        heapq.heapify(heap_f)
+        heapq.heapify(heap_b)
+        done_f, done_b = set(), set()
+        best, meet = inf, None
+
+        while heap_f or heap_b:
+            top_f = heap_f[0][0] if heap_f else inf
+            top_b = heap_b[0][0] if heap_b else inf
+            if min(top_f, top_b) >= best:
+                break
+            if top_f <= top_b:
+                heap, dist, pred, done, other, lists = heap_f, dist_f, pred_f, done_f, dist_b, up
+            else:
+                heap, dist, pred, done, other, lists = heap_b, dist_b, pred_b, done_b, dist_f, down
+            d, v = heapq.heappop(heap)
+            if v in done or d > dist[v]:
+                continue
+            done.add(v)
+            if v in other and d + other[v] < best:
+                best, meet = d + other[v], v
+            for a, w, c in lists[v]:
+                nd = d + c
+                if nd < dist.get(w, inf):
+                    dist[w] = nd
+                    pred[w] = a
+                    heapq.heappush(heap, (nd, w))
+        if meet is None:
+            return None
+
+        # Walk the forward tree back to a source and the backward tree on to a target
+        arcs_f, node = [], meet
+        while node in pred_f and dist_f[node] < sources.get(node, inf):
+            a = pred_f[node]
+            arcs_f.append(a)
+            node = int(self.arc_tail[a])
+        source = node
+        arcs_f.reverse()
+        arcs_b, node = [], meet
+        while node in pred_b and dist_b[node] < targets.get(node, inf):
+            a = pred_b[node]
+            arcs_b.append(a)
+            node = int(self.arc_head[a])
+        target = node
+
+        path = []
+        for a in arcs_f + arcs_b:
+            path.extend(self.unpack(a))
+        return best, path, source, target
+
+    def shortest_path(self, source, target):
+        """Edge ids of the shortest path between two node indices, or None"""
+        found = self.search({source: 0.0}, {target: 0.0})
+        return None if found is None else found[1]
+
+
+def _witness_costs(out, start, skip, targets, limit):
+    """Bounded Dijkstra from start avoiding `skip`; costs to the given targets"""
+    dist = {start: 0.0}
+    heap = [(0.0, start)]
+    found = {}
+    settled = 0
+    remaining = set(targets)
+    while heap and remaining and settled < WITNESS_SETTLE_LIMIT:
+        d, v = heapq.heappop(heap)
+        if d > dist[v]:
+            continue
+        if d > limit:
+            break
+        settled += 1
+        if v in remaining:
+            found[v] = d
+            remaining.discard(v)
+        for w, (_, c) in out[v].items():
+            if w == skip:
+                continue
+            nd = d + c
+            if nd < dist.get(w, float('inf')):
+                dist[w] = nd
+                heapq.heappush(heap, (nd, w))
+    return found
+
+
+def build_hierarchy(cg, weights=None):
+    """Contract a CompactGraph under a fixed metric (edge_length by default)"""
+    weights = np.asarray(cg.edge_length if weights is None else weights, dtype=np.float64)
+    n = cg.num_nodes
+
+    # Arc table (Python lists while building); parallel edges collapse to the cheapest
+    tail, head, weight, edge, child1, child2 = [], [], [], [], [], []
+    out = [dict() for _ in range(n)]   # out[u][w] = (arc, weight) among uncontracted nodes
+    inc = [dict() for _ in range(n)]   # inc[w][u] = (arc, weight)
+
+    def add_arc(u, w, c, e, c1, c2):
+        a = len(tail)
+        tail.append(u)
+        head.append(w)
+        weight.append(c)
+        edge.append(e)
+        child1.append(c1)
+        child2.append(c2)
+        out[u][w] = (a, c)
+        inc[w][u] = (a, c)
+        return a
+
+    for e, (u, w, c) in enumerate(zip(cg.edge_u.tolist(), cg.edge_v.tolist(), weights.tolist())):
+        if u == w:
+            continue
+        if w not in out[u] or c < out[u][w][1]:
+            add_arc(u, w, c, e, -1, -1)
+
+    def shortcuts_needed(v):
+        needed = []
+        outs = list(out[v].items())
+        for u, (a_in, c_in) in inc[v].items():
+            candidates = {w: c_in + c_out for w, (_, c_out) in outs if w != u}
+            if not candidates:
+                continue
+            witness = _witness_costs(out, u, v, candidates, max(candidates.values()))
+            for w, via in candidates.items():
+                if witness.get(w, float('inf')) > via:
+                    needed.append((u, w, via, a_in, out[v][w][0]))
+        return needed
+
+    contracted_neighbours = [0] * n
+
+    def priority(v):
+        edge_difference = len(shortcuts_needed(v)) - len(inc[v]) - len(out[v])
+        return edge_difference + contracted_neighbours[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = np.zeros(n, dtype=np.int32)
+    up_lists = [None] * n
+    down_lists = [None] * n
+    next_rank = 0
+    contracted = [False] * n
+
+    while heap:
+        p, v = heapq.heappop(heap)
+        if contracted[v]:
+            continue
+        # Lazy update: re-evaluate and defer if it is no longer the cheapest
+        current = priority(v)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+
+        for u, w, via, a_in, a_out in shortcuts_needed(v):
+            if w not in out[u] or via < out[u][w][1]:
+                add_arc(u, w, via, -1, a_in, a_out)
+
+        # Everything still attached to v ranks above it
+        up_lists[v] = [a for a, _ in out[v].values()]
+        down_lists[v] = [a for a, _ in inc[v].values()]
+        for w in out[v]:
+            del inc[w][v]
+            contracted_neighbours[w] += 1
+        for u in inc[v]:
+            del out[u][v]
+            contracted_neighbours[u] += 1
+        out[v] = {}
+        inc[v] = {}
+        contracted[v] = True
+        rank[v] = next_rank
+        next_rank += 1
+
+    def to_csr(lists):
+        ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(lst) for lst in lists], out=ptr[1:])
+        arcs = np.array([a for lst in lists for a in lst], dtype=np.int64)
+        return ptr, arcs
+
+    up_ptr, up_arcs = to_csr(up_lists)
+    down_ptr, down_arcs = to_csr(down_lists)
+    return Hierarchy(rank,
+                     np.array(tail, dtype=np.int32), np.array(head, dtype=np.int32),
+                     np.array(weight, dtype=np.float64), np.array(edge, dtype=np.int64),
+                     np.array(child1, dtype=np.int64), np.array(child2, dtype=np.int64),
+                     up_ptr, up_arcs, down_ptr, down_arcs)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Array-backed graph for the routing hot path.
+
+An osmnx MultiDiGraph keeps every node and edge as a Python dict (plus a
+shapely LineString per edge). CompactGraph stores the same network as flat
+NumPy arrays: node coordinates, CSR adjacency, edge lengths and a packed
+buffer of edge geometry coordinates. Arrays can be saved to and memory-mapped
+from a directory of .npy files, so forked workers share them via the page cache.
+"""
+
+import os
+import json
+import heapq
+import numpy as np
+
+ARRAYS = ('node_ids', 'x', 'y', 'indptr', 'edge_u', 'edge_v', 'edge_key',
+          'edge_length', 'geom_ptr', 'geom_xy')
+
+
+class CompactGraph:
+    """Directed multigraph in CSR form; edge ids are positions in the edge arrays"""
+
+    def __init__(self, node_ids, x, y, indptr, edge_u, edge_v, edge_key,
+                 edge_length, geom_ptr, geom_xy, crs="epsg:4326", name=None):
+        self.node_ids = node_ids        # (N,) int64 OSM ids, sorted
+        self.x = x                      # (N,) float64 longitude
+        self.y = y                      # (N,) float64 latitude
+        self.indptr = indptr            # (N+1,) int32, out-edges of i are indptr[i]:indptr[i+1]
+        self.edge_u = edge_u            # (E,) int32 tail node index
+        self.edge_v = edge_v            # (E,) int32 head node index
+        self.edge_key = edge_key        # (E,) int32 multigraph key
+        self.edge_length = edge_length  # (E,) float64 meters
+        self.geom_ptr = geom_ptr        # (E+1,) int64, coords of e are geom_xy[geom_ptr[e]:geom_ptr[e+1]]
+        self.geom_xy = geom_xy          # (P, 2) float64 lon/lat
+        self.crs = crs
+        self.name = name
+        self._adjacency = None
+        self._geometries = None
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_u)
+
+    # ------------------------------------------------------------------
+    # Conversion
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_networkx(cls, G, name=None):
+        """Build from an osmnx MultiDiGraph (edges without geometry become straight lines)"""
+        node_ids = np.array(sorted(G.nodes), dtype=np.int64)
+        index = {n: i for i, n in enumerate(node_ids.tolist())}
+        x = np.array([G.nodes[n]['x'] for n in node_ids.tolist()], dtype=np.float64)
+        y = np.array([G.nodes[n]['y'] for n in node_ids.tolist()], dtype=np.float64)
+
+        edges = sorted(((index[u], index[v], k, d) for u, v, k, d in G.edges(keys=True, data=True)),
+                       key=lambda e: (e[0], e[1], e[2]))
+        edge_u = np.array([e[0] for e in edges], dtype=np.int32)
+        edge_v = np.array([e[1] for e in edges], dtype=np.int32)
+        edge_key = np.array([e[2] for e in edges], dtype=np.int32)
+        edge_length = np.array([float(e[3]['length']) for e in edges], dtype=np.float64)
+
+        coords = []
+        geom_ptr = np.zeros(len(edges) + 1, dtype=np.int64)
+        for i, (u, v, _, d) in enumerate(edges):
+            if 'geometry' in d:
+                xy = list(d['geometry'].coords)
+            else:
+                xy = [(x[u], y[u]), (x[v], y[v])]
+            coords.extend(xy)
+            geom_ptr[i + 1] = geom_ptr[i] + len(xy)
+        geom_xy = np.array(coords, dtype=np.float64).reshape(-1, 2)
+
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(edge_u, minlength=len(node_ids)), out=indptr[1:])
+        return cls(node_ids, x, y, indptr, edge_u, edge_v, edge_key, edge_length,
+                   geom_ptr, geom_xy, crs=G.graph.get('crs', 'epsg:4326'), name=name)
+
+    def to_networkx(self):
+        """Rebuild an osmnx-compatible MultiDiGraph (for tooling, not the request path)"""
+        import networkx as nx
+        from shapely.geometry import LineString
+
+        G = nx.MultiDiGraph(crs=self.crs)
+        ids = self.node_ids.tolist()
+        for n, nx_, ny_ in zip(ids, self.x.tolist(), self.y.tolist()):
+            G.add_node(n, x=nx_, y=ny_)
+        for e in range(self.num_edges):
+            attrs = {'length': float(self.edge_length[e])}
+            xy = self.edge_coords(e)
+            if len(xy) > 2:
+                attrs['geometry'] = LineString(xy)
+            G.add_edge(ids[self.edge_u[e]], ids[self.edge_v[e]], key=int(self.edge_key[e]), **attrs)
+        return G
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, directory):
+        """Write one .npy per array plus meta.json"""
+        os.makedirs(directory, exist_ok=True)
+        for attr in ARRAYS:
+            np.save(os.path.join(directory, f"{attr}.npy"), getattr(self, attr))
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({'crs': self.crs, 'name': self.name}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load arrays saved by save(); mmap=True maps them read-only"""
+        mode = 'r' if mmap else None
+        arrays = {attr: np.load(os.path.join(directory, f"{attr}.npy"), mmap_mode=mode)
+                  for attr in ARRAYS}
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(crs=meta.get('crs', 'epsg:4326'), name=meta.get('name'), **arrays)
+
+    def nbytes(self):
+        """Bytes held by the graph arrays"""
+        return sum(getattr(self, attr).nbytes for attr in ARRAYS)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def node_index(self, node_id):
+        """Array index of an OSM node id"""
+        i = int(np.searchsorted(self.node_ids, node_id))
+        if i >= self.num_nodes or self.node_ids[i] != node_id:
+            raise KeyError(node_id)
+        return i
+
+    def bounds(self):
+        """(minx, miny, maxx, maxy) of the node coordinates"""
+        return float(self.x.min()), float(self.y.min()), float(self.x.max()), float(self.y.max())
+
+    def edge_coords(self, e):
+        """(k, 2) lon/lat coordinates of one edge"""
+        return self.geom_xy[self.geom_ptr[e]:self.geom_ptr[e + 1]]
+
+    def edge_geometries(self):
+        """Shapely LineString array of every edge (built once per process)"""
+        if self._geometries is None:
+            import shapely
+            sizes = np.diff(self.geom_ptr)
+            self._geometries = shapely.linestrings(np.asarray(self.geom_xy),
+                                                   indices=np.repeat(np.arange(self.num_edges), sizes))
+        return self._geometries
+
+    def path_nodes(self, edge_path):
+        """Node indices visited by a path of edge ids"""
+        if len(edge_path) == 0:
+            return []
+        edge_path = np.asarray(edge_path)
+        return [int(self.edge_u[edge_path[0]])] + self.edge_v[edge_path].tolist()
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def adjacency(self):
+        """Per-node [(edge_id, head)] lists for the Python search loop (built once per process)"""
+        if self._adjacency is None:
+            indptr = self.indptr.tolist()
+            heads = self.edge_v.tolist()
+            self._adjacency = [[(e, heads[e]) for e in range(indptr[i], indptr[i + 1])]
+                               for i in range(self.num_nodes)]
+        return self._adjacency
+
+    def search(self, sources, targets, weights=None):
+        """Multi-source Dijkstra to the cheapest of several targets.
+
+        sources maps node index -> cost already paid on reaching it, targets maps
+        node index -> cost still due after it (used for virtual split edges).
+        Returns (cost, edge_path, source, target) or None if no target is reachable.
+        """
+        if weights is None:
+            weights = self.edge_length
+        w = weights.tolist() if isinstance(weights, np.ndarray) else weights
+        adjacency = self.adjacency()
+
+        dist = dict(sources)
+        pred = {}
+        settled = set()
+        heap = [(d, u) for u, d in sources.items()]
+        heapq.heapify(heap)
+        best, best_target = float('inf'), None
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d >= best:
+                break
+            if u in settled:
+                continue
+            settled.add(u)
+            if u in targets and d + targets[u] < best:
+                best, best_target = d + targets[u], u
+            for e, v in adjacency[u]:
+                nd = d + w[e]
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    pred[v] = e
+                    heapq.heappush(heap, (nd, v))
+        if best_target is None:
+            return None
+
+        path = []
+        node = best_target
+        while node in pred and dist[node] < sources.get(node, float('inf')):
+            e = pred[node]
+            path.append(e)
+            node = int(self.edge_u[e])
+        path.reverse()
+        return best, path, node, best_target
+
+    def bounded_search(self, sources, weights, spend, budget, targets=None):
+        """Single-source Dijkstra over `weights` that stops paths once their `spend` exceeds budget.
+
+        sources maps node index -> (cost, spent) on reaching it; spend is a second
+        per-edge array (e.g. seconds) summed along each path. Only nodes within
+        budget are ever pushed, so the work scales with the reachable area.
+        With targets (node indices), the search ends once all of them are settled.
+        Returns {node: (cost, spent, pred_edge)} for every settled node.
+        """
+        w = weights.tolist() if isinstance(weights, np.ndarray) else weights
+        s = spend.tolist() if isinstance(spend, np.ndarray) else spend
+        adjacency = self.adjacency()
+
+        best = {u: c for u, (c, _) in sources.items()}
+        labels = {u: (c, t, -1) for u, (c, t) in sources.items()}
+        heap = [(c, u) for u, (c, _) in sources.items()]
+        heapq.heapify(heap)
+        settled = {}
+        remaining = None if targets is None else set(targets)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled or d > best[u]:
+                continue
+            settled[u] = labels[u]
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            spent = labels[u][1]
+            for e, v in adjacency[u]:
+                ns = spent + s[e]
+                if ns > budget or v in settled:
+                    continue
+                nd = d + w[e]
+                if nd < best.get(v, float('inf')):
+                    best[v] = nd
+                    labels[v] = (nd, ns, e)
+                    heapq.heappush(heap, (nd, v))
+        return settled
+
+    def shortest_path(self, source, target, weights=None):
+        """Dijkstra between node indices; returns the edge ids of the path or None"""
+        found = self.search({source: 0.0}, {target: 0.0}, weights)
+        return None if found is None else found[1]
+
+
+class Route:
+    """Edge-id path whose first and last edges may be entered or left part-way.
+
+    start_t is the fraction of the first edge where the route starts, end_t the
+    fraction of the last edge where it ends (0 and 1 for node-to-node paths).
+    """
+
+    def __init__(self, edges, start_t=0.0, end_t=1.0):
+        self.edges = np.asarray(edges, dtype=np.int64)
+        self.start_t = float(start_t)
+        self.end_t = float(end_t)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def portions(self):
+        """Fraction of each edge actually ridden"""
+        portions = np.ones(len(self.edges))
+        if len(self.edges) == 1:
+            portions[0] = max(self.end_t - self.start_t, 0.0)
+        elif len(self.edges) > 1:
+            portions[0] = 1.0 - self.start_t
+            portions[-1] = self.end_t
+        return portions
+
+    def total(self, values):
+        """Sum of a per-edge array along the route, pro rata for partial edges"""
+        if len(self.edges) == 0:
+            return 0.0
+        return float((np.asarray(values)[self.edges] * self.portions()).sum())
+
+    def length(self, cg):
+        """Meters ridden"""
+        return self.total(cg.edge_length)
+
+    def nodes(self, cg):
+        """Node indices visited (including both ends of partial edges)"""
+        return cg.path_nodes(self.edges)
+
+    def coords(self, cg):
+        """(lon, lat) tuples along the route, trimmed at the split points"""
+        from shapely.geometry import LineString
+        from shapely.ops import substring
+
+        coords = []
+        last = len(self.edges) - 1
+        for i, e in enumerate(self.edges.tolist()):
+            xy = cg.edge_coords(e)
+            lo = self.start_t if i == 0 else 0.0
+            hi = self.end_t if i == last else 1.0
+            if lo > 0.0 or hi < 1.0:
+                part = substring(LineString(xy), lo, hi, normalized=True)
+                xy = np.asarray(part.coords) if not part.is_empty else xy[:0]
+            coords.extend(map(tuple, np.asarray(xy).tolist()))
+        return coords
@@ -101,3 +101,16 @@ for name, _, _, _ in AREAS:
 
 print(f"\n💾 Total cache size: {total_size / (1024 * 1024):.1f} MB")
 print("="*60)
+
+# Building footprints for shadow calculation (loaded once per server process)
+print("\n🏢 Caching building footprints...")
+from networks import load_buildings, buildings_path
+for name, _, _, _ in AREAS:
+    if os.path.exists(buildings_path(name)):
+        print(f"⏭️  {name}: Buildings already cached, skipping")
+        continue
+    try:
+        buildings = load_buildings(name)
+        print(f"✅ {name}: {len(buildings)} buildings")
+    except Exception as e:
+        print(f"❌ {name}: Buildings failed - {e}")
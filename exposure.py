@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Trip exposure analytics: how much of a route is ridden in shade, in the sun
+and on park connectors, and the heat dose of riding it.
+
+thermal_layers() keeps an (E, len(EXPOSURE_COLUMNS)) matrix of per-edge
+cover shares next to the cost features. A route's metrics are one gather of
+its edge ids and one product with its ridden lengths (partial split edges
+included), so they cost microseconds and never touch geometry.
+"""
+
+import os
+import numpy as np
+
+EXPOSURE_COLUMNS = ("shaded", "pcn", "water")
+
+# WBGT drop in shade: the sun's radiant heat on the globe thermometer is gone
+SHADE_WBGT_DROP_C = float(os.environ.get("COOLRIDE_SHADE_WBGT_DROP_C", "2.0"))
+
+
+def exposure_matrix(tree_frac, shadow_frac, both_frac, is_pcn, is_water):
+    """(E, len(EXPOSURE_COLUMNS)) share of each edge's length in shade, on a PCN, near water"""
+    shaded = np.clip(tree_frac + shadow_frac - both_frac, 0.0, 1.0)
+    return np.column_stack([shaded, np.asarray(is_pcn, dtype=np.float64),
+                            np.asarray(is_water, dtype=np.float64)])
+
+
+def route_exposure(cg, route, exposure, wbgt, speed_ms):
+    """Shaded / sun / PCN metres of a route and its heat dose.
+
+    heat_dose is WBGT integrated over the riding time in °C·min, with shaded
+    stretches SHADE_WBGT_DROP_C cooler; riding 10 minutes at 30 °C in full
+    sun is 300.
+    """
+    ridden = cg.edge_length[route.edges] * route.portions()
+    shaded_m, pcn_m, water_m = (ridden @ exposure[route.edges]).tolist() if len(ridden) else (0.0, 0.0, 0.0)
+    distance = float(ridden.sum())
+    minutes = distance / speed_ms / 60
+    dose = (distance * wbgt - shaded_m * SHADE_WBGT_DROP_C) / speed_ms / 60
+    return {
+        "distance_m": round(distance),
+        "shaded_m": round(shaded_m),
+        "sun_m": round(distance - shaded_m),
+        "pcn_m": round(pcn_m),
+        "water_m": round(water_m),
+        "shaded_pct": round(100.0 * shaded_m / distance, 1) if distance > 0 else 0.0,
+        "duration_min": round(minutes, 1),
+        "heat_dose": round(dose, 1),
+    }
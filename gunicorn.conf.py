@@ -0,0 +1,48 @@
+"""
+Gunicorn settings for multi-process serving.
+
+The app is imported and the area data preloaded in the master process, then
+forked workers share it copy-on-write. Most of it is array-backed
+(CompactGraph, CH/CCH arrays, shade rasters and matrices: NumPy or mmap), so
+searches read those pages without writing to them. The master also builds
+the GEOS-backed structures: the SnapIndex and overlay STRtrees, prepared
+overlay geometries, edge geometries and their SVY21 projections, and building
+footprints. Their coordinates live in GEOS memory that reads don't write, but
+each shapely object a worker touches gets a refcount write, which copies the
+page holding it into that worker. Only the per-node Python lists the search
+loops walk (CompactGraph.adjacency(), Hierarchy._search_lists()) are left
+to the workers: they are touched on every search and would be copied
+wholesale anyway.
+"""
+
+import gc
+import os
+from admission import SPARE_THREADS, lane_threads
+
+bind = f":{os.environ.get('PORT', '8080')}"
+preload_app = True
+# CPUs this process may run on (a container's cpuset), not the host's core count
+workers = int(os.environ.get("WEB_CONCURRENCY", len(os.sched_getaffinity(0))))
+# One thread per admitted or queued request or tile render (admission.py) plus spares:
+# with fewer, the lanes could never fill and turn requests away with 503
+threads = int(os.environ.get("GUNICORN_THREADS", lane_threads() + SPARE_THREADS))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "300"))
+
+
+def when_ready(server):
+    """Runs in the master after the app is imported, before any worker forks"""
+    from warmup import warm_up
+    warm_up(per_process=False)
+    # Keep collections in the workers from walking (and copying) every object
+    # allocated so far; refcount writes still copy whatever a worker touches
+    gc.freeze()
+    server.log.info("Warm-up finished; forking %s workers x %s threads", workers, threads)
+    if threads <= lane_threads():
+        server.log.warning("GUNICORN_THREADS=%s leaves no thread for queued requests: the admission lanes "
+                           "(%s active + queued slots) will never reject", threads, lane_threads())
+
+
+def post_worker_init(worker):
+    """Runs in each worker after fork: builds its private search lists"""
+    from warmup import warm_process_caches
+    warm_process_caches()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Lazy edge costing: cool_cost evaluated while the search runs.
+
+A search over a LazyCost reads edge weights one relaxation at a time. The
+first read of an edge costs every edge of its ~LAZY_CELL_M grid cell in one
+vectorized call (overlay queries, shade sampling) and keeps the results, so
+the thermal work scales with the part of the graph the search explores
+rather than with the whole network. Edges outside the corridor around the
+trip are never costed: they weigh inf, so no search relaxes them.
+"""
+
+import math
+import time
+import numpy as np
+from snapping import M_PER_DEG_LAT, M_PER_DEG_LON_EQUATOR
+
+LAZY_CELL_M = 250.0
+
+
+def corridor_edges(cg, a, b, max_length, keep=()):
+    """Edges with both ends inside the ellipse |pa| + |pb| <= max_length (a, b as lon/lat; metres),
+    plus the edges in keep.
+
+    A route of length L from a to b never leaves the ellipse for max_length = L,
+    so a corridor sized by the longest route the search could still prefer
+    loses nothing. Pass the snapped start and end edges (and their twins) as
+    keep: a route rides part of them, but on a long edge the far end node can
+    lie outside the ellipse.
+    """
+    kx = M_PER_DEG_LON_EQUATOR * math.cos(math.radians((a[1] + b[1]) / 2))
+    x = (np.asarray(cg.x) - a[0]) * kx
+    y = (np.asarray(cg.y) - a[1]) * M_PER_DEG_LAT
+    bx, by = (b[0] - a[0]) * kx, (b[1] - a[1]) * M_PER_DEG_LAT
+    inside = np.hypot(x, y) + np.hypot(x - bx, y - by) <= max_length
+    corridor = inside[cg.edge_u] & inside[cg.edge_v]
+    corridor[np.asarray(keep, dtype=np.int64)] = True
+    return corridor
+
+
+class LazyCost:
+    """Per-edge weights filled in cell by cell on first access.
+
+    cost_edges(edges) returns the weights of an array of edge ids. Indexing
+    works wherever a weight list does (CompactGraph.search, snapped_route);
+    stats() reports how much of the graph was actually costed.
+    """
+
+    def __init__(self, cg, cost_edges, corridor=None, cell_m=LAZY_CELL_M):
+        self.cost_edges = cost_edges
+        self.num_edges = cg.num_edges
+        allowed = np.ones(cg.num_edges, dtype=bool) if corridor is None else np.asarray(corridor, dtype=bool)
+        self.num_corridor = int(allowed.sum())
+
+        # Cell of an edge = grid cell of its tail node
+        lat0 = float(np.mean(cg.y)) if cg.num_nodes else 0.0
+        cx = np.floor(np.asarray(cg.x) * M_PER_DEG_LON_EQUATOR * math.cos(math.radians(lat0)) / cell_m)
+        cy = np.floor(np.asarray(cg.y) * M_PER_DEG_LAT / cell_m)
+        _, node_cell = np.unique(np.column_stack([cx, cy]), axis=0, return_inverse=True)
+        edge_cell = node_cell.ravel()[cg.edge_u]
+
+        inside = np.flatnonzero(allowed)
+        order = inside[np.argsort(edge_cell[inside], kind='stable')]
+        self._cell_edges = order
+        self._cell_ptr = np.searchsorted(edge_cell[order], np.arange(edge_cell.max(initial=-1) + 2))
+        self._cell = edge_cell.tolist()
+        self._cost = [None if a else float('inf') for a in allowed.tolist()]
+
+        self.num_costed = 0
+        self.num_cells = 0
+        self.cost_s = 0.0
+
+    def __len__(self):
+        return self.num_edges
+
+    def __getitem__(self, e):
+        cost = self._cost[e]
+        if cost is None:
+            self._fill(self._cell[e])
+            cost = self._cost[e]
+        return cost
+
+    def ensure(self, edges):
+        """Cost the cells of these edge ids now, e.g. for a route the search never explored"""
+        for e in np.asarray(edges, dtype=np.int64).tolist():
+            if self._cost[e] is None:
+                self._fill(self._cell[e])
+
+    def _fill(self, cell):
+        t0 = time.perf_counter()
+        edges = self._cell_edges[self._cell_ptr[cell]:self._cell_ptr[cell + 1]]
+        for e, cost in zip(edges.tolist(), np.asarray(self.cost_edges(edges), dtype=np.float64).tolist()):
+            self._cost[e] = cost
+        self.num_costed += len(edges)
+        self.num_cells += 1
+        self.cost_s += time.perf_counter() - t0
+
+    def stats(self):
+        """Edges costed vs corridor and graph size, and the time spent costing"""
+        return {"edges": self.num_edges, "corridor_edges": self.num_corridor,
+                "costed_edges": self.num_costed, "cells": self.num_cells,
+                "costed_pct": round(100.0 * self.num_costed / max(self.num_edges, 1), 1),
+                "cost_ms": round(self.cost_s * 1000, 1)}
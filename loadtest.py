@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Offline load test: serve the app under gunicorn against local stand-ins for
+NEA, Nominatim and Overpass (stub_services.py) and drive it with concurrent
+clients, once per worker/thread configuration.
+
+Each configuration runs in a sandbox directory whose data/ links to the real
+data files, so buildings fetched from the Overpass stub, the osmnx cache and
+the weather memory never land in the repo. Per endpoint it reports
+throughput and p50/p95/p99 latency; the `stream:fast` row is the time to the
+first route event on /calculate_route/stream. Results are appended to
+output/loadtest.jsonl.
+
+Usage: python loadtest.py [--configs 1x2,2x2,4x1] [--concurrency 8] [--duration 30]
+                          [--latency-ms nea=100,nominatim=300,overpass=800] [--failure-rate 0.02]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+import numpy as np
+import requests
+from benchmark_startup import wait_for, git_revision
+from networks import CACHED_NETWORKS, available_networks, DATA_DIR
+from stub_services import start_stubs, stub_environment
+
+RESULTS_FILE = "output/loadtest.jsonl"
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Files the server writes at runtime; kept out of the sandbox links
+RUNTIME_FILES = {"data", "output", "cache", "coolride_weather_memory.pkl", "__pycache__", ".git"}
+PLACE_SUFFIXES = ["MRT", "Hawker Centre", "Community Club", "Park", "Block 101"]
+
+
+def make_sandbox():
+    """Temp working directory linking the code and every data file"""
+    sandbox = tempfile.mkdtemp(prefix="coolride-loadtest-")
+    for entry in os.listdir(REPO_DIR):
+        if entry not in RUNTIME_FILES:
+            os.symlink(os.path.join(REPO_DIR, entry), os.path.join(sandbox, entry))
+    data_dir = os.path.join(sandbox, DATA_DIR)
+    os.makedirs(data_dir)
+    for entry in os.listdir(os.path.join(REPO_DIR, DATA_DIR)):
+        os.symlink(os.path.join(REPO_DIR, DATA_DIR, entry), os.path.join(data_dir, entry))
+    return sandbox
+
+
+def random_body(rng, areas, geocode_share):
+    """Route request inside one cached area; some use place names to exercise Nominatim"""
+    area = rng.choice(areas)
+    lat, lon, radius = CACHED_NETWORKS[area]
+
+    def point():
+        if rng.random() < geocode_share:
+            return f"{area.replace('_', ' ').title()} {rng.choice(PLACE_SUFFIXES)}"
+        r = radius * 0.6 * rng.random() / 111000
+        a = rng.random() * 2 * np.pi
+        return f"{lat + r * np.sin(a):.6f}, {lon + r * np.cos(a):.6f}"
+
+    return {"start": point(), "end": point(), "time": f"{rng.randint(7, 19):02d}:{rng.choice(['00', '30'])}"}
+
+
+def call(session, base, endpoint, body, timeout):
+    """Run one request; returns [(endpoint label, seconds, ok)]"""
+    t0 = time.monotonic()
+    try:
+        if endpoint == "ready":
+            resp = session.get(f"{base}/ready", timeout=timeout)
+            return [("ready", time.monotonic() - t0, resp.status_code == 200)]
+        if endpoint == "route":
+            resp = session.post(f"{base}/calculate_route", json=body, timeout=timeout)
+            ok = resp.status_code == 200 and resp.json().get("status") == "success"
+            return [("route", time.monotonic() - t0, ok)]
+        samples, last = [], None
+        with session.post(f"{base}/calculate_route/stream", json=body, timeout=timeout, stream=True) as resp:
+            for line in resp.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    last = line[7:]
+                    if last == "fast":
+                        samples.append(("stream:fast", time.monotonic() - t0, True))
+        return samples + [("stream", time.monotonic() - t0, last == "done")]
+    except (requests.RequestException, ValueError):
+        return [(endpoint, time.monotonic() - t0, False)]
+
+
+def drive(base, mix, concurrency, duration_s, timeout, geocode_share, seed):
+    """Closed-loop load: `concurrency` clients for duration_s; returns the raw samples"""
+    areas = available_networks()
+    endpoints, weights = zip(*mix.items())
+    samples = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration_s
+
+    def client(i):
+        rng = random.Random(seed + i)
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            endpoint = rng.choices(endpoints, weights)[0]
+            result = call(session, base, endpoint, random_body(rng, areas, geocode_share), timeout)
+            with lock:
+                samples.extend(result)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.monotonic() - t0
+
+
+def summarize(samples, elapsed_s):
+    """Per endpoint: count, errors, ok/s and latency percentiles (ms)"""
+    summary = {}
+    for label in sorted({s[0] for s in samples}):
+        rows = [s for s in samples if s[0] == label]
+        ok = np.array([s[1] for s in rows if s[2]])
+        summary[label] = {
+            "requests": len(rows),
+            "errors": len(rows) - len(ok),
+            "throughput_rps": round(len(ok) / elapsed_s, 2),
+            "p50_ms": round(float(np.percentile(ok, 50)) * 1000, 1) if len(ok) else None,
+            "p95_ms": round(float(np.percentile(ok, 95)) * 1000, 1) if len(ok) else None,
+            "p99_ms": round(float(np.percentile(ok, 99)) * 1000, 1) if len(ok) else None,
+        }
+    return summary
+
+
+def run_config(workers, threads, stubs, args, port):
+    """Launch gunicorn in a sandbox, wait for /ready, apply load, tear down"""
+    sandbox = make_sandbox()
+    env = dict(os.environ, **stub_environment(stubs), PORT=str(port), PYTHONUNBUFFERED="1",
+               WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads))
+    cmd = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "simple_server:app"]
+    log = open(os.path.join(sandbox, "server.log"), "w")
+    proc = subprocess.Popen(cmd, cwd=sandbox, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        ready_s = wait_for(lambda: requests.get(f"{base}/ready", timeout=2).status_code == 200, args.ready_timeout)
+        if ready_s is None:
+            print(f"   ❌ Not ready after {args.ready_timeout:.0f}s (log: {log.name})")
+            return None
+        print(f"   ✅ Ready in {ready_s:.1f}s, warming with {args.warmup_requests} requests...")
+        session = requests.Session()
+        for i in range(args.warmup_requests):
+            call(session, base, "route", random_body(random.Random(i), available_networks(), 0), args.timeout)
+        print(f"   🔨 {args.concurrency} clients for {args.duration:.0f}s...")
+        samples, elapsed = drive(base, args.mix, args.concurrency, args.duration, args.timeout,
+                                 args.geocode_share, args.seed)
+        return {"ready_s": round(ready_s, 2), "elapsed_s": round(elapsed, 2), "endpoints": summarize(samples, elapsed)}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+        if not args.keep_sandbox:
+            shutil.rmtree(sandbox, ignore_errors=True)
+
+
+def parse_mix(text):
+    return {k.strip(): float(v) for k, v in (item.split("=", 1) for item in text.split(","))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default="1x2,2x2", help="WORKERSxTHREADS list")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load per config")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("route=6,stream=3,ready=1"))
+    parser.add_argument("--geocode-share", type=float, default=0.2, help="share of endpoints given as place names")
+    parser.add_argument("--latency-ms", default="nea=80,nominatim=150,overpass=400")
+    parser.add_argument("--jitter-ms", default="30")
+    parser.add_argument("--failure-rate", default="0")
+    parser.add_argument("--warmup-requests", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--ready-timeout", type=float, default=600)
+    parser.add_argument("--port", type=int, default=8095)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep-sandbox", action="store_true", help="keep the sandbox (and server.log) for inspection")
+    args = parser.parse_args()
+
+    stubs = start_stubs(args.latency_ms, args.jitter_ms, args.failure_rate, seed=args.seed)
+    results = []
+    try:
+        for config in args.configs.split(","):
+            workers, threads = (int(v) for v in config.lower().split("x"))
+            print(f"\n🚀 {workers} worker(s) x {threads} thread(s)")
+            result = run_config(workers, threads, stubs, args, args.port)
+            if result is not None:
+                results.append(dict(result, workers=workers, threads=threads))
+    finally:
+        for stub in stubs.values():
+            stub.stop()
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "mix": args.mix,
+        "stub_latency_ms": args.latency_ms,
+        "stub_failure_rate": args.failure_rate,
+        "stub_requests": {name: stub.counts for name, stub in stubs.items()},
+        "configs": results,
+    }
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    print("\n📊 LOAD TEST")
+    print(f"   {'config':<8} {'endpoint':<12} {'reqs':>6} {'errs':>5} {'ok/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for result in results:
+        config = f"{result['workers']}x{result['threads']}"
+        for label, row in result["endpoints"].items():
+            print(f"   {config:<8} {label:<12} {row['requests']:>6} {row['errors']:>5} {row['throughput_rps']:>7} "
+                  f"{str(row['p50_ms']):>9} {str(row['p95_ms']):>9} {str(row['p99_ms']):>9}")
+    print(f"   Stub traffic: " + ", ".join(f"{name} {stub.counts['requests']}" for name, stub in stubs.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Process-wide registry for the read-only area data used by every request.
+Cached road networks, the tree index and building footprints are loaded
+once and shared; under gunicorn they are loaded in the master before the
+workers fork (see gunicorn.conf.py).
+
+Networks are served as CompactGraph arrays compiled from the GraphML files
+into data/compiled/<area>/ and memory-mapped, so every worker reads the
+same page-cache pages.
+"""
+
+import os
+import math
+import time
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import numpy as np
+from compact_graph import CompactGraph
+
+DATA_DIR = "data"
+COMPILED_DIR = os.path.join(DATA_DIR, "compiled")
+TREES_URL = os.path.join(DATA_DIR, "trees_downloaded.csv")
+TREES_GEOJSON_URL = os.path.join(DATA_DIR, "Trees_SG.geojson")
+
+# Upstream OSM services; overridden to point at local stand-ins (see stub_services.py)
+NOMINATIM_URL = os.environ.get("COOLRIDE_NOMINATIM_URL")
+OVERPASS_URL = os.environ.get("COOLRIDE_OVERPASS_URL")
+# A failed building footprint fetch is retried after this long, not on every request
+BUILDINGS_RETRY_S = float(os.environ.get("COOLRIDE_BUILDINGS_RETRY_S", "300"))
+# Footprint fetches around uncached points running at once (they outlive callers that gave up)
+MAX_BUILDING_FETCHES = int(os.environ.get("COOLRIDE_MAX_BUILDING_FETCHES", "2"))
+AROUND_PRECISION = 3      # fetches around points this many decimals apart are shared (~110 m)
+AROUND_PAD_M = 80         # covers the shift to the rounded point
+
+# Cached networks with their center points
+# Format: name -> (latitude, longitude, radius_in_meters)
+CACHED_NETWORKS = {
+    'tampines': (1.3530, 103.9450, 2000),
+    'orchard': (1.3048, 103.8318, 2000),
+    'marina_bay': (1.2806, 103.8510, 2000),
+    'city_hall': (1.2930, 103.8520, 2000),
+    'chinatown': (1.2838, 103.8446, 2000),
+    'botanic_gardens': (1.3138, 103.8159, 2000),
+    'east_coast_park': (1.3010, 103.9140, 2500),
+    'sentosa': (1.2494, 103.8303, 2000),
+    'bedok': (1.3236, 103.9273, 2000),
+    'pasir_ris': (1.3721, 103.9474, 2000),
+    'changi': (1.3644, 103.9915, 2000),
+    'bishan': (1.3521, 103.8484, 2000),
+    'ang_mo_kio': (1.3691, 103.8454, 2000),
+    'clementi': (1.3162, 103.7649, 2000),
+    'jurong_east': (1.3329, 103.7436, 2000),
+}
+
+_lock = threading.RLock()
+_networks = {}
+_compact = {}
+_snap_indexes = {}
+_hierarchies = {}
+_cch_topologies = {}
+_buildings = {}
+_building_loads = {}     # name -> Future of the running read / fetch
+_building_failures = {}  # name -> (monotonic time, error) of the last failed fetch
+_around_loads = {}       # (lat, lon, dist) rounded -> Future of the running fetch
+_area_shades = {}
+_shade_matrices = {}
+_tree_index = None
+
+
+def import_osmnx():
+    """Import osmnx (slow, so only where needed) with the configured service URLs"""
+    import osmnx as ox
+    if NOMINATIM_URL:
+        ox.settings.nominatim_url = NOMINATIM_URL
+    if OVERPASS_URL:
+        ox.settings.overpass_url = OVERPASS_URL
+    return ox
+
+
+def network_path(name):
+    """Path of the cached GraphML file for an area"""
+    return os.path.join(DATA_DIR, f"{name}_network.graphml")
+
+
+def compiled_path(name):
+    """Directory holding the compiled CompactGraph arrays for an area"""
+    return os.path.join(COMPILED_DIR, name)
+
+
+def buildings_path(name):
+    """Path of the cached building footprints for an area"""
+    return os.path.join(DATA_DIR, f"{name}_buildings.geojson")
+
+
+def available_networks():
+    """Names of cached areas whose network file is deployed"""
+    return [name for name in CACHED_NETWORKS if os.path.exists(network_path(name))]
+
+
+def find_cached_network(lat, lon):
+    """Closest cached area whose radius covers the point, or None"""
+    best_match = None
+    min_distance = float('inf')
+    for name in available_networks():
+        c_lat, c_lon, radius = CACHED_NETWORKS[name]
+        distance = math.sqrt((lat - c_lat)**2 + (lon - c_lon)**2) * 111000  # rough meters
+        if distance < radius and distance < min_distance:
+            min_distance = distance
+            best_match = name
+    return best_match
+
+
+def load_network(name):
+    """Load a cached area network once per process (treat the result as read-only)"""
+    G = _networks.get(name)
+    if G is not None:
+        return G
+    with _lock:
+        G = _networks.get(name)
+        if G is None:
+            ox = import_osmnx()
+            print(f"   📦 Loading cached {name} network...")
+            G = ox.load_graphml(network_path(name))
+            _networks[name] = G
+            print(f"   ✅ Network loaded! ({len(G.nodes)} nodes, {len(G.edges)} edges)")
+    return G
+
+
+def compile_network(name):
+    """Convert an area's GraphML into CompactGraph arrays on disk"""
+    cg = CompactGraph.from_networkx(load_network(name), name=name)
+    cg.save(compiled_path(name))
+    print(f"   🗜️ Compiled {name}: {cg.num_nodes} nodes, {cg.num_edges} edges, {cg.nbytes() / 1e6:.1f} MB")
+    return cg
+
+
+def _compiled_is_fresh(name):
+    meta = os.path.join(compiled_path(name), "meta.json")
+    return os.path.exists(meta) and os.path.getmtime(meta) >= os.path.getmtime(network_path(name))
+
+
+def load_compact(name):
+    """Memory-mapped CompactGraph for a cached area, compiling it on first use"""
+    cg = _compact.get(name)
+    if cg is not None:
+        return cg
+    with _lock:
+        cg = _compact.get(name)
+        if cg is None:
+            if not _compiled_is_fresh(name):
+                compile_network(name)
+            cg = CompactGraph.load(compiled_path(name), mmap=True)
+            _compact[name] = cg
+    return cg
+
+
+def loaded_networks():
+    """Names of the areas whose CompactGraph this process has loaded"""
+    return list(_compact)
+
+
+def load_snap_index(name):
+    """Edge snapping index for a cached area, built once per process"""
+    index = _snap_indexes.get(name)
+    if index is not None:
+        return index
+    with _lock:
+        index = _snap_indexes.get(name)
+        if index is None:
+            from snapping import SnapIndex
+            index = SnapIndex(load_compact(name))
+            _snap_indexes[name] = index
+    return index
+
+
+def _derived_is_fresh(name, marker):
+    """True if a file derived from the compiled arrays exists and is newer than them"""
+    directory = compiled_path(name)
+    path = os.path.join(directory, marker)
+    return (_compiled_is_fresh(name) and os.path.exists(path) and
+            os.path.getmtime(path) >= os.path.getmtime(os.path.join(directory, "meta.json")))
+
+
+def _hierarchy_is_fresh(name):
+    # down_arcs is written last, so its presence means a complete save
+    return _derived_is_fresh(name, "ch_down_arcs.npy")
+
+
+def build_hierarchy_for(name):
+    """Contract an area's compiled network under `length` and persist it beside the arrays"""
+    from ch import build_hierarchy
+    import time
+    t0 = time.time()
+    hierarchy = build_hierarchy(load_compact(name))
+    hierarchy.save(compiled_path(name))
+    print(f"   🔺 Contracted {name}: {hierarchy.num_arcs} arcs in {time.time() - t0:.1f}s")
+    return hierarchy
+
+
+def load_hierarchy(name):
+    """Memory-mapped distance contraction hierarchy for a cached area, built on first use"""
+    hierarchy = _hierarchies.get(name)
+    if hierarchy is not None:
+        return hierarchy
+    with _lock:
+        hierarchy = _hierarchies.get(name)
+        if hierarchy is None:
+            from ch import Hierarchy
+            if not _hierarchy_is_fresh(name):
+                build_hierarchy_for(name)
+            hierarchy = Hierarchy.load(compiled_path(name), mmap=True)
+            _hierarchies[name] = hierarchy
+    return hierarchy
+
+
+def build_cch_for(name):
+    """Metric-independent CCH preprocessing of an area, persisted beside the arrays"""
+    from cch import build_topology
+    import time
+    t0 = time.time()
+    topology = build_topology(load_compact(name))
+    topology.save(compiled_path(name))
+    print(f"   🔺 CCH {name}: {topology.num_arcs} arcs, {topology.num_triangles} triangles "
+          f"in {time.time() - t0:.1f}s")
+    return topology
+
+
+def load_cch(name):
+    """Memory-mapped CCH topology for a cached area, built on first use"""
+    topology = _cch_topologies.get(name)
+    if topology is not None:
+        return topology
+    with _lock:
+        topology = _cch_topologies.get(name)
+        if topology is None:
+            from cch import CCHTopology
+            if not _derived_is_fresh(name, "cch_level_ptr.npy"):
+                build_cch_for(name)
+            topology = CCHTopology.load(compiled_path(name), mmap=True)
+            _cch_topologies[name] = topology
+    return topology
+
+
+def compile_all():
+    """Compile every deployed area network and its hierarchies (run at image build time)"""
+    for name in available_networks():
+        if not _compiled_is_fresh(name):
+            compile_network(name)
+        if not _hierarchy_is_fresh(name):
+            build_hierarchy_for(name)
+        if not _derived_is_fresh(name, "cch_level_ptr.npy"):
+            build_cch_for(name)
+
+
+class TreeIndex:
+    """Tree positions as lon-sorted NumPy arrays for cheap bounding-box filtering"""
+
+    def __init__(self, lons, lats):
+        order = np.argsort(lons, kind='stable')
+        self.lons = np.ascontiguousarray(lons[order], dtype=np.float64)
+        self.lats = np.ascontiguousarray(lats[order], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.lons)
+
+    def query_bbox(self, minx, miny, maxx, maxy):
+        """Return (lons, lats) of the trees inside the bounding box"""
+        lo = np.searchsorted(self.lons, minx, side='left')
+        hi = np.searchsorted(self.lons, maxx, side='right')
+        lons = self.lons[lo:hi]
+        lats = self.lats[lo:hi]
+        mask = (lats >= miny) & (lats <= maxy)
+        return lons[mask], lats[mask]
+
+
+def _read_tree_index():
+    if os.path.exists(TREES_URL):
+        import pandas as pd
+        trees_df = pd.read_csv(TREES_URL)
+        # Verify columns exist
+        if 'lat' not in trees_df.columns or 'lng' not in trees_df.columns:
+            print(f"   ⚠️ Tree CSV missing columns. Found: {list(trees_df.columns)}")
+            print(f"   ⚠️ File size: {os.path.getsize(TREES_URL)} bytes - may be LFS pointer file")
+            return None
+        trees_df = trees_df.dropna(subset=['lat', 'lng'])
+        return TreeIndex(trees_df['lng'].to_numpy(dtype=np.float64),
+                         trees_df['lat'].to_numpy(dtype=np.float64))
+    if os.path.exists(TREES_GEOJSON_URL):
+        import geopandas as gpd
+        trees_gdf = gpd.read_file(TREES_GEOJSON_URL)
+        if trees_gdf.crs is not None and trees_gdf.crs != "EPSG:4326":
+            trees_gdf = trees_gdf.to_crs("EPSG:4326")
+        return TreeIndex(trees_gdf.geometry.x.to_numpy(), trees_gdf.geometry.y.to_numpy())
+    print("   ⚠️ Tree data missing (skipping)")
+    return None
+
+
+def load_tree_index():
+    """Load the island-wide tree index once per process (None if no tree data)"""
+    global _tree_index
+    if _tree_index is None:
+        with _lock:
+            if _tree_index is None:
+                try:
+                    index = _read_tree_index()
+                except Exception as e:
+                    print(f"   ⚠️ Tree Error: {e}")
+                    index = None
+                # False marks "looked, nothing there" so we don't re-read every request
+                _tree_index = index if index is not None else False
+                if index is not None:
+                    print(f"   🌳 Tree index ready ({len(index)} trees)")
+    return _tree_index or None
+
+
+def load_area_shade(name):
+    """Raster shade grid, edge samples and tree-crown flags for a cached area"""
+    shade = _area_shades.get(name)
+    if shade is not None:
+        return shade
+    with _lock:
+        shade = _area_shades.get(name)
+        if shade is None:
+            from shade_raster import AreaShade
+            shade = AreaShade(load_compact(name), load_tree_index())
+            _area_shades[name] = shade
+            print(f"   🌳 {name} canopy rasterized ({shade.num_trees} trees, {len(shade.samples)} edge samples)")
+    return shade
+
+
+def _shade_matrix_is_fresh(name):
+    """Shade matrix saved after the compiled arrays and after the buildings and trees it was swept from"""
+    if not _derived_is_fresh(name, "shade_meta.json"):
+        return False
+    built = os.path.getmtime(os.path.join(compiled_path(name), "shade_meta.json"))
+    sources = [buildings_path(name), TREES_URL, TREES_GEOJSON_URL]
+    return all(os.path.getmtime(path) <= built for path in sources if os.path.exists(path))
+
+
+def load_shade_matrix(name):
+    """Memory-mapped edge x sun-slot shade matrix of an area (see shade_matrix.py), or None"""
+    if name in _shade_matrices:
+        return _shade_matrices[name]
+    with _lock:
+        if name not in _shade_matrices:
+            matrix = None
+            if _shade_matrix_is_fresh(name):
+                from shade_matrix import ShadeMatrix
+                matrix = ShadeMatrix.load(compiled_path(name), mmap=True)
+                print(f"   ☀️ {name} shade matrix mapped ({matrix.num_columns} sun slots)")
+            _shade_matrices[name] = matrix
+    return _shade_matrices[name]
+
+
+def buildings_ready(name):
+    """Footprints of a cached area are in memory or on disk (no OSM fetch needed)"""
+    return name in _buildings or os.path.exists(buildings_path(name))
+
+
+class BuildingsUnavailable(Exception):
+    """Footprints not at hand in time: a recent fetch failed or one is still running"""
+
+
+def _in_background(fn, *args):
+    """Future of fn(*args) run on a daemon thread (an abandoned OSM fetch never blocks exit)"""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"fetch-{fn.__name__}", daemon=True).start()
+    return future
+
+
+def _wait(future, timeout, what):
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        raise BuildingsUnavailable(f"{what} still loading after {timeout:.0f}s")
+
+
+def fetch_buildings(lat, lon, dist):
+    """Building footprint polygons (WGS84) within dist metres of a point, from OSM"""
+    ox = import_osmnx()
+    buildings_gdf = ox.features_from_point((lat, lon), tags={'building': True}, dist=dist)
+    buildings_gdf = buildings_gdf[buildings_gdf.geometry.type == 'Polygon'][['geometry']]
+    return buildings_gdf.reset_index(drop=True)
+
+
+def _fetch_around(key):
+    lat, lon, dist = key
+    try:
+        return fetch_buildings(lat, lon, dist + AROUND_PAD_M)
+    finally:
+        with _lock:
+            _around_loads.pop(key, None)
+
+
+def fetch_buildings_around(lat, lon, dist, timeout=None):
+    """fetch_buildings, giving up (BuildingsUnavailable) after timeout seconds.
+
+    Callers around the same rounded point share one fetch, which carries on
+    after they give up. At most MAX_BUILDING_FETCHES run at once; beyond that
+    a new point raises BuildingsUnavailable without starting one.
+    """
+    key = (round(lat, AROUND_PRECISION), round(lon, AROUND_PRECISION), dist)
+    with _lock:
+        future = _around_loads.get(key)
+        if future is None:
+            if len(_around_loads) >= MAX_BUILDING_FETCHES:
+                raise BuildingsUnavailable(f"{len(_around_loads)} OSM building fetches already running")
+            future = _around_loads[key] = _in_background(_fetch_around, key)
+    return _wait(future, timeout, "OSM buildings")
+
+
+def _read_or_fetch_buildings(name):
+    import geopandas as gpd
+    try:
+        path = buildings_path(name)
+        if os.path.exists(path):
+            buildings_gdf = gpd.read_file(path)
+        else:
+            lat, lon, radius = CACHED_NETWORKS[name]
+            print(f"   🏢 Fetching {name} buildings from OSM...")
+            buildings_gdf = fetch_buildings(lat, lon, radius)
+            try:
+                buildings_gdf.to_file(path, driver='GeoJSON')
+            except Exception as e:
+                print(f"   ⚠️ Could not persist {name} buildings: {e}")
+        with _lock:
+            _buildings[name] = buildings_gdf
+        return buildings_gdf
+    except Exception as e:
+        with _lock:
+            _building_failures[name] = (time.monotonic(), f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        with _lock:
+            _building_loads.pop(name, None)
+
+
+def load_buildings(name, timeout=None):
+    """Building footprints for a cached area, fetched from OSM once and kept on disk.
+
+    One read or fetch runs per area, on its own thread: the registry lock is
+    held only to publish, so a slow fetch never blocks other areas. Callers
+    wait at most timeout seconds; the load carries on and serves later calls.
+    A failed fetch is not retried for BUILDINGS_RETRY_S. Both raise
+    BuildingsUnavailable.
+    """
+    if name in _buildings:
+        return _buildings[name]
+    with _lock:
+        if name in _buildings:
+            return _buildings[name]
+        failed = _building_failures.get(name)
+        if failed and time.monotonic() - failed[0] < BUILDINGS_RETRY_S:
+            raise BuildingsUnavailable(f"{name} buildings fetch failed "
+                                       f"{time.monotonic() - failed[0]:.0f}s ago ({failed[1]})")
+        future = _building_loads.get(name)
+        if future is None:
+            future = _building_loads[name] = _in_background(_read_or_fetch_buildings, name)
+    return _wait(future, timeout, f"{name} buildings")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+City-wide origin/destination matrix: fast vs cool route distance per pair.
+
+Every origin (default: MRT stations) is paired with every destination
+(default: hawker centres) within --radius metres in a straight line. Pairs are
+sharded by cached area, a few origins per shard, and the shards are routed in
+a process pool. A worker computes an area's cool_cost for the departure slot
+once and then runs one Dijkstra per origin and metric that settles all of
+that origin's destinations (snapped_costs), so the work per pair is a share
+of a search instead of a route request.
+
+Each finished shard is written as its own part file (Parquet, which needs
+pyarrow, or CSV with --format csv) under --output; the parts are the
+checkpoint, so rerunning the same job only routes the missing shards. A
+rerun reuses the job's date and format unless they are given. When every
+shard is done the parts are combined into <output>/matrix.parquet (or .csv).
+
+Usage: python od_matrix.py [--origins mrt] [--destinations hawker] [--radius 3000]
+                           [--time 08:00] [--date YYYY-MM-DD] [--format parquet|csv]
+                           [--processes 4] [--chunk 4] [--output output/od_matrix]
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import multiprocessing
+import pandas as pd
+import shapely
+from networks import CACHED_NETWORKS, available_networks, load_compact, load_snap_index
+from overlays import OVERLAY_FILES, OverlayLayer, overlay, overlay_generation
+from snapping import snapped_costs
+
+COLUMNS = ["origin", "origin_name", "destination", "destination_name", "area",
+           "straight_m", "fast_m", "cool_m", "detour_ratio", "origin_snap_m", "destination_snap_m"]
+
+
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def load_points(spec):
+    """Point layer from an overlay name (mrt, hawker, ...) or a GeoJSON path"""
+    if spec in OVERLAY_FILES:
+        layer = overlay(spec)
+        if layer is None:
+            sys.exit(f"❌ {spec} overlay missing ({OVERLAY_FILES[spec][0]})")
+        return layer
+    import geopandas as gpd
+    return OverlayLayer(os.path.basename(spec), gpd.read_file(spec))
+
+
+def point_names(layer):
+    for column in ("name", "NAME", "Name"):
+        if column in layer.frame.columns:
+            return layer.frame[column].astype(str).tolist()
+    return [f"{layer.name}-{i}" for i in range(len(layer))]
+
+
+def pair_area(lat1, lon1, lat2, lon2):
+    """Cached area covering both points, preferring the one find_cached_network picks for the first"""
+    best, best_distance = None, float('inf')
+    for name in available_networks():
+        c_lat, c_lon, radius = CACHED_NETWORKS[name]
+        d1 = math.sqrt((lat1 - c_lat)**2 + (lon1 - c_lon)**2) * 111000  # rough meters
+        d2 = math.sqrt((lat2 - c_lat)**2 + (lon2 - c_lon)**2) * 111000
+        if d1 < radius and d2 < radius and d1 < best_distance:
+            best, best_distance = name, d1
+    return best
+
+
+def build_shards(origins, dests, radius, chunk):
+    """Shards of (shard_id, area, [(origin, lat, lon, [(dest, lat, lon, straight_m), ...]), ...]).
+
+    Returns (shards, pairs, uncovered): pairs no single cached area covers are left out.
+    """
+    o_idx, d_idx = dests.tree.query(origins.geometries, predicate='dwithin', distance=radius)
+    straight = shapely.distance(origins.geometries[o_idx], dests.geometries[d_idx])
+    o_lon, o_lat = shapely.get_x(origins.frame.geometry.values), shapely.get_y(origins.frame.geometry.values)
+    d_lon, d_lat = shapely.get_x(dests.frame.geometry.values), shapely.get_y(dests.frame.geometry.values)
+
+    by_area, uncovered = {}, 0
+    for o, d, s in zip(o_idx.tolist(), d_idx.tolist(), straight.tolist()):
+        area = pair_area(o_lat[o], o_lon[o], d_lat[d], d_lon[d])
+        if area is None:
+            uncovered += 1
+            continue
+        by_area.setdefault(area, {}).setdefault(o, []).append((d, d_lat[d], d_lon[d], s))
+
+    shards = []
+    for area in sorted(by_area):
+        items = [(o, o_lat[o], o_lon[o], targets) for o, targets in sorted(by_area[area].items())]
+        for k in range(0, len(items), chunk):
+            shards.append((f"{area}-{k // chunk:03d}", area, items[k:k + chunk]))
+    # Largest shards first, so the pool does not end waiting on one big straggler
+    shards.sort(key=lambda shard: -sum(len(item[3]) for item in shard[2]))
+    return shards, len(o_idx) - uncovered, uncovered
+
+
+def route_shard(task):
+    """Worker: fast and cool route length of every pair in a shard -> (shard_id, rows, seconds)"""
+    from simple_server import area_thermal_layers
+    shard_id, area, items, slot_start = task
+    t0 = time.perf_counter()
+    cg = load_compact(area)
+    index = load_snap_index(area)
+    # Cached per worker, area and slot: later shards of the same area reuse it
+    cool_cost = cg.edge_length * area_thermal_layers(area, slot_start, overlay_generation())["factor"]
+
+    rows = []
+    for o, lat, lon, targets in items:
+        origin = index.snap_point(lon, lat)
+        snaps = [index.snap_point(d_lon, d_lat) for _, d_lat, d_lon, _ in targets]
+        fast = snapped_costs(index, origin, snaps, cg.edge_length)
+        cool = snapped_costs(index, origin, snaps, cool_cost, cg.edge_length)
+        for (d, _, _, straight), snap, f, c in zip(targets, snaps, fast, cool):
+            fast_m = None if f is None else f[0]
+            cool_m = None if c is None else c[1]
+            ratio = cool_m / fast_m if fast_m and cool_m is not None else None
+            rows.append((o, d, area, straight, fast_m, cool_m, ratio, origin.distance_m, snap.distance_m))
+    return shard_id, rows, time.perf_counter() - t0
+
+
+def part_path(output, shard_id, fmt):
+    return os.path.join(output, f"part-{shard_id}.{fmt}")
+
+
+def write_table(path, frame, fmt):
+    """Write a table atomically (tmp file + rename), so a part is either complete or absent"""
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        frame.to_parquet(tmp, index=False)
+    else:
+        frame.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def read_table(path, fmt):
+    return pd.read_parquet(path) if fmt == "parquet" else pd.read_csv(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--origins", default="mrt", help="overlay name or point GeoJSON path")
+    parser.add_argument("--destinations", default="hawker", help="overlay name or point GeoJSON path")
+    parser.add_argument("--radius", type=float, default=3000, help="max straight-line metres per pair")
+    parser.add_argument("--time", default="08:00", help="departure HH:MM (Singapore time)")
+    parser.add_argument("--date", help="departure date YYYY-MM-DD (default: the job's, else today)")
+    parser.add_argument("--format", choices=["parquet", "csv"],
+                        help="part and matrix format (default: the job's, else parquet)")
+    parser.add_argument("--processes", type=int, default=len(os.sched_getaffinity(0)),
+                        help="worker processes (default: the CPUs this job may run on)")
+    parser.add_argument("--chunk", type=int, default=4, help="origins per shard")
+    parser.add_argument("--output", default="output/od_matrix", help="directory for parts and the matrix")
+    args = parser.parse_args()
+
+    # A rerun resumes the job in --output: its date and format are the defaults
+    job_path = os.path.join(args.output, "job.json")
+    previous = None
+    if os.path.exists(job_path):
+        with open(job_path) as f:
+            previous = json.load(f)
+    date = args.date or (previous["departure_slot"][:10] if previous else None)
+    fmt = args.format or (previous["format"] if previous else "parquet")
+    if fmt == "parquet" and not has_pyarrow():
+        sys.exit("❌ Parquet output needs pyarrow (pip install pyarrow); or pass --format csv")
+
+    # Imported here so forked workers inherit the loaded server module
+    from simple_server import parse_departure_time, sun_slot
+    departure = parse_departure_time(args.time)
+    if date:
+        year, month, day = map(int, date.split('-'))
+        departure = departure.replace(year=year, month=month, day=day)
+    slot_start = sun_slot(departure)
+
+    origins, dests = load_points(args.origins), load_points(args.destinations)
+    names = {"origin": point_names(origins), "destination": point_names(dests)}
+    shards, pairs, uncovered = build_shards(origins, dests, args.radius, args.chunk)
+    print(f"🧮 {pairs} pairs ({args.origins} -> {args.destinations} within {args.radius:.0f}m) "
+          f"in {len(shards)} shards over {len({s[1] for s in shards})} areas")
+    if uncovered:
+        print(f"   ⚠️ {uncovered} pairs skipped: no cached area covers both ends")
+    if not shards:
+        sys.exit("❌ No pairs to route")
+
+    # The job file pins the parameters the parts were computed with
+    os.makedirs(args.output, exist_ok=True)
+    job = {"origins": args.origins, "destinations": args.destinations, "radius": args.radius,
+           "departure_slot": slot_start.isoformat(), "chunk": args.chunk, "format": fmt}
+    if previous is not None:
+        if previous != job:
+            sys.exit(f"❌ {args.output} holds a different job ({previous}); use another --output")
+    else:
+        with open(job_path, "w") as f:
+            json.dump(job, f, indent=2)
+
+    pending = [(shard_id, area, items, slot_start) for shard_id, area, items in shards
+               if not os.path.exists(part_path(args.output, shard_id, fmt))]
+    if len(pending) < len(shards):
+        print(f"   ♻️ Resuming: {len(shards) - len(pending)} shards already done")
+
+    done = busy = 0
+    t0 = time.perf_counter()
+    if pending:
+        processes = max(1, min(args.processes, len(pending)))
+        print(f"🚴 Routing {len(pending)} shards on {processes} processes ({fmt} parts in {args.output})")
+        with multiprocessing.Pool(processes) as pool:
+            for shard_id, rows, seconds in pool.imap_unordered(route_shard, pending):
+                frame = pd.DataFrame(rows, columns=["origin", "destination", "area", "straight_m", "fast_m",
+                                                    "cool_m", "detour_ratio", "origin_snap_m", "destination_snap_m"])
+                frame.insert(1, "origin_name", [names["origin"][o] for o in frame["origin"]])
+                frame.insert(3, "destination_name", [names["destination"][d] for d in frame["destination"]])
+                write_table(part_path(args.output, shard_id, fmt), frame[COLUMNS], fmt)
+                done += len(frame)
+                busy += seconds
+                elapsed = time.perf_counter() - t0
+                print(f"   ✅ {shard_id}: {len(frame)} pairs in {seconds:.1f}s "
+                      f"({done / elapsed:.0f} pairs/s overall)")
+        elapsed = time.perf_counter() - t0
+        print(f"⏱️ {done} pairs in {elapsed:.1f}s: {done / elapsed:.0f} pairs/s, "
+              f"worker busy {busy:.1f}s ({busy / elapsed:.1f}x parallel)")
+
+    matrix = pd.concat([read_table(part_path(args.output, shard_id, fmt), fmt)
+                        for shard_id in sorted(s[0] for s in shards)], ignore_index=True)
+    matrix_path = os.path.join(args.output, f"matrix.{fmt}")
+    write_table(matrix_path, matrix, fmt)
+    routed = matrix["fast_m"].notna()
+    print(f"📄 {matrix_path}: {len(matrix)} pairs, {int((~routed).sum())} unroutable, "
+          f"median detour {matrix.loc[routed, 'detour_ratio'].median():.3f}")
+
+
+if __name__ == "__main__":
+    main()
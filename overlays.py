@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Shared overlay layers: park connectors, water bodies and amenity points.
+
+Each data file is read once per process, projected to SVY21 (EPSG:3414) and
+indexed by an STRtree over prepared geometries, so requests answer bbox and
+predicate queries without touching the files. Under gunicorn the layers are
+loaded in the master before the workers fork (see warmup.py).
+
+Files are re-stat'ed at most every OVERLAY_CHECK_S seconds. A changed file is
+read in full off the lock and then swapped in; requests already holding the
+old layer finish with it. A file that fails to read (e.g. mid-write; replace
+files with a rename) keeps the old layer and is retried on the next check.
+Every swap bumps overlay_generation(), which keys the caches derived from
+overlays.
+"""
+
+import os
+import time
+import threading
+import numpy as np
+import shapely
+from shade_raster import to_svy21, geometries_to_svy21
+
+OVERLAY_CHECK_S = float(os.environ.get("COOLRIDE_OVERLAY_CHECK_S", "5"))
+
+# name -> (path, buffer in metres applied after projecting)
+OVERLAY_FILES = {
+    'pcn': ("data/ParkConnectorLoop.geojson", 0),
+    'water': ("data/URA_Waterbody.geojson", 100),  # cooling reaches ~100 m from the water
+    'hawker': ("data/hawker_centres.geojson", 0),
+    'mrt': ("data/mrt_stations.geojson", 0),
+    'landmarks': ("data/landmarks.geojson", 0),
+}
+
+_lock = threading.Lock()
+_layers = {}
+_stamps = {}
+_checked = {}
+_edge_geoms = {}
+_generation = 0
+
+
+class OverlayLayer:
+    """One overlay file: WGS84 attribute rows plus prepared SVY21 geometries in an STRtree"""
+
+    def __init__(self, name, frame, buffer_m=0, stamp=None):
+        if frame.crs is not None and frame.crs != "EPSG:4326":
+            frame = frame.to_crs("EPSG:4326")
+        self.name = name
+        self.stamp = stamp
+        self.frame = frame.reset_index(drop=True)
+        geoms = geometries_to_svy21(self.frame.geometry.to_numpy())
+        if buffer_m:
+            geoms = shapely.buffer(geoms, buffer_m)
+        shapely.prepare(geoms)
+        self.geometries = geoms
+        self.tree = shapely.STRtree(geoms)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def query(self, geoms, predicate='intersects'):
+        """(input index, layer index) pairs where SVY21 geoms meet layer geometries"""
+        return self.tree.query(np.asarray(geoms, dtype=object), predicate=predicate)
+
+    def hits(self, geoms, predicate='intersects'):
+        """Per SVY21 geometry: does it meet any layer geometry"""
+        hit = np.zeros(len(geoms), dtype=bool)
+        if len(self):
+            hit[self.query(geoms, predicate)[0]] = True
+        return hit
+
+    def query_bbox(self, minx, miny, maxx, maxy):
+        """Sorted indices of the layer geometries meeting a WGS84 bounding box"""
+        xs, ys = to_svy21([minx, maxx, maxx, minx], [miny, miny, maxy, maxy])
+        box = shapely.polygons(np.column_stack([xs, ys]))
+        return np.sort(self.tree.query(box, predicate='intersects'))
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read(name, stamp):
+    """OverlayLayer from disk, or None if the file is missing or unreadable"""
+    path, buffer_m = OVERLAY_FILES[name]
+    if stamp is None:
+        print(f"   ⚠️ {name} overlay missing ({path})")
+        return None
+    try:
+        import geopandas as gpd
+        layer = OverlayLayer(name, gpd.read_file(path), buffer_m, stamp)
+        print(f"   🗺️ {name} overlay loaded ({len(layer)} features)")
+        return layer
+    except Exception as e:
+        print(f"   ⚠️ {name} overlay error: {e}")
+        return None
+
+
+def _check(name):
+    """Reload name if its file changed since the last check (at most every OVERLAY_CHECK_S)"""
+    global _generation
+    now = time.monotonic()
+    if now - _checked.get(name, now) < OVERLAY_CHECK_S:
+        return
+    with _lock:
+        # One thread checks; the rest keep serving the current layer meanwhile
+        if now - _checked[name] < OVERLAY_CHECK_S:
+            return
+        _checked[name] = now
+    stamp = _stamp(OVERLAY_FILES[name][0])
+    if stamp == _stamps[name]:
+        return
+    layer = _read(name, stamp)
+    if layer is None and stamp is not None:
+        return  # unreadable: keep the old layer, retry next check
+    with _lock:
+        _layers[name] = layer
+        _stamps[name] = stamp
+        _generation += 1
+    print(f"   🔄 {name} overlay reloaded")
+
+
+def overlay(name):
+    """Current OverlayLayer for name, loaded on first use (None if its file is missing)"""
+    if name not in _layers:
+        with _lock:
+            if name not in _layers:
+                stamp = _stamp(OVERLAY_FILES[name][0])
+                _layers[name] = _read(name, stamp)
+                _stamps[name] = stamp
+                _checked[name] = time.monotonic()
+        return _layers[name]
+    _check(name)
+    return _layers[name]
+
+
+def overlay_generation():
+    """Counter bumped by every reload; include it in keys of anything derived from overlays"""
+    for name in list(_layers):
+        _check(name)
+    return _generation
+
+
+def load_overlays():
+    """Load every overlay layer (warm-up)"""
+    for name in OVERLAY_FILES:
+        overlay(name)
+
+
+def projected_edges(cg, key=None):
+    """SVY21 LineStrings of every edge of cg, kept per key (area name) when given"""
+    geoms = _edge_geoms.get(key) if key else None
+    if geoms is None:
+        geoms = geometries_to_svy21(cg.edge_geometries())
+        if key:
+            _edge_geoms[key] = geoms
+    return geoms
+
+
+def edge_hits(name, cg, key=None, edges=None):
+    """Which edges of cg (or of the edge ids `edges`) meet overlay `name` (none if the layer is missing)"""
+    layer = overlay(name)
+    if layer is None:
+        return np.zeros(cg.num_edges if edges is None else len(edges), dtype=bool)
+    if edges is None:
+        return layer.hits(projected_edges(cg, key))
+    if key:
+        return layer.hits(projected_edges(cg, key)[edges])
+    return layer.hits(geometries_to_svy21(cg.edge_geometries()[edges]))
+
+
+def overlay_rows(name, bounds):
+    """WGS84 attribute rows of overlay `name` meeting bounds (minx, miny, maxx, maxy)"""
+    layer = overlay(name)
+    if layer is None:
+        raise FileNotFoundError(OVERLAY_FILES[name][0])
+    return layer.frame.iloc[layer.query_bbox(*bounds)]
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Opt-in profiling of production /calculate_route requests.
+
+A request is profiled when it carries `X-Profile: <COOLRIDE_ADMIN_TOKEN>`,
+or at random with probability COOLRIDE_PROFILE_SAMPLE_RATE (default 0). A
+profiled request runs under cProfile while a sampler thread records its
+stack every COOLRIDE_PROFILE_INTERVAL_MS, giving a collapsed-stack file
+("outer;inner count" lines) for flamegraph.pl or speedscope. The last
+COOLRIDE_PROFILE_KEEP profiles per worker are kept in memory and served by
+the /admin/profiles endpoints, which need the same token.
+
+When profiling is off a request pays one header lookup and one random()
+call. At most one request per process is profiled at a time.
+"""
+
+import os
+import sys
+import time
+import uuid
+import hmac
+import random
+import marshal
+import cProfile
+import threading
+from collections import Counter, deque
+from datetime import datetime
+
+ADMIN_TOKEN = os.environ.get("COOLRIDE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("COOLRIDE_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_S = float(os.environ.get("COOLRIDE_PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_KEEP = int(os.environ.get("COOLRIDE_PROFILE_KEEP", "20"))
+PROFILE_HEADER = "X-Profile"
+
+_profiles = deque(maxlen=PROFILE_KEEP)
+_profiles_lock = threading.Lock()
+_active = threading.Lock()
+
+
+def authorized(token):
+    """token matches COOLRIDE_ADMIN_TOKEN (never when no token is configured)"""
+    return bool(ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def profile_reason(headers):
+    """"header", "sampled" or None: whether to profile a request with these headers"""
+    token = headers.get(PROFILE_HEADER)
+    if token and authorized(token):
+        return "header"
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Counts the collapsed stacks of one thread every `interval` seconds"""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_S):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        """Collapsed-stack text, heaviest stacks first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class Profiled:
+    """Context manager profiling the calling thread; .id is set once a profile is stored.
+
+    Does nothing (id stays None) while another request is being profiled.
+    """
+
+    def __init__(self, label, reason):
+        self.label = label
+        self.reason = reason
+        self.id = None
+        self._profiler = None
+
+    def __enter__(self):
+        if not _active.acquire(blocking=False):
+            print("   ⚠️ Profiler busy, request not profiled")
+            return self
+        self._started = time.perf_counter()
+        self._sampler = StackSampler(threading.get_ident())
+        self._sampler.start()
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._profiler is None:
+            return False
+        try:
+            self._profiler.disable()
+            duration = time.perf_counter() - self._started
+            self._sampler.stop()
+            self._profiler.create_stats()
+            record = {
+                "id": uuid.uuid4().hex[:12],
+                "label": self.label,
+                "reason": self.reason,
+                "time": datetime.now().isoformat(timespec='seconds'),
+                "duration_s": round(duration, 3),
+                "samples": sum(self._sampler.counts.values()),
+                # Same bytes as Profile.dump_stats(): load with pstats.Stats(path)
+                "pstats": marshal.dumps(self._profiler.stats),
+                "collapsed": self._sampler.collapsed(),
+            }
+            with _profiles_lock:
+                _profiles.append(record)
+            self.id = record["id"]
+            print(f"   🔬 Profiled {self.label} ({self.reason}, {duration:.2f}s) as {self.id}")
+        finally:
+            self._profiler = None
+            _active.release()
+        return False
+
+
+def profile_summary(record):
+    """A stored profile record without its pstats and collapsed payloads"""
+    return {key: value for key, value in record.items() if key not in ("pstats", "collapsed")}
+
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first"""
+    with _profiles_lock:
+        records = list(_profiles)
+    return [profile_summary(record) for record in reversed(records)]
+
+
+def get_profile(profile_id):
+    """Stored profile record by id, or None (evicted or unknown)"""
+    with _profiles_lock:
+        return next((record for record in _profiles if record["id"] == profile_id), None)
+
+
+def top_functions(record, limit=25):
+    """Heaviest functions of a stored profile by cumulative time"""
+    stats = marshal.loads(record["pstats"])
+    rows = sorted(stats.items(), key=lambda item: -item[1][3])[:limit]
+    return [{"function": f"{name} ({os.path.basename(path)}:{line})", "calls": calls,
+             "total_s": round(total, 4), "cumulative_s": round(cumulative, 4)}
+            for (path, line, name), (_, calls, total, cumulative, _) in rows]
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Precomputed building shade per area: an edge x sun-slot matrix.
+
+Building shadows depend only on the sun position, which calculate_sun_position
+derives from the day of year (through the solar declination) and the time of
+day. This job sweeps every daylight 15-minute slot for a set of declination
+buckets, burns the shadows of the area's buildings into its shade raster
+(shade_raster.py) and stores, per column, the fraction of every edge in
+building shadow and in building-and-tree shade as uint8 (1/255 steps).
+
+The matrices live beside the compiled network in data/compiled/<area>/ and
+are memory-mapped at runtime, so costing for a departure time is a column
+lookup; shadow geometry is only ever computed here.
+
+Usage: python shade_matrix.py [area ...] [--step 2.0]
+"""
+
+import os
+import json
+import math
+import time
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import shapely
+
+SLOT_MINUTES = 15               # same slots as SUN_SLOT_MINUTES in simple_server.py
+DECLINATION_STEP_DEG = 2.0      # bucket width; days within +-1 degree share a column
+BUILDING_HEIGHT_M = 15          # v5.3 estimated height for every footprint
+REFERENCE_YEAR = 2025           # only day of year and time of day matter
+
+ARRAYS = ('tree', 'shadow', 'both', 'columns', 'day_bucket')  # saved as shade_<name>.npy
+
+
+def declination(day_of_year):
+    """Solar declination in degrees (the formula used by calculate_sun_position)"""
+    return 23.45 * np.sin(np.radians((360 / 365) * (np.asarray(day_of_year) - 81)))
+
+
+def day_buckets(step=DECLINATION_STEP_DEG):
+    """(367,) bucket of every day of year (index 0 unused) and a representative day per bucket"""
+    days = np.arange(1, 367)
+    decl = declination(days)
+    raw = np.round(decl / step).astype(np.int64)
+    bucket = raw - raw.min()
+    representative = np.array([days[bucket == b][np.argmin(np.abs(decl[bucket == b] - (b + raw.min()) * step))]
+                               for b in range(bucket.max() + 1)])
+    return np.concatenate([[bucket[0]], bucket]).astype(np.int16), representative
+
+
+def shadow_hulls(footprints, height, elevation, azimuth):
+    """create_shadow_polygon for an array of projected (metre) footprints at once:
+    convex hull of each footprint and its copy moved along the shadow"""
+    length = height / math.tan(math.radians(elevation))
+    direction = math.radians((azimuth + 180) % 360)
+    offset = np.array([length * math.sin(direction), length * math.cos(direction)])
+    coords, index = shapely.get_coordinates(footprints, return_index=True)
+    coords = np.vstack([coords, coords + offset])
+    index = np.concatenate([index, index])
+    order = np.argsort(index, kind='stable')
+    return shapely.convex_hull(shapely.multipoints(coords[order], indices=index[order]))
+
+
+def quantize(fraction):
+    return np.round(np.clip(fraction, 0.0, 1.0) * 255).astype(np.uint8)
+
+
+class ShadeMatrix:
+    """Tree fraction per edge plus building shade per (declination bucket, slot) column.
+
+    shadow and both are (C, E) uint8 with one contiguous row per column;
+    columns maps (bucket, slot of day) to a row, -1 when the sun is down.
+    """
+
+    def __init__(self, tree, shadow, both, columns, day_bucket, meta=None):
+        self.tree = tree
+        self.shadow = shadow
+        self.both = both
+        self.columns = columns
+        self.day_bucket = day_bucket
+        self.meta = meta or {}
+
+    @property
+    def num_columns(self):
+        return len(self.shadow)
+
+    def column(self, timestamp):
+        """Row of the matrices for a timestamp, -1 at night"""
+        slot_minutes = 24 * 60 // self.columns.shape[1]
+        slot = (timestamp.hour * 60 + timestamp.minute) // slot_minutes
+        return int(self.columns[self.day_bucket[timestamp.timetuple().tm_yday], slot])
+
+    def fractions(self, timestamp):
+        """(tree, shadow, tree-and-shadow) fraction of every edge's length at timestamp"""
+        tree = self.tree / 255.0
+        c = self.column(timestamp)
+        if c < 0:
+            return tree, np.zeros(len(tree)), np.zeros(len(tree))
+        return tree, self.shadow[c] / 255.0, self.both[c] / 255.0
+
+    def nbytes(self):
+        return sum(getattr(self, attr).nbytes for attr in ARRAYS)
+
+    def save(self, directory):
+        """One .npy per array; shade_meta.json is written last and marks a complete save"""
+        for attr in ARRAYS:
+            np.save(os.path.join(directory, f"shade_{attr}.npy"), getattr(self, attr))
+        with open(os.path.join(directory, "shade_meta.json"), "w") as f:
+            json.dump(self.meta, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mode = 'r' if mmap else None
+        arrays = {attr: np.load(os.path.join(directory, f"shade_{attr}.npy"), mmap_mode=mode)
+                  for attr in ARRAYS}
+        with open(os.path.join(directory, "shade_meta.json")) as f:
+            meta = json.load(f)
+        return cls(meta=meta, **arrays)
+
+
+def build_shade_matrix(area_shade, footprints, lat, lon, sun_position, step=DECLINATION_STEP_DEG):
+    """Sweep every daylight slot of every declination bucket for one area.
+
+    footprints are WGS84 building polygons; sun_position(lat, lon, timestamp)
+    returns (elevation, azimuth) in degrees.
+    """
+    from shade_raster import geometries_to_svy21
+
+    day_bucket, representative = day_buckets(step)
+    slots_per_day = 24 * 60 // SLOT_MINUTES
+    footprints = geometries_to_svy21(np.asarray(footprints, dtype=object))
+
+    columns = np.full((len(representative), slots_per_day), -1, dtype=np.int32)
+    shadow_rows, both_rows = [], []
+    grid, samples = area_shade.grid, area_shade.samples
+    for b, day in enumerate(representative.tolist()):
+        midnight = datetime(REFERENCE_YEAR, 1, 1) + timedelta(days=day - 1)
+        for slot in range(slots_per_day):
+            elevation, azimuth = sun_position(lat, lon, midnight + timedelta(minutes=slot * SLOT_MINUTES))
+            if elevation <= 0:
+                continue
+            if len(footprints):
+                layer = grid.burn_convex(grid.new_layer(),
+                                         shadow_hulls(footprints, BUILDING_HEIGHT_M, elevation, azimuth))
+                flags = samples.flags(layer)
+            else:
+                flags = np.zeros(len(samples), dtype=bool)
+            columns[b, slot] = len(shadow_rows)
+            shadow_rows.append(quantize(samples.fraction(flags)))
+            both_rows.append(quantize(samples.fraction(area_shade.tree & flags)))
+
+    meta = {"declination_step": step, "slot_minutes": SLOT_MINUTES, "num_trees": area_shade.num_trees,
+            "num_buildings": len(footprints), "created": datetime.now().isoformat(timespec="seconds")}
+    empty = np.zeros((0, samples.num_edges), dtype=np.uint8)
+    return ShadeMatrix(quantize(area_shade.tree_fraction),
+                       np.vstack(shadow_rows) if shadow_rows else empty,
+                       np.vstack(both_rows) if both_rows else empty,
+                       columns, day_bucket, meta)
+
+
+def main():
+    from networks import (CACHED_NETWORKS, available_networks, compiled_path, load_compact,
+                          load_area_shade, load_buildings)
+    from simple_server import calculate_sun_position
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("areas", nargs="*", help="cached areas (default: every deployed one)")
+    parser.add_argument("--step", type=float, default=DECLINATION_STEP_DEG, help="declination bucket width (degrees)")
+    args = parser.parse_args()
+
+    for name in args.areas or available_networks():
+        t0 = time.time()
+        print(f"☀️ {name}: sweeping sun slots...")
+        lat, lon, _ = CACHED_NETWORKS[name]
+        load_compact(name)
+        buildings = load_buildings(name)
+        matrix = build_shade_matrix(load_area_shade(name), buildings.geometry.to_numpy(), lat, lon,
+                                    calculate_sun_position, args.step)
+        matrix.save(compiled_path(name))
+        print(f"   ✅ {matrix.num_columns} columns x {len(matrix.tree)} edges "
+              f"({matrix.nbytes() / 1e6:.1f} MB) in {time.time() - t0:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
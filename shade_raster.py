@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Raster shade layer per area.
+
+Instead of unioning a 10 m buffer around every tree (and every building
+shadow) and testing whole edges against the union, each area gets a ~2 m
+grid in SVY21 (EPSG:3414). Tree crowns are burned in once per area; building
+shadows (convex hulls) are burned in per sun slot, one cell span per row.
+Edges are pre-sampled every ~2 m along their packed coordinates, so the
+shaded fraction of every edge is one vectorized lookup plus a bincount.
+LazyShadows burns shadows only near the edges a lazy search asks about.
+"""
+
+import math
+import numpy as np
+import shapely
+
+RASTER_RESOLUTION_M = 2.0
+TREE_CROWN_RADIUS_M = 10.0
+SAMPLE_SPACING_M = 2.0
+GRID_MARGIN_M = 50.0
+
+_to_svy21 = None
+
+
+def to_svy21(lons, lats):
+    """Project WGS84 lon/lat arrays to SVY21 metres"""
+    global _to_svy21
+    if _to_svy21 is None:
+        from pyproj import Transformer
+        _to_svy21 = Transformer.from_crs("EPSG:4326", "EPSG:3414", always_xy=True)
+    x, y = _to_svy21.transform(np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+    return np.asarray(x), np.asarray(y)
+
+
+def geometries_to_svy21(geoms):
+    """Project an array of WGS84 shapely geometries to SVY21"""
+    def project(xy):
+        x, y = to_svy21(xy[:, 0], xy[:, 1])
+        return np.column_stack([x, y])
+    return shapely.transform(np.asarray(geoms, dtype=object), project)
+
+
+class ShadeGrid:
+    """Axis-aligned SVY21 grid; layers are flat boolean arrays of rows * cols cells"""
+
+    def __init__(self, xmin, ymin, xmax, ymax, resolution=RASTER_RESOLUTION_M):
+        self.xmin = xmin
+        self.ymin = ymin
+        self.resolution = resolution
+        self.cols = int(math.ceil((xmax - xmin) / resolution))
+        self.rows = int(math.ceil((ymax - ymin) / resolution))
+
+    @property
+    def size(self):
+        return self.rows * self.cols
+
+    def new_layer(self):
+        return np.zeros(self.size, dtype=bool)
+
+    def cells(self, xs, ys):
+        """(row, col) of each point; may fall outside the grid"""
+        cols = np.floor((np.asarray(xs) - self.xmin) / self.resolution).astype(np.int64)
+        rows = np.floor((np.asarray(ys) - self.ymin) / self.resolution).astype(np.int64)
+        return rows, cols
+
+    def flat_index(self, rows, cols):
+        """Flat cell index, -1 outside the grid"""
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        return np.where(inside, rows * self.cols + cols, -1)
+
+    def burn_disks(self, layer, xs, ys, radius):
+        """Set every cell whose centre lies within radius of a point"""
+        if len(xs) == 0:
+            return layer
+        reach = int(math.ceil(radius / self.resolution))
+        dr, dc = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+        keep = (dr * dr + dc * dc) * self.resolution ** 2 <= radius * radius
+        dr, dc = dr[keep], dc[keep]
+        rows, cols = self.cells(xs, ys)
+        index = self.flat_index((rows[:, None] + dr).ravel(), (cols[:, None] + dc).ravel())
+        layer[index[index >= 0]] = True
+        return layer
+
+    def burn_polygons(self, layer, polygons):
+        """Set every cell whose centre lies inside one of the (SVY21) polygons"""
+        polygons = np.asarray([p for p in polygons if p is not None and not p.is_empty], dtype=object)
+        if len(polygons) == 0:
+            return layer
+        bounds = shapely.bounds(polygons)
+        r0, c0 = self.cells(bounds[:, 0], bounds[:, 1])
+        r1, c1 = self.cells(bounds[:, 2], bounds[:, 3])
+        r0, c0 = np.clip(r0, 0, self.rows - 1), np.clip(c0, 0, self.cols - 1)
+        r1, c1 = np.clip(r1, 0, self.rows - 1), np.clip(c1, 0, self.cols - 1)
+        widths = c1 - c0 + 1
+        counts = (r1 - r0 + 1) * widths
+
+        # Every candidate cell of every polygon's bounding box, tested in one call
+        owner = np.repeat(np.arange(len(polygons)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = r0[owner] + local // widths[owner]
+        cols = c0[owner] + local % widths[owner]
+        xs = self.xmin + (cols + 0.5) * self.resolution
+        ys = self.ymin + (rows + 0.5) * self.resolution
+        shapely.prepare(polygons)
+        inside = shapely.contains_xy(polygons[owner], xs, ys)
+        layer[rows[inside] * self.cols + cols[inside]] = True
+        return layer
+
+    def burn_convex(self, layer, polygons):
+        """burn_polygons for convex (SVY21) polygons such as shadow hulls.
+
+        A convex ring crosses each cell row at most twice, so every polygon is
+        one span of cells per row: the work is one step per ring edge and row,
+        instead of a point-in-polygon test per bounding-box cell.
+        """
+        polygons = np.asarray(polygons, dtype=object)
+        polygons = polygons[shapely.get_type_id(polygons) == 3]
+        if len(polygons) == 0:
+            return layer
+        coords, owner = shapely.get_coordinates(shapely.get_exterior_ring(polygons), return_index=True)
+        same = owner[1:] == owner[:-1]
+        x0, y0 = coords[:-1][same].T
+        x1, y1 = coords[1:][same].T
+        poly = owner[:-1][same]
+
+        # Rows whose centre lies within each ring edge's y range
+        lo = np.ceil((np.minimum(y0, y1) - self.ymin) / self.resolution - 0.5).astype(np.int64)
+        hi = np.floor((np.maximum(y0, y1) - self.ymin) / self.resolution - 0.5).astype(np.int64)
+        lo, hi = np.maximum(lo, 0), np.minimum(hi, self.rows - 1)
+        n = np.maximum(hi - lo + 1, 0)
+        if n.sum() == 0:  # off the grid, or too thin to cross a row centre
+            return layer
+        seg = np.repeat(np.arange(len(n)), n)
+        rows = lo[seg] + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        dy = (y1 - y0)[seg]
+        t = np.divide(self.ymin + (rows + 0.5) * self.resolution - y0[seg], dy,
+                      out=np.zeros(len(seg)), where=dy != 0)
+        xs = x0[seg] + t * (x1 - x0)[seg]
+
+        # Span per (polygon, row): leftmost to rightmost crossing
+        key = poly[seg].astype(np.int64) * self.rows + rows
+        order = np.argsort(key, kind='stable')
+        key, xs = key[order], xs[order]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        span_rows = key[starts] % self.rows
+        c0 = np.ceil((np.minimum.reduceat(xs, starts) - self.xmin) / self.resolution - 0.5).astype(np.int64)
+        c1 = np.floor((np.maximum.reduceat(xs, starts) - self.xmin) / self.resolution - 0.5).astype(np.int64)
+        c0, c1 = np.maximum(c0, 0), np.minimum(c1, self.cols - 1)
+        width = np.maximum(c1 - c0 + 1, 0)
+        first = span_rows * self.cols + c0
+        layer[np.repeat(first - np.cumsum(width) + width, width) + np.arange(width.sum())] = True
+        return layer
+
+
+class EdgeSamples:
+    """Points every ~SAMPLE_SPACING_M along every edge, as flat grid cells and ridden lengths"""
+
+    def __init__(self, cg, grid, spacing=SAMPLE_SPACING_M):
+        xy = np.asarray(cg.geom_xy)
+        ptr = np.asarray(cg.geom_ptr)
+        px, py = to_svy21(xy[:, 0], xy[:, 1])
+
+        # Segments: consecutive points within an edge
+        seg_start = np.ones(len(xy), dtype=bool)
+        seg_start[ptr[1:] - 1] = False
+        seg_start = np.flatnonzero(seg_start)
+        seg_edge = np.repeat(np.arange(cg.num_edges), np.diff(ptr) - 1)
+        x0, y0 = px[seg_start], py[seg_start]
+        dx, dy = px[seg_start + 1] - x0, py[seg_start + 1] - y0
+        seg_len = np.hypot(dx, dy)
+
+        # n equal pieces per segment, sampled at their midpoints
+        n = np.maximum(np.ceil(seg_len / spacing).astype(np.int64), 1)
+        seg = np.repeat(np.arange(len(seg_len)), n)
+        piece = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        s = (piece + 0.5) / n[seg]
+        rows, cols = grid.cells(x0[seg] + s * dx[seg], y0[seg] + s * dy[seg])
+
+        self.num_edges = cg.num_edges
+        self.edge = seg_edge[seg].astype(np.int32)
+        self.cell = grid.flat_index(rows, cols).astype(np.int64)
+        self.length = (seg_len / n)[seg]
+        self.edge_length = np.bincount(self.edge, weights=self.length, minlength=cg.num_edges)
+        # Samples are in edge order: those of edge e are ptr[e]:ptr[e + 1]
+        self.ptr = np.searchsorted(self.edge, np.arange(cg.num_edges + 1))
+
+    def __len__(self):
+        return len(self.edge)
+
+    def take(self, edges):
+        """(sample indices, position in edges) of every sample of the given edges"""
+        starts = self.ptr[edges]
+        n = self.ptr[np.asarray(edges) + 1] - starts
+        local = np.repeat(np.arange(len(n)), n)
+        return starts[local] + np.arange(n.sum()) - (np.cumsum(n) - n)[local], local
+
+    def flags(self, layer):
+        """Layer value at every sample (False outside the grid)"""
+        return np.where(self.cell >= 0, layer[np.maximum(self.cell, 0)], False)
+
+    def fraction(self, flags):
+        """Per-edge fraction of drawn length where flags is True"""
+        covered = np.bincount(self.edge, weights=self.length * flags, minlength=self.num_edges)
+        return np.divide(covered, self.edge_length, out=np.zeros(self.num_edges), where=self.edge_length > 0)
+
+
+class AreaShade:
+    """Grid, edge samples and static tree-crown flags for one area network"""
+
+    def __init__(self, cg, tree_index=None, crown_radius=TREE_CROWN_RADIUS_M):
+        minx, miny, maxx, maxy = cg.bounds()
+        xs, ys = to_svy21([minx, maxx, minx, maxx], [miny, miny, maxy, maxy])
+        self.grid = ShadeGrid(xs.min() - GRID_MARGIN_M, ys.min() - GRID_MARGIN_M,
+                              xs.max() + GRID_MARGIN_M, ys.max() + GRID_MARGIN_M)
+        self.samples = EdgeSamples(cg, self.grid)
+
+        canopy = self.grid.new_layer()
+        self.num_trees = 0
+        if tree_index is not None:
+            pad = (GRID_MARGIN_M + crown_radius) / 111000
+            lons, lats = tree_index.query_bbox(minx - pad, miny - pad, maxx + pad, maxy + pad)
+            self.num_trees = len(lons)
+            tx, ty = to_svy21(lons, lats)
+            self.grid.burn_disks(canopy, tx, ty, crown_radius)
+        self.tree = self.samples.flags(canopy)
+        self.tree_fraction = self.samples.fraction(self.tree)
+
+    def shadow_flags(self, shadow_polygons):
+        """Sample flags for building shadows given as WGS84 polygons"""
+        if not shadow_polygons:
+            return np.zeros(len(self.samples), dtype=bool)
+        # Shadows are convex hulls (create_shadow_polygon), so each burns as row spans
+        layer = self.grid.burn_convex(self.grid.new_layer(), geometries_to_svy21(shadow_polygons))
+        return self.samples.flags(layer)
+
+    def fractions(self, shadow_polygons):
+        """(tree, shadow, tree-and-shadow) fraction of every edge's length"""
+        shadow = self.shadow_flags(shadow_polygons)
+        return (self.tree_fraction,
+                self.samples.fraction(shadow),
+                self.samples.fraction(self.tree & shadow))
+
+    def edge_fractions(self, edges, shadow_layer):
+        """fractions() of some edges only, given a grid layer with their building shadows burned in"""
+        index, local = self.samples.take(edges)
+        cell = self.samples.cell[index]
+        shadow = np.where(cell >= 0, shadow_layer[np.maximum(cell, 0)], False)
+        length = self.samples.length[index]
+        total = self.samples.edge_length[edges]
+
+        def fraction(flags):
+            covered = np.bincount(local, weights=length * flags, minlength=len(total))
+            return np.divide(covered, total, out=np.zeros(len(total)), where=total > 0)
+        return self.tree_fraction[edges], fraction(shadow), fraction(self.tree[index] & shadow)
+
+
+class LazyShadows:
+    """Building-shadow layer of an AreaShade, burned only around the edges asked about.
+
+    shadow(footprint) gives the WGS84 shadow polygon of a WGS84 footprint, or
+    None; reach_m bounds how far a shadow extends from its footprint.
+    """
+
+    def __init__(self, area_shade, footprints, shadow, reach_m):
+        self.area_shade = area_shade
+        self.footprints = np.asarray(footprints, dtype=object)
+        self.tree = shapely.STRtree(self.footprints)
+        self.shadow = shadow
+        self.reach_m = reach_m + 2 * area_shade.grid.resolution  # samples lie within a cell of their point
+        self.layer = area_shade.grid.new_layer()
+        self.burned = np.zeros(len(self.footprints), dtype=bool)
+        self.num_shadows = 0
+
+    def fractions(self, edges, edge_geometries):
+        """(tree, shadow, tree-and-shadow) fractions of edges, given their WGS84 geometries"""
+        if len(self.footprints) and len(edges):
+            minx, miny, maxx, maxy = shapely.total_bounds(edge_geometries)
+            pad_y = self.reach_m / 111000
+            pad_x = pad_y / math.cos(math.radians(maxy))
+            near = self.tree.query(shapely.box(minx - pad_x, miny - pad_y, maxx + pad_x, maxy + pad_y))
+            new = near[~self.burned[near]]
+            if len(new):
+                self.burned[new] = True
+                shadows = [self.shadow(p) for p in self.footprints[new]]
+                shadows = [p for p in shadows if p is not None]
+                if shadows:
+                    self.area_shade.grid.burn_convex(self.layer, geometries_to_svy21(shadows))
+                    self.num_shadows += len(shadows)
+        return self.area_shade.edge_fractions(edges, self.layer)
@@ -4,23 +4,42 @@ Simple Flask server wrapping Cool_route_v5.3 logic
 Full v5.3 features: Trees, Buildings, Water, PCN
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, make_response
 from flask_cors import CORS
-import osmnx as ox
-import networkx as nx
 import simplekml
-import geopandas as gpd
-import pandas as pd
 import numpy as np
 import os
 import math
+import time
 import requests
 from datetime import datetime, timedelta
 import pytz
-from shapely.geometry import Point, LineString
-from shapely.ops import unary_union
+import shapely
 import pickle
-from sklearn.linear_model import LinearRegression
+import re
+import json
+from functools import lru_cache
+from networks import (CACHED_NETWORKS, available_networks, find_cached_network, load_compact, load_snap_index, load_hierarchy,
+                      load_cch, load_tree_index, load_buildings, buildings_ready, load_area_shade, load_shade_matrix,
+                      fetch_buildings_around, BuildingsUnavailable, import_osmnx, TREES_URL)
+from compact_graph import CompactGraph
+from snapping import SnapIndex, snapped_route, snap_exits
+from shade_raster import AreaShade, LazyShadows
+from lazy_cost import LazyCost, corridor_edges
+from cch import CustomizationCache
+from overlays import overlay, overlay_generation, overlay_rows, edge_hits
+from tiles import TileCache, MIN_ZOOM, tile_bounds, edge_features, encode_layer
+from warmup import readiness, is_ready, start_background_warm_up
+from profiling import (ADMIN_TOKEN, Profiled, profile_reason, authorized, list_profiles, get_profile,
+                       profile_summary, top_functions)
+from admission import (REQUESTS, TILES, DOWNLOADS, Deadline, AdmissionError, RETRY_AFTER_S, request_budget,
+                       admission_stats)
+from exposure import exposure_matrix, route_exposure
+from weight_profiles import (PROFILES, FEATURES, MIN_WEIGHT, MAX_WEIGHT, DEFAULT_PROFILE, ProfileError,
+                             request_profiles, feature_matrix, profile_matrix, shade_multiplier)
+
+# osmnx (~1.5s) and scikit-learn (~1s) are imported where used: they are only
+# needed for geocoding, OSM downloads and the trend model, not to start serving
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*", "allow_headers": "*", "methods": ["GET", "POST", "OPTIONS"]}})
@@ -32,22 +51,31 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
     return response
 
-# Local data paths (files deployed with Cloud Run)
-PCN_URL = "data/ParkConnectorLoop.geojson"
-TREES_URL = "data/trees_downloaded.csv"
-WATER_URL = "data/water.geojson"
-HAWKER_URL = "data/hawker_centres.geojson"
+# NEA real-time weather API (overridable for offline load tests)
+NEA_API_URL = os.environ.get("COOLRIDE_NEA_API_URL", "https://api-open.data.gov.sg/v2/real-time/api").rstrip("/")
 
-# Thermal weights from v5.3
-WEIGHT_PCN = 0.5
-WEIGHT_WATER = 0.55
-WEIGHT_TREE_SHADE = 0.6
-WEIGHT_BUILDING_SHADE = 0.7
-WEIGHT_ULTIMATE = 0.35
 
 # AI Weather Cache
 CACHE_FILE = "coolride_weather_memory.pkl"
 
+# Customized cool_cost hierarchies per (area, sun bucket)
+COOL_HIERARCHIES = CustomizationCache()
+
+# Per-edge thermal layers kept per (area, sun slot)
+THERMAL_CACHE_SIZE = int(os.environ.get("COOLRIDE_THERMAL_CACHE_SIZE", "64"))
+
+# Lazy edge costing (lazy_cost.py): "uncached" for downloaded networks only, "always" or "never"
+LAZY_COSTING = os.environ.get("COOLRIDE_LAZY_COSTING", "uncached")
+# Corridor = cool routes up to this many times the fast route's length; unset, each
+# profile's max/min weight ratio at the departure hour (WeightProfile.detour), which never cuts
+# off its cheapest route
+CORRIDOR_DETOUR = float(os.environ["COOLRIDE_CORRIDOR_DETOUR"]) if os.environ.get("COOLRIDE_CORRIDOR_DETOUR") else None
+CORRIDOR_MARGIN_M = 50  # slack for the rough metre conversion
+BUILDING_HEIGHT_M = 15
+
+# Encoded /tiles responses per (z, x, y, sun slot)
+TILE_CACHE = TileCache()
+
 # Sun position calculation (from v5.3)
 def calculate_sun_position(latitude, longitude, timestamp):
     """Calculate sun elevation and azimuth"""
@@ -80,6 +108,20 @@ def calculate_sun_position(latitude, longitude, timestamp):
 
     return elevation, azimuth
 
+# Sun position is resolved to 15-minute slots, so routes in the same slot share
+# one cool_cost metric (and one customized hierarchy)
+SUN_SLOT_MINUTES = 15
+
+def sun_slot(timestamp):
+    """Start of the sun-position slot containing timestamp"""
+    minute = timestamp.minute - timestamp.minute % SUN_SLOT_MINUTES
+    return timestamp.replace(minute=minute, second=0, microsecond=0)
+
+def sun_bucket(timestamp):
+    """Hashable (day of year, slot of day) key for a timestamp"""
+    slot = sun_slot(timestamp)
+    return slot.timetuple().tm_yday, (slot.hour * 60 + slot.minute) // SUN_SLOT_MINUTES
+
 # Shadow calculation (from v5.3)
 def create_shadow_polygon(building_polygon, building_height, sun_elevation, sun_azimuth):
     """Create shadow polygon from building footprint"""
@@ -133,22 +175,29 @@ def save_cache(data):
     with open(CACHE_FILE, "wb") as f:
         pickle.dump(data, f)
 
-def fetch_historical_data(station_name, days_back=3):
-    """Fetch historical WBGT data from NEA API"""
+def history_cached(cache, station_name):
+    """Today's history for a station is already in the weather memory"""
+    cache_key = f"{station_name}_{datetime.now().strftime('%Y-%m-%d')}"
+    return cache_key in cache and len(cache[cache_key].get('values', [])) > 20
+
+def fetch_historical_data(station_name, days_back=3, backfill=True):
+    """Fetch historical WBGT data from NEA API (memory only when backfill is False)"""
     cache = get_cache()
     today_str = datetime.now().strftime("%Y-%m-%d")
     cache_key = f"{station_name}_{today_str}"
 
-    if cache_key in cache and len(cache[cache_key].get('values', [])) > 20:
+    if history_cached(cache, station_name):
         print(f"   ⚡ Memory Hit! Loaded {len(cache[cache_key]['values'])} points.")
         return cache[cache_key]['timestamps'], cache[cache_key]['values']
+    if not backfill:
+        return [], []
 
     print(f"   📡 Memory Miss. Analyzing last {days_back} days...")
     all_timestamps, all_values = [], []
 
     for i in range(days_back + 1):
         target_date = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        url = "https://api-open.data.gov.sg/v2/real-time/api/weather"
+        url = f"{NEA_API_URL}/weather"
         params = {"api": "wbgt", "date": target_date}
 
         # PAGINATION LOOP
@@ -187,13 +236,14 @@ def fetch_historical_data(station_name, days_back=3):
 
     return all_timestamps, all_values
 
-def predict_trend(station_name, current_wbgt):
+def predict_trend(station_name, current_wbgt, backfill=True):
     """Predict WBGT trend using linear regression"""
-    timestamps, values = fetch_historical_data(station_name)
+    timestamps, values = fetch_historical_data(station_name, backfill=backfill)
     if len(values) < 10:
         return current_wbgt, "Stable ➖", "Low Data"
 
     # Linear Regression
+    from sklearn.linear_model import LinearRegression
     model = LinearRegression()
     model.fit(np.array(timestamps).reshape(-1, 1), np.array(values))
 
@@ -217,7 +267,7 @@ def predict_trend(station_name, current_wbgt):
 def get_nearest_wbgt_station(lat, lon):
     """Find nearest WBGT sensor and get current reading"""
     print("⏳ Connecting to NEA Official WBGT Sensor Network...")
-    url = "https://api-open.data.gov.sg/v2/real-time/api/weather"
+    url = f"{NEA_API_URL}/weather"
     try:
         resp = requests.get(url, params={"api": "wbgt"}, timeout=10)
         data = resp.json()
@@ -272,182 +322,226 @@ def get_safety_recommendation(wbgt):
     else:
         return "🛑 HIGH RISK", "red", "Avoid outdoor activities. If riding is essential, take frequent breaks in air-conditioned areas."
 
-# Main route calculation (from v5.3)
-def calculate_route_v53(start_lat, start_lon, end_lat, end_lon, departure_time):
-    """Full v5.3 route calculation with all features"""
-
-    print(f"⏳ Calculating route from ({start_lat}, {start_lon}) to ({end_lat}, {end_lon})")
-
-    # 1. GET GRAPH - USE PRE-LOADED NETWORK
+def thermal_layers(cg, area_name, lat, lon, departure_time, with_buildings=True, deadline=None):
+    """Per-edge thermal overlays of a network and the v5.3 cool_cost multiplier.
+
+    Returns a dict of (E,) arrays: tree, shadow and both (shaded fractions of
+    each edge's length), pcn and water (booleans) and factor (default
+    profile), plus the (E, F) features any WeightProfile is applied to and
+    the exposure.py matrix of route analytics.
+    Without buildings (degraded mode) there are no building shadows; a
+    deadline bounds the wait for them and records them as skipped.
+    """
+    # 1. LOAD PCN - shared overlay layer (overlays.py), one STRtree query per edge
+    print("⏳ Loading Park Connectors...")
+    is_pcn = np.zeros(cg.num_edges, dtype=bool)
     try:
-        # List of cached networks with their center points
-        cached_networks = {
-            'tampines': (1.3530, 103.9450, 2000),
-            'orchard': (1.3048, 103.8318, 2000),
-            'marina_bay': (1.2806, 103.8510, 2000),
-            'city_hall': (1.2930, 103.8520, 2000),
-            'chinatown': (1.2838, 103.8446, 2000),
-            'botanic_gardens': (1.3138, 103.8159, 2000),
-            'east_coast_park': (1.3010, 103.9140, 2500),
-            'sentosa': (1.2494, 103.8303, 2000),
-            'bedok': (1.3236, 103.9273, 2000),
-            'pasir_ris': (1.3721, 103.9474, 2000),
-            'changi': (1.3644, 103.9915, 2000),
-            'bishan': (1.3521, 103.8484, 2000),
-            'ang_mo_kio': (1.3691, 103.8454, 2000),
-            'clementi': (1.3162, 103.7649, 2000),
-            'jurong_east': (1.3329, 103.7436, 2000),
-        }
-
-        # Find closest cached network
-        G = None
-        best_match = None
-        min_distance = float('inf')
-
-        for name, (lat, lon, radius) in cached_networks.items():
-            filename = f'data/{name}_network.graphml'
-            if os.path.exists(filename):
-                # Calculate distance from start point to cache center
-                import math
-                distance = math.sqrt((start_lat - lat)**2 + (start_lon - lon)**2) * 111000  # rough meters
-                if distance < radius and distance < min_distance:
-                    min_distance = distance
-                    best_match = (name, filename)
-
-        if best_match:
-            name, filename = best_match
-            print(f"   📦 Loading cached {name} network...")
-            G = ox.load_graphml(filename)
-            print(f"   ✅ Network loaded! ({len(G.nodes)} nodes, {len(G.edges)} edges)")
+        is_pcn = edge_hits("pcn", cg, area_name)
+        if overlay("pcn") is not None:
+            print(f"   ✅ PCN Loaded ({is_pcn.sum()} edges)")
         else:
-            # Fallback to downloading (slow, for other locations)
-            print("   🔄 Downloading network from OSM (this may be slow)...")
-            G = ox.graph_from_point((start_lat, start_lon), dist=2000, network_type='bike')
-
-        nodes = ox.graph_to_gdfs(G, edges=False)
-        miny, maxy = nodes.y.min(), nodes.y.max()
-        minx, maxx = nodes.x.min(), nodes.x.max()
-        print(f"   📐 Zone Limits: Lat[{miny:.4f}, {maxy:.4f}], Lon[{minx:.4f}, {maxx:.4f}]")
+            print("   ⚠️ PCN Data missing")
     except Exception as e:
-        print(f"   ❌ Network Error: {e}")
-        return None, None, None, [], 0, 0
+        print(f"   ⚠️ PCN Error: {e}")
 
-    # 2. LOAD PCN
-    print("⏳ Loading Park Connectors...")
-    pcn_union = None
-    try:
-        pcn_data = gpd.read_file(PCN_URL)
-        if pcn_data.crs != "EPSG:4326":
-            pcn_data = pcn_data.to_crs("EPSG:4326")
-        try:
-            pcn_union = pcn_data.geometry.union_all()
-        except:
-            pcn_union = pcn_data.geometry.unary_union
-        print(f"   ✅ PCN Loaded")
-    except:
-        print("   ⚠️ PCN Data missing")
+    # Cached areas with a precomputed shade matrix need no tree raster or shadow geometry
+    shade_matrix = load_shade_matrix(area_name) if area_name else None
 
-    # 3. LOAD TREES
+    # 2. LOAD TREES - crowns burned into the area's ~2m shade raster
     print("⏳ Loading Trees...")
-    trees_buffer = None
-    try:
-        # Check if trees CSV exists
-        if os.path.exists(TREES_URL):
-            trees_df = pd.read_csv(TREES_URL)
-
-            # Verify columns exist
-            if 'lat' not in trees_df.columns or 'lng' not in trees_df.columns:
-                print(f"   ⚠️ Tree CSV missing columns. Found: {list(trees_df.columns)}")
-                print(f"   ⚠️ File size: {os.path.getsize(TREES_URL)} bytes - may be LFS pointer file")
-                trees_df = pd.DataFrame()  # Empty DataFrame to skip processing
-
-            # Filter to bounding box only if we have valid data
-            if not trees_df.empty and 'lat' in trees_df.columns and 'lng' in trees_df.columns:
-                trees_df = trees_df[(trees_df['lat'] >= miny) & (trees_df['lat'] <= maxy) &
-                                   (trees_df['lng'] >= minx) & (trees_df['lng'] <= maxx)]
-
-            if not trees_df.empty:
-                # Convert to GeoDataFrame
-                from shapely.geometry import Point
-                geometry = [Point(xy) for xy in zip(trees_df['lng'], trees_df['lat'])]
-                trees_gdf = gpd.GeoDataFrame(trees_df, geometry=geometry, crs="EPSG:4326")
-                # Convert to projected CRS (SVY21) for accurate buffering
-                trees_gdf_proj = trees_gdf.to_crs("EPSG:3414")  # Singapore SVY21
-                trees_buffer_proj = trees_gdf_proj.geometry.buffer(10).union_all()  # 10 meters
-                # Convert back to WGS84
-                trees_buffer = gpd.GeoSeries([trees_buffer_proj], crs="EPSG:3414").to_crs("EPSG:4326")[0]
-                print(f"   ✅ Tree shade ({len(trees_gdf)} trees)")
+    area_shade = None
+    if shade_matrix is not None:
+        print(f"   ✅ Tree shade (precomputed, {shade_matrix.meta.get('num_trees', 0)} trees)")
+    else:
+        try:
+            if area_name:
+                area_shade = load_area_shade(area_name)
+            else:
+                area_shade = AreaShade(cg, load_tree_index())
+            if area_shade.num_trees:
+                print(f"   ✅ Tree shade ({area_shade.num_trees} trees)")
             else:
                 print("   ⚠️ No trees in this area or invalid tree data")
-        elif os.path.exists('data/Trees_SG.geojson'):
-            trees_gdf = gpd.read_file('data/Trees_SG.geojson')
-            trees_gdf = trees_gdf.cx[minx:maxx, miny:maxy]
-            if not trees_gdf.empty:
-                trees_gdf_proj = trees_gdf.to_crs("EPSG:3414")
-                trees_buffer_proj = trees_gdf_proj.geometry.buffer(10).union_all()
-                trees_buffer = gpd.GeoSeries([trees_buffer_proj], crs="EPSG:3414").to_crs("EPSG:4326")[0]
-                print(f"   ✅ Tree shade ({len(trees_gdf)} trees)")
-        else:
-            print("   ⚠️ Tree data missing (skipping)")
-    except Exception as e:
-        print(f"   ⚠️ Tree Error: {e}")
-        import traceback
-        print(f"   ⚠️ Tree Error Details: {traceback.format_exc()}")
+        except Exception as e:
+            print(f"   ⚠️ Tree Error: {e}")
+            import traceback
+            print(f"   ⚠️ Tree Error Details: {traceback.format_exc()}")
 
-    # 4. LOAD BUILDINGS
+    # 3. LOAD BUILDINGS
     print("⏳ Loading Buildings...")
-    building_shadows = None
-    try:
-        buildings_gdf = ox.features_from_point((start_lat, start_lon), tags={'building': True}, dist=2000)
-        buildings_gdf = buildings_gdf[buildings_gdf.geometry.type == 'Polygon']
-        buildings_gdf['estimated_height'] = 15
-
-        # Calculate Sun Position
-        sun_elev, sun_azim = calculate_sun_position(start_lat, start_lon, departure_time)
-        print(f"   ☀️ Sun: {sun_elev:.1f}° elev, {sun_azim:.1f}° azim")
-
-        if sun_elev > 0:
-            shadow_polygons = []
-            for _, building in buildings_gdf.iterrows():
-                shadow = create_shadow_polygon(building.geometry, building['estimated_height'], sun_elev, sun_azim)
-                if shadow:
-                    shadow_polygons.append(shadow)
-
-            building_shadows = unary_union(shadow_polygons)
-            print(f"   ✅ Building shadows generated")
-        else:
-            print("   🌙 Night time (No shadows)")
-    except Exception as e:
-        print(f"   ⚠️ Building Error: {e}")
+    shadow_polygons = []
+    if shade_matrix is not None:
+        print(f"   ✅ Building shade (precomputed, {shade_matrix.num_columns} sun slots)")
+    elif not with_buildings:
+        print("   ⏭️ Buildings skipped (degraded)")
+    else:
+        try:
+            buildings_gdf = nearby_buildings(area_name, lat, lon,
+                                             deadline.budget_for("buildings") if deadline else None)
+            # Copy so the shared footprints are never mutated
+            buildings_gdf = buildings_gdf.assign(estimated_height=BUILDING_HEIGHT_M)
+
+            # Calculate Sun Position
+            sun_elev, sun_azim = calculate_sun_position(lat, lon, sun_slot(departure_time))
+            print(f"   ☀️ Sun: {sun_elev:.1f}° elev, {sun_azim:.1f}° azim")
+
+            if sun_elev > 0:
+                for _, building in buildings_gdf.iterrows():
+                    shadow = create_shadow_polygon(building.geometry, building['estimated_height'], sun_elev, sun_azim)
+                    if shadow:
+                        shadow_polygons.append(shadow)
+                # No union: each shadow is rasterized on its own (see shade_raster.py)
+                print(f"   ✅ Building shadows generated ({len(shadow_polygons)})")
+            else:
+                print("   🌙 Night time (No shadows)")
+        except Exception as e:
+            print(f"   ⚠️ Building Error: {e}")
 
-    # 5. LOAD WATER
+    # 4. LOAD WATER - shared overlay layer, already buffered by 100 m in SVY21
     print("⏳ Loading Water...")
-    water_buffer = None
+    is_water = np.zeros(cg.num_edges, dtype=bool)
     try:
-        if os.path.exists('data/URA_Waterbody.geojson'):
-            water_gdf = gpd.read_file('data/URA_Waterbody.geojson')
-            water_gdf = water_gdf.cx[minx:maxx, miny:maxy]
-            if not water_gdf.empty:
-                # Convert to projected CRS for accurate buffering
-                water_gdf_proj = water_gdf.to_crs("EPSG:3414")
-                water_buffer_proj = water_gdf_proj.geometry.buffer(100).union_all()  # 100 meters
-                water_buffer = gpd.GeoSeries([water_buffer_proj], crs="EPSG:3414").to_crs("EPSG:4326")[0]
-                print(f"   ✅ Water cooling ({len(water_gdf)} features)")
+        is_water = edge_hits("water", cg, area_name)
+        if overlay("water") is not None:
+            print(f"   ✅ Water cooling ({is_water.sum()} edges)")
         else:
             print("   ⚠️ Water data missing (skipping)")
     except Exception as e:
         print(f"   ⚠️ Water Error: {e}")
 
-    # 6. LOAD AMENITIES (Hawker centers, MRT, supermarkets, landmarks)
+    # 5. CALCULATE COST
+    print("⏳ Calculating costs...")
+
+    # Tree / building-shadow cover as fractions of each edge's length
+    if shade_matrix is not None:
+        tree_frac, shadow_frac, both_frac = shade_matrix.fractions(sun_slot(departure_time))
+    elif area_shade is not None:
+        tree_frac, shadow_frac, both_frac = area_shade.fractions(shadow_polygons)
+    else:
+        tree_frac = shadow_frac = both_frac = np.zeros(cg.num_edges)
+
+    features = thermal_features(tree_frac, shadow_frac, both_frac, is_pcn, is_water, departure_time)
+    return {"tree": tree_frac, "shadow": shadow_frac, "both": both_frac,
+            "pcn": is_pcn, "water": is_water, "features": features,
+            "factor": features @ DEFAULT_PROFILE.vector,
+            "exposure": exposure_matrix(tree_frac, shadow_frac, both_frac, is_pcn, is_water)}
+
+def nearby_buildings(area_name, lat, lon, timeout=None):
+    """Building footprints (WGS84 polygons) of a cached area, or fetched around a point;
+    raises BuildingsUnavailable if they are not at hand within timeout seconds"""
+    if area_name:
+        return load_buildings(area_name, timeout)
+    return fetch_buildings_around(lat, lon, 2000, timeout)
+
+def buildings_in_time(area_name, deadline):
+    """Whether building shadows fit in the deadline: footprints (or the area's shade
+    matrix) are at hand, or can be loaded within the buildings stage budget. A cached
+    area's footprints are loaded here; records the skip when they can't be."""
+    if area_name and (buildings_ready(area_name) or load_shade_matrix(area_name) is not None):
+        return True
+    if not deadline.allows("buildings"):
+        deadline.skip("buildings")
+        return False
+    if area_name:
+        try:
+            load_buildings(area_name, deadline.budget_for("buildings"))
+        except Exception as e:
+            print(f"   ⚠️ Building Error: {e}")
+            deadline.skip("buildings")
+            return False
+    return True
+
+def area_layers(area_name, departure_time, deadline):
+    """thermal layers of a cached area within the deadline: the shared cached ones, or
+    (never cached) ones without building shadows when the footprints are not at hand"""
+    if buildings_in_time(area_name, deadline):
+        return area_thermal_layers(area_name, sun_slot(departure_time), overlay_generation()), True
+    lat, lon, _ = CACHED_NETWORKS[area_name]
+    return thermal_layers(load_compact(area_name), area_name, lat, lon, sun_slot(departure_time),
+                          with_buildings=False), False
+
+def thermal_features(tree_frac, shadow_frac, both_frac, is_pcn, is_water, departure_time):
+    """(E, F) weight_profiles feature matrix of edges from their thermal layers"""
+    return feature_matrix(tree_frac, shadow_frac, both_frac, is_pcn, is_water,
+                          shade_multiplier(departure_time.hour))
+
+def lazy_cool_costs(cg, area_name, lat, lon, departure_time, profiles, corridor=None, with_buildings=True,
+                    deadline=None):
+    """cool_cost of each profile as a LazyCost: the thermal_layers work for an edge is
+    done when a search first reaches it (a cell of edges at a time, shared by all
+    profiles), never outside corridor.
+
+    Returns (costs, exposure): the exposure.py matrix, filled in (NaN elsewhere)
+    for the edges costed so far."""
+    shade_matrix = load_shade_matrix(area_name) if area_name else None
+    columns = shade_matrix.fractions(sun_slot(departure_time)) if shade_matrix is not None else None
+    shadows = None
+    if columns is None:
+        try:
+            area_shade = load_area_shade(area_name) if area_name else AreaShade(cg, load_tree_index())
+            footprints = []
+            sun_elev, sun_azim = calculate_sun_position(lat, lon, sun_slot(departure_time))
+            if sun_elev > 0 and with_buildings:
+                try:
+                    footprints = nearby_buildings(area_name, lat, lon,
+                                                  deadline.budget_for("buildings") if deadline else None
+                                                  ).geometry.to_numpy()
+                except Exception as e:
+                    print(f"   ⚠️ Building Error: {e}")
+                    if deadline:
+                        deadline.skip("buildings")
+            reach = BUILDING_HEIGHT_M / math.tan(math.radians(max(sun_elev, 1.0)))
+            shadows = LazyShadows(area_shade, footprints, reach_m=reach,
+                                  shadow=lambda p: create_shadow_polygon(p, BUILDING_HEIGHT_M, sun_elev, sun_azim))
+        except Exception as e:
+            print(f"   ⚠️ Shade Error: {e}")
+
+    def feature_rows(edges):
+        is_pcn = edge_hits("pcn", cg, area_name, edges)
+        is_water = edge_hits("water", cg, area_name, edges)
+        if columns is not None:
+            tree_frac, shadow_frac, both_frac = (c[edges] for c in columns)
+        elif shadows is not None:
+            tree_frac, shadow_frac, both_frac = shadows.fractions(edges, cg.edge_geometries()[edges])
+        else:
+            tree_frac = shadow_frac = both_frac = np.zeros(len(edges))
+        exposure[edges] = exposure_matrix(tree_frac, shadow_frac, both_frac, is_pcn, is_water)
+        return cg.edge_length[edges, None] * thermal_features(tree_frac, shadow_frac, both_frac,
+                                                              is_pcn, is_water, departure_time)
+
+    # Every LazyCost fills the same cells: compute a cell's rows once (keyed by its first edge)
+    cells = {}
+    exposure = np.full((cg.num_edges, 3), np.nan)
+    def cost_edges(edges, vector):
+        if not len(edges):
+            return np.zeros(0)
+        rows = cells.get(int(edges[0]))
+        if rows is None:
+            rows = cells[int(edges[0])] = feature_rows(edges)
+        return rows @ vector
+
+    costs = [LazyCost(cg, lambda edges, v=profile.vector: cost_edges(edges, v), corridor) for profile in profiles]
+    return costs, exposure
+
+@lru_cache(maxsize=THERMAL_CACHE_SIZE)
+def area_thermal_layers(area_name, slot_start, generation):
+    """thermal_layers of a cached area for one sun slot and overlay_generation(),
+    shared by routes, isochrones and tiles"""
+    lat, lon, _ = CACHED_NETWORKS[area_name]
+    layers = thermal_layers(load_compact(area_name), area_name, lat, lon, slot_start)
+    for values in layers.values():
+        values.setflags(write=False)
+    return layers
+
+def load_amenities(near_lat, near_lon, bounds):
+    """(name, lat, lon, type) hawker centres, MRT stations and landmarks inside bounds
+    (minx, miny, maxx, maxy); the OSM hawker fallback searches around (near_lat, near_lon)"""
     print("⏳ Loading Amenities & Landmarks...")
     amenities_list = []
     try:
         # A. Load hawker centers from GitHub (Official NParks dataset - same as v5.3)
         try:
-            hawker_gdf = gpd.read_file(HAWKER_URL)
-            if hawker_gdf.crs != "EPSG:4326":
-                hawker_gdf = hawker_gdf.to_crs("EPSG:4326")
-            hawker_gdf = hawker_gdf.cx[minx:maxx, miny:maxy]
+            hawker_gdf = overlay_rows('hawker', bounds)
 
             for idx, row in hawker_gdf.iterrows():
                 name = row.get('NAME', row.get('name', 'Unknown'))
@@ -462,8 +556,9 @@ def calculate_route_v53(start_lat, start_lon, end_lat, end_lon, departure_time):
         except Exception as e:
             print(f"   ⚠️ GitHub Hawker Error: {e}, using OSM fallback...")
             # Fallback to OSM if GitHub fails
+            ox = import_osmnx()
             tags = {'amenity': ['food_court', 'hawker_centre', 'marketplace']}
-            pois = ox.features_from_point((start_lat, start_lon), tags=tags, dist=2000)
+            pois = ox.features_from_point((near_lat, near_lon), tags=tags, dist=2000)
             if not pois.empty:
                 for idx, row in pois.iterrows():
                     name = row.get('name', 'Unknown')
@@ -478,7 +573,8 @@ def calculate_route_v53(start_lat, start_lon, end_lat, end_lon, departure_time):
         # B. Skip supermarkets and MRT (too slow on free tier)
         print("   ⚠️ Skipping OSM amenities (optimized for speed)")
         if False:  # Disabled for performance
-            shop_pois = ox.features_from_point((start_lat, start_lon), tags={}, dist=2000)
+            ox = import_osmnx()
+            shop_pois = ox.features_from_point((near_lat, near_lon), tags={}, dist=2000)
         if False:
             for idx, row in shop_pois.iterrows():
                 name = row.get('name', 'Unknown')
@@ -492,10 +588,7 @@ def calculate_route_v53(start_lat, start_lon, end_lat, end_lon, departure_time):
 
         # C. Load MRT stations from local file
         try:
-            mrt_gdf = gpd.read_file('data/mrt_stations.geojson')
-            if mrt_gdf.crs != "EPSG:4326":
-                mrt_gdf = mrt_gdf.to_crs("EPSG:4326")
-            mrt_gdf = mrt_gdf.cx[minx:maxx, miny:maxy]
+            mrt_gdf = overlay_rows('mrt', bounds)
 
             for idx, row in mrt_gdf.iterrows():
                 name = row.get('name', 'Unknown')
@@ -509,10 +602,7 @@ def calculate_route_v53(start_lat, start_lon, end_lat, end_lon, departure_time):
 
         # D. Load famous landmarks from local file
         try:
-            landmarks_gdf = gpd.read_file('data/landmarks.geojson')
-            if landmarks_gdf.crs != "EPSG:4326":
-                landmarks_gdf = landmarks_gdf.to_crs("EPSG:4326")
-            landmarks_gdf = landmarks_gdf.cx[minx:maxx, miny:maxy]
+            landmarks_gdf = overlay_rows('landmarks', bounds)
 
             for idx, row in landmarks_gdf.iterrows():
                 name = row.get('name', 'Unknown')
@@ -528,64 +618,168 @@ def calculate_route_v53(start_lat, start_lon, end_lat, end_lon, departure_time):
         print(f"   ✅ Total points of interest: {len(amenities_list)}")
     except Exception as e:
         print(f"   ⚠️ Amenities Error: {e}")
+    return amenities_list
 
-    # 6. CALCULATE COST
-    print("⏳ Calculating costs...")
-    hour = departure_time.hour
-    shade_multiplier = 0.6 if (hour < 10 or hour > 16) else 1.0
+# Main route calculation (from v5.3)
+def route_stages(start_lat, start_lon, end_lat, end_lon, departure_time, deadline=None, profiles=None):
+    """v5.3 route calculation as a generator of (stage, value), in completion order:
+    ("network", cg), ("fast", Route), ("cool", Route), ("exposure", array),
+    ("amenities", list). exposure is the exposure.py matrix covering the edges
+    of every route. A failure yields ("error", message) and stops.
+
+    profiles (WeightProfiles, default [DEFAULT_PROFILE]) weigh the thermal
+    features; "cool" is the route of the first, and with several profiles
+    ("profiles", [(profile, Route), ...]) follows it with all of them.
+
+    deadline (admission.Deadline) is checked between stages and decides which
+    optional layers are skipped; starts outside the cached areas first take a
+    slot in the DOWNLOADS lane. Both raise AdmissionError."""
+    deadline = deadline or Deadline()
+    profiles = list(profiles or [DEFAULT_PROFILE])
+    if find_cached_network(start_lat, start_lon):
+        yield from _route_stages(start_lat, start_lon, end_lat, end_lon, departure_time, deadline, profiles)
+    else:
+        with DOWNLOADS.admit(deadline):
+            yield from _route_stages(start_lat, start_lon, end_lat, end_lon, departure_time, deadline, profiles)
 
-    for u, v, k, data in G.edges(keys=True, data=True):
-        if 'geometry' in data:
-            edge_geom = data['geometry']
-        else:
-            edge_geom = LineString([(G.nodes[u]['x'], G.nodes[u]['y']),
-                                   (G.nodes[v]['x'], G.nodes[v]['y'])])
-
-        cost = data['length']
-
-        # Check intersections
-        is_pcn = pcn_union and edge_geom.intersects(pcn_union)
-        is_tree = trees_buffer and edge_geom.intersects(trees_buffer)
-        is_shadow = building_shadows and edge_geom.intersects(building_shadows)
-        is_water = water_buffer and edge_geom.intersects(water_buffer)
-
-        # Apply weights
-        if is_tree and is_shadow and is_water:
-            cost *= WEIGHT_ULTIMATE
-        elif is_tree and is_shadow:
-            cost *= 0.45
-        elif is_water:
-            cost *= WEIGHT_WATER
-        elif is_tree:
-            cost *= WEIGHT_TREE_SHADE
-        elif is_shadow:
-            cost *= (WEIGHT_BUILDING_SHADE * shade_multiplier)
-        elif is_pcn:
-            cost *= WEIGHT_PCN
-
-        data['cool_cost'] = cost
-
-    # 7. SOLVE
-    orig = ox.distance.nearest_nodes(G, start_lon, start_lat)
-    dest = ox.distance.nearest_nodes(G, end_lon, end_lat)
+def _route_stages(start_lat, start_lon, end_lat, end_lon, departure_time, deadline, profiles):
+    print(f"⏳ Calculating route from ({start_lat}, {start_lon}) to ({end_lat}, {end_lon})")
 
+    # 1. GET GRAPH - USE PRE-LOADED NETWORK
+    area_name = None
     try:
-        r_fast = nx.shortest_path(G, orig, dest, weight='length')
-        r_cool = nx.shortest_path(G, orig, dest, weight='cool_cost')
-
-        # Calculate distances by summing edge lengths
-        fast_distance = 0
-        for u, v in zip(r_fast[:-1], r_fast[1:]):
-            fast_distance += G[u][v][0]['length']
-
-        cool_distance = 0
-        for u, v in zip(r_cool[:-1], r_cool[1:]):
-            cool_distance += G[u][v][0]['length']
+        area_name = find_cached_network(start_lat, start_lon)
+        if area_name:
+            # Shared, memory-mapped arrays (loaded before the workers forked)
+            cg = load_compact(area_name)
+            print(f"   📦 Using cached {area_name} network ({cg.num_nodes} nodes, {cg.num_edges} edges)")
+        else:
+            # Fallback to downloading (slow, for other locations)
+            print("   🔄 Downloading network from OSM (this may be slow)...")
+            ox = import_osmnx()
+            G = ox.graph_from_point((start_lat, start_lon), dist=2000, network_type='bike')
+            cg = CompactGraph.from_networkx(G)
 
-        return G, r_fast, r_cool, amenities_list, fast_distance, cool_distance
+        minx, miny, maxx, maxy = cg.bounds()
+        print(f"   📐 Zone Limits: Lat[{miny:.4f}, {maxy:.4f}], Lon[{minx:.4f}, {maxx:.4f}]")
+    except Exception as e:
+        print(f"   ❌ Network Error: {e}")
+        yield "error", "Route calculation failed"
+        return
+    yield "network", cg
+    deadline.check("fast route")
+
+    # 2. SNAP + FASTEST ROUTE - distance needs none of the overlays, so it goes out first
+    snap_index = load_snap_index(area_name) if area_name else SnapIndex(cg)
+    origin = snap_index.snap_point(start_lon, start_lat)
+    destination = snap_index.snap_point(end_lon, end_lat)
+    print(f"   📍 Snapped: start {origin.distance_m:.0f}m, end {destination.distance_m:.0f}m off-network")
+    try:
+        # Distance is static: cached areas answer from the precomputed hierarchy
+        fast_search = load_hierarchy(area_name).search if area_name else None
+        r_fast = snapped_route(snap_index, origin, destination, cg.edge_length, fast_search)
+        if r_fast is None:
+            raise ValueError("No path between origin and destination")
     except Exception as e:
         print(f"   ❌ Routing failed: {e}")
+        yield "error", "Route calculation failed"
+        return
+    yield "fast", r_fast
+    deadline.check("thermal layers")
+
+    # 3. THERMAL LAYERS - shade, water and PCN per edge (cached per area, sun slot and overlay version)
+    generation = overlay_generation()
+    lazy = LAZY_COSTING == "always" or (LAZY_COSTING == "uncached" and not area_name)
+    # Degraded mode: no building shadows if the footprints can't be had within the deadline
+    # (fetches are bounded by the buildings stage budget, failures retried only after a cooldown)
+    with_buildings = buildings_in_time(area_name, deadline)
+    if lazy:
+        # Costed during the search, only inside the ellipse a cheaper-than-fast cool route fits in
+        multiplier = shade_multiplier(departure_time.hour)
+        detour = CORRIDOR_DETOUR or max(profile.detour(multiplier) for profile in profiles)
+        max_length = (detour * r_fast.length(cg) + origin.distance_m + destination.distance_m
+                      + CORRIDOR_MARGIN_M)
+        snapped = [e for snap in (origin, destination) for e in (snap.edge, int(snap_index.twin[snap.edge])) if e >= 0]
+        corridor = corridor_edges(cg, (start_lon, start_lat), (end_lon, end_lat), max_length, keep=snapped)
+        sun_lat, sun_lon = CACHED_NETWORKS[area_name][:2] if area_name else (start_lat, start_lon)
+        cool_costs, exposure = lazy_cool_costs(cg, area_name, sun_lat, sun_lon, departure_time, profiles,
+                                               corridor, with_buildings, deadline)
+    elif area_name and with_buildings:
+        layers = area_thermal_layers(area_name, sun_slot(departure_time), generation)
+    elif area_name:
+        # Degraded layers are never cached
+        lat, lon, _ = CACHED_NETWORKS[area_name]
+        layers = thermal_layers(cg, area_name, lat, lon, sun_slot(departure_time), with_buildings=False)
+    else:
+        layers = thermal_layers(cg, None, start_lat, start_lon, departure_time, with_buildings, deadline)
+    if not lazy:
+        # Costs live beside the graph, not on it: cg is shared across threads and workers.
+        # Every profile from one (E, F) x (F, P) product over the shared feature matrix
+        cool_costs = list(cg.edge_length * (profile_matrix(profiles).T @ layers["features"].T))
+        exposure = layers["exposure"]
+
+    # 4. COOL ROUTE (one per profile)
+    routes = []
+    try:
+        for profile, cool_cost in zip(profiles, cool_costs):
+            # cool_cost varies with the sun: customize the area's CCH (cached per sun slot
+            # and profile); lazy costs are read edge by edge by a plain Dijkstra instead
+            cool_search = None
+            if area_name and not lazy:
+                key = (area_name, sun_bucket(departure_time), generation, with_buildings, profile.key)
+                cool_search = COOL_HIERARCHIES.get(key, load_cch(area_name), cool_cost).search
+            r_cool = snapped_route(snap_index, origin, destination, cool_cost, cool_search)
+            if r_cool is None:
+                raise ValueError("No path between origin and destination")
+            routes.append((profile, r_cool))
+    except Exception as e:
+        print(f"   ❌ Routing failed: {e}")
+        yield "error", "Route calculation failed"
+        return
+    if lazy:
+        # The fast route's cells may be unexplored by the cool search: cost them for its exposure
+        cool_costs[0].ensure(r_fast.edges)
+        stats = cool_costs[0].stats()
+        print(f"   🧮 Lazy costing: {stats['costed_edges']}/{stats['edges']} edges costed "
+              f"({stats['costed_pct']}%), {stats['corridor_edges']} in corridor, "
+              f"{stats['cells']} cells, {stats['cost_ms']} ms")
+        yield "costing", stats
+    yield "cool", routes[0][1]
+    if len(routes) > 1:
+        yield "profiles", routes
+    yield "exposure", exposure
+
+    # 5. LOAD AMENITIES (Hawker centers, MRT, supermarkets, landmarks) - optional
+    amenities_list = []
+    if deadline.allows("amenities"):
+        amenities_list = load_amenities(start_lat, start_lon, (minx, miny, maxx, maxy))
+    else:
+        deadline.skip("amenities")
+    yield "amenities", amenities_list
+
+def calculate_route_v53(start_lat, start_lon, end_lat, end_lon, departure_time):
+    """Full v5.3 route calculation with all features"""
+    stages = dict(route_stages(start_lat, start_lon, end_lat, end_lon, departure_time))
+    if "error" in stages:
         return None, None, None, [], 0, 0
+    cg, r_fast, r_cool = stages["network"], stages["fast"], stages["cool"]
+    # Distances are the ridden edge lengths (partial at both split edges)
+    return cg, r_fast, r_cool, stages["amenities"], r_fast.length(cg), r_cool.length(cg)
+
+COORDS_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+def geocode_place(text):
+    """Geocode a Singapore place name; a literal "lat, lon" pair is used as-is"""
+    match = COORDS_PATTERN.match(text)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    ox = import_osmnx()
+    return ox.geocode(text + ", Singapore")
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once warm-up has finished, 503 while still warming"""
+    return jsonify(dict(readiness(), admission=admission_stats())), (200 if is_ready() else 503)
 
 @app.route('/debug/files', methods=['GET'])
 def debug_files():
@@ -617,168 +811,584 @@ def debug_files():
 
     return jsonify(debug_info)
 
+def parse_departure_time(time_text):
+    """"HH:MM" today in Singapore time; now if empty or unparseable"""
+    sgt_zone = pytz.timezone('Asia/Singapore')
+    if time_text:
+        try:
+            hour, minute = map(int, time_text.split(':'))
+            return datetime.now(sgt_zone).replace(hour=hour, minute=minute, second=0)
+        except:
+            pass
+    return datetime.now(sgt_zone)
+
+# Calculate durations for display
+CYCLING_SPEED_KMH = 15
+CYCLING_SPEED_MS = CYCLING_SPEED_KMH * 1000 / 3600
+
+def format_duration(distance):
+    """"M:SS" riding time for a distance in meters"""
+    seconds = distance / CYCLING_SPEED_MS
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+
+def route_summary(cg, route):
+    """JSON-able distance, duration and [lat, lon] path of a route"""
+    distance = route.length(cg)
+    return {
+        "distance": f"{distance:.0f}",
+        "duration": format_duration(distance),
+        "path": [[lat, lon] for lon, lat in route.coords(cg)],
+    }
+
+# Isochrones: reachable network within a riding-time budget
+ISOCHRONE_MAX_MINUTES = 60
+ISOCHRONE_HULL_RATIO = 0.3      # shapely.concave_hull ratio (1 = convex hull)
+ISOCHRONE_AMENITY_REACH_M = 100  # amenities this far outside the hull still count
+
+def compute_isochrone(lat, lon, departure_time, minutes=15, by="cool", with_edges=False, profile=DEFAULT_PROFILE,
+                      deadline=None):
+    """Everything reachable from (lat, lon) within `minutes` of riding at CYCLING_SPEED_KMH.
+
+    One bounded search from the snapped origin on the area graph: by="cool" follows
+    the cool cost of `profile` (the path its cool route would take), by="fast" plain riding time.
+    Paths are cut off at the time budget, so the work grows with the reachable area.
+    Only cached areas are supported. Building shadows are left out (skipped_layers)
+    when the area's footprints can't be loaded within deadline.
+    """
+    from shapely.geometry import MultiPoint, mapping
+    from shapely.ops import substring
+
+    area_name = find_cached_network(lat, lon)
+    if area_name is None:
+        raise ValueError("Isochrones are only available inside the cached areas")
+    cg = load_compact(area_name)
+    snap_index = load_snap_index(area_name)
+    deadline = deadline or Deadline()
+    layers, _ = area_layers(area_name, departure_time, deadline)
+    seconds = cg.edge_length / CYCLING_SPEED_MS
+    factor = layers["factor"] if profile is DEFAULT_PROFILE else layers["features"] @ profile.vector
+    weights = cg.edge_length * factor if by == "cool" else seconds
+    budget = minutes * 60.0
+
+    # Seed the search at the ends of the snapped edge (and its twin)
+    origin = snap_index.snap_point(lon, lat)
+    sources = {}
+    first = {}  # edge -> (t_from, t_to) ridden straight from the origin
+    for node, edge, t in snap_exits(snap_index, origin):
+        spent = 0.0 if edge is None else (1.0 - t) * seconds[edge]
+        if edge is not None:
+            first[edge] = (t, min(1.0, t + budget / seconds[edge]) if seconds[edge] > 0 else 1.0)
+        if spent > budget:
+            continue
+        cost = 0.0 if edge is None else (1.0 - t) * weights[edge]
+        if cost < sources.get(node, (float('inf'), 0.0))[0]:
+            sources[node] = (cost, spent)
+
+    t0 = time.perf_counter()
+    settled = cg.bounded_search(sources, weights, seconds, budget)
+    search_ms = (time.perf_counter() - t0) * 1000
+
+    # Every out-edge of a settled node is ridden as far as the time left allows
+    nodes = np.fromiter(settled.keys(), dtype=np.int64, count=len(settled))
+    left = budget - np.fromiter((label[1] for label in settled.values()), dtype=np.float64, count=len(settled))
+    indptr = np.asarray(cg.indptr)
+    starts = indptr[nodes]
+    sizes = indptr[nodes + 1] - starts
+    edges = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+    lo = np.zeros(len(edges))
+    hi = np.minimum(1.0, np.repeat(left, sizes) / np.maximum(seconds[edges], 1e-9))
+    if first:
+        edges = np.concatenate([edges, list(first)])
+        lo = np.concatenate([lo, [t_from for t_from, _ in first.values()]])
+        hi = np.concatenate([hi, [t_to for _, t_to in first.values()]])
+    ridden = cg.edge_length[edges] * (hi - lo)
+
+    # Share of the ridden length in the open sun
+    shaded = layers["tree"] + layers["shadow"] - layers["both"]
+    exposure_ratio = float((ridden * (1.0 - shaded[edges])).sum() / ridden.sum()) if ridden.sum() > 0 else 0.0
+
+    # Street length, counting a two-way street once: an edge and its twin cover it from both ends
+    twin = snap_index.twin[edges]
+    street = np.where((twin >= 0) & (twin < edges), twin, edges)
+    streets, inverse = np.unique(street, return_inverse=True)
+    covered = np.minimum(1.0, np.bincount(inverse, weights=hi - lo))
+    reachable_km = float((covered * cg.edge_length[streets]).sum() / 1000)
+
+    # Outline: concave hull of the settled nodes, the partial edge ends and the origin
+    partial = hi < 1.0
+    ends = shapely.line_interpolate_point(cg.edge_geometries()[edges[partial]], hi[partial], normalized=True)
+    points = np.vstack([np.column_stack([cg.x[nodes], cg.y[nodes]]),
+                        shapely.get_coordinates(ends).reshape(-1, 2),
+                        [[origin.lon, origin.lat]]])
+    hull = shapely.concave_hull(MultiPoint(points), ratio=ISOCHRONE_HULL_RATIO)
+
+    reach = hull.buffer(ISOCHRONE_AMENITY_REACH_M / 111000)
+    amenities = [(name, a_lat, a_lon, type_label)
+                 for name, a_lat, a_lon, type_label in load_amenities(lat, lon, reach.bounds)
+                 if shapely.contains_xy(reach, a_lon, a_lat)]
+
+    result = {
+        "area": area_name,
+        "origin": [origin.lat, origin.lon],
+        "minutes": minutes,
+        "by": by,
+        "profile": profile.to_dict(),
+        "reachable_km": round(reachable_km, 2),
+        "exposure_ratio": round(exposure_ratio, 3),
+        "polygon": mapping(hull),
+        "amenities": [{"name": name, "lat": a_lat, "lon": a_lon, "type": type_label}
+                      for name, a_lat, a_lon, type_label in amenities],
+        "stats": {"settled_nodes": len(settled), "edges": len(edges), "search_ms": round(search_ms, 1)},
+        "skipped_layers": list(deadline.skipped),
+    }
+    if with_edges:
+        features = []
+        for e, e_lo, e_hi in zip(edges.tolist(), lo.tolist(), hi.tolist()):
+            geometry = cg.edge_geometries()[e]
+            if e_lo > 0.0 or e_hi < 1.0:
+                geometry = substring(geometry, e_lo, e_hi, normalized=True)
+            features.append({"type": "Feature", "geometry": mapping(geometry),
+                             "properties": {"portion": round(e_hi - e_lo, 3),
+                                            "shade": round(float(shaded[e]), 2),
+                                            "factor": round(float(factor[e]), 2)}})
+        result["edges"] = {"type": "FeatureCollection", "features": features}
+    return result
+
+def route_events(data):
+    """The /calculate_route pipeline as (event, payload) pairs, emitted as each stage completes:
+    geocoded -> fast -> cool -> amenities -> weather -> done (the full response), or error.
+
+    The cool route follows the request's weight profile; with several
+    `profiles`, a profiles event after cool carries the route of each.
+
+    Runs in a REQUESTS lane slot under a Deadline (data may ask for a shorter
+    deadline_s); raises AdmissionError when refused or out of time, and
+    ProfileError for invalid profiles or weights."""
+    profiles = request_profiles(data)
+    deadline = Deadline(request_budget(data))
+    with REQUESTS.admit(deadline):
+        yield from _route_events(data, deadline, profiles)
+
+def _route_events(data, deadline, profiles):
+    print(f"\n📨 Request: {data}")
+
+    # Get start/end from request
+    start_text = data.get('start', 'Tampines MRT')
+    end_text = data.get('end', 'Tampines Eco Green')
+    time_text = data.get('time', '')
+
+    # Geocode
+    print(f"🔍 Geocoding: {start_text} -> {end_text}")
+    start_coords = geocode_place(start_text)
+    end_coords = geocode_place(end_text)
+    departure_time = parse_departure_time(time_text)
+    yield "geocoded", {
+        "start_point": start_coords,
+        "end_point": end_coords,
+        "departure_time": departure_time.isoformat(),
+    }
+
+    # Calculate route using v5.3 logic, forwarding each stage as it lands
+    cg = r_fast = r_cool = costing = exposure = None
+    amenities_list = []
+    profile_routes = []
+    routes_by_profile = []
+    deadline.check("routing")
+    for stage, value in route_stages(start_coords[0], start_coords[1],
+                                     end_coords[0], end_coords[1], departure_time, deadline, profiles):
+        if stage == "error":
+            yield "error", {"status": "error", "message": value}
+            return
+        if stage == "network":
+            cg = value
+        elif stage == "fast":
+            r_fast = value
+            yield "fast", route_summary(cg, r_fast)
+        elif stage == "costing":
+            costing = value
+        elif stage == "cool":
+            r_cool = value
+            # Check similarity
+            set_fast = set(r_fast.nodes(cg))
+            set_cool = set(r_cool.nodes(cg))
+            similarity = len(set_fast.intersection(set_cool)) / len(set_fast.union(set_cool))
+            print(f"   🔍 Similarity: {similarity*100:.1f}%")
+            yield "cool", dict(route_summary(cg, r_cool), similarity=f"{similarity*100:.1f}%")
+        elif stage == "profiles":
+            routes_by_profile = value
+            profile_routes = [dict(route_summary(cg, route), profile=profile.to_dict()) for profile, route in value]
+            yield "profiles", {"profiles": profile_routes}
+        elif stage == "exposure":
+            exposure = value
+        elif stage == "amenities":
+            amenities_list = value
+            yield "amenities", {"amenities": [{"name": name, "lat": lat, "lon": lon, "type": type_label}
+                                              for name, lat, lon, type_label in amenities_list]}
+
+    # Distances are the ridden edge lengths (partial at both split edges)
+    fast_distance = r_fast.length(cg)
+    cool_distance = r_cool.length(cg)
+    fast_duration_str = format_duration(fast_distance)
+    cool_duration_str = format_duration(cool_distance)
+
+    # GET WEATHER DATA & AI PREDICTION
+    deadline.check("weather")
+    print("\n🌡️ Fetching Real-Time Weather Data...")
+    current_wbgt, station_name = get_nearest_wbgt_station(start_coords[0], start_coords[1])
+    # History backfill pages through days of NEA data: optional when time is short
+    backfill = deadline.allows("history")
+    if not backfill and not history_cached(get_cache(), station_name):
+        deadline.skip("history")
+    pred_wbgt, trend, confidence = predict_trend(station_name, current_wbgt, backfill)
+    effective_wbgt = max(current_wbgt, pred_wbgt)
+
+    # SAFETY RECOMMENDATION
+    safety_status, safety_color, safety_advice = get_safety_recommendation(effective_wbgt)
+
+    # TRIP EXPOSURE - shade, sun and PCN metres and heat dose, from the per-edge exposure matrix
+    fast_exposure = route_exposure(cg, r_fast, exposure, effective_wbgt, CYCLING_SPEED_MS)
+    cool_exposure = route_exposure(cg, r_cool, exposure, effective_wbgt, CYCLING_SPEED_MS)
+    for summary, (_, route) in zip(profile_routes, routes_by_profile):
+        summary["exposure"] = route_exposure(cg, route, exposure, effective_wbgt, CYCLING_SPEED_MS)
+    shade_gain = cool_exposure["shaded_pct"] - fast_exposure["shaded_pct"]
+
+    print(f"\n📊 WEATHER REPORT: {station_name}")
+    print(f"   Current WBGT: {current_wbgt}°C")
+    print(f"   Forecast (15min): {pred_wbgt:.1f}°C ({trend})")
+    print(f"   Safety: {safety_status}")
+    print(f"\n📏 ROUTE STATS:")
+    print(f"   Fast Route: {fast_distance:.0f}m ({fast_duration_str})")
+    print(f"   Cool Route: {cool_distance:.0f}m ({cool_duration_str})")
+    print(f"   Shade: {fast_exposure['shaded_pct']:.0f}% fast, {cool_exposure['shaded_pct']:.0f}% cool; "
+          f"heat dose {fast_exposure['heat_dose']:.0f} vs {cool_exposure['heat_dose']:.0f} °C·min")
+
+    # Build comprehensive insight
+    route_insight = (f"🟢 Green route is {cool_exposure['shaded_pct']:.0f}% shaded "
+                     f"({cool_exposure['sun_m']}m in the sun). 🔴 Red route is faster but "
+                     f"{fast_exposure['shaded_pct']:.0f}% shaded ({fast_exposure['sun_m']}m in the sun).")
+    full_insight = f"{route_insight}\n\n{safety_status}: {safety_advice}"
+    ai_data = {
+        "current_temp": f"{current_wbgt:.1f}",
+        "forecast_temp": f"{pred_wbgt:.1f}",
+        "trend": trend,
+        "confidence": confidence,
+        "insight": full_insight,
+        "safety_status": safety_status,
+        "safety_color": safety_color,
+        "safety_advice": safety_advice,
+        "color": safety_color,
+        # Percentage points of the ride in shade gained by taking the cool route
+        "shade_gain": int(round(shade_gain))
+    }
+    yield "weather", dict(ai_data, skipped_layers=list(deadline.skipped),
+                          exposure={"fast": fast_exposure, "cool": cool_exposure})
+
+    # Convert to KML
+    kml = simplekml.Kml()
+
+    def route_to_kml(route, color, name, desc):
+        ls = kml.newlinestring(name=name)
+        ls.coords = route.coords(cg)
+        ls.style.linestyle.color = color
+        ls.style.linestyle.width = 5
+        ls.description = desc
+
+    if similarity > 0.90:
+        # Routes are similar - show only cool route
+        route_to_kml(r_cool, simplekml.Color.green, "Recommended Route",
+                    f"<b>Smart Choice</b><br>The fastest path is also the coolest!<br><br>📏 Distance: {cool_distance:.0f}m ({cool_distance/1000:.1f} km)<br>⏱️ Time: {cool_duration_str} min")
+    else:
+        # Show both routes
+        route_to_kml(r_fast, simplekml.Color.red, "Fastest Route",
+                    f"<b>Direct Path</b><br>Shortest time, higher exposure<br><br>📏 Distance: {fast_distance:.0f}m ({fast_distance/1000:.1f} km)<br>⏱️ Time: {fast_duration_str} min")
+        route_to_kml(r_cool, simplekml.Color.green, "Cool Route",
+                    f"<b>Shaded Path</b><br>More shade, slightly longer<br><br>📏 Distance: {cool_distance:.0f}m ({cool_distance/1000:.1f} km)<br>⏱️ Time: {cool_duration_str} min")
+
+    # Add amenities to KML
+    for name, lat, lon, type_label in amenities_list:
+        # Map type to emoji
+        emoji_map = {
+            "Hawker": "🍜",
+            "Supermarket": "🛒",
+            "MRT": "🚇"
+        }
+        emoji = emoji_map.get(type_label, "📍")
+
+        p = kml.newpoint(name=f"{emoji} {name}")
+        p.coords = [(lon, lat)]
+        p.style.iconstyle.icon.href = 'http://maps.google.com/mapfiles/kml/paddle/red-circle.png'
+        p.description = f"<b>{type_label}</b><br>{name}"
+
+    print("✅ Route generated successfully!\n")
+    yield "done", {
+        "status": "success",
+        "kml_data": kml.kml(),
+        "meta": {
+            "start_point": start_coords,
+            "end_point": end_coords,
+            "similarity": f"{similarity*100:.1f}%",
+            "weather_station": station_name,
+            "fast_distance": f"{fast_distance:.0f}",
+            "cool_distance": f"{cool_distance:.0f}",
+            "fast_duration": fast_duration_str,
+            "cool_duration": cool_duration_str,
+            "degraded": bool(deadline.skipped),
+            "skipped_layers": list(deadline.skipped),
+            "profile": profiles[0].to_dict(),
+            "exposure": {"fast": fast_exposure, "cool": cool_exposure},
+            **({"costing": costing} if costing else {}),
+            **({"profiles": profile_routes} if profile_routes else {})
+        },
+        "ai_data": ai_data
+    }
+
+@app.route('/profiles', methods=['GET'])
+def list_weight_profiles():
+    """Named weight profiles and the features custom weights may set"""
+    return jsonify({"profiles": PROFILES, "features": list(FEATURES),
+                    "min_weight": MIN_WEIGHT, "max_weight": MAX_WEIGHT})
+
 @app.route('/calculate_route', methods=['POST', 'OPTIONS'])
 def calculate_route():
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'})
 
+    # Opt-in profiling (profiling.py); off, this is a header lookup and a random()
+    reason = profile_reason(request.headers)
+    if reason is None:
+        return route_response(request.json)
+    data = request.json or {}
+    with Profiled(f"{data.get('start')} -> {data.get('end')}", reason) as profile:
+        response = route_response(data)
+    if profile.id:
+        response.headers['X-Profile-Id'] = profile.id
+    return response
+
+def route_response(data):
+    """The /calculate_route response for a request body"""
     try:
-        data = request.json
-        print(f"\n📨 Request: {data}")
-
-        # Get start/end from request
-        start_text = data.get('start', 'Tampines MRT')
-        end_text = data.get('end', 'Tampines Eco Green')
-        time_text = data.get('time', '')
-
-        # Geocode
-        print(f"🔍 Geocoding: {start_text} -> {end_text}")
-        start_coords = ox.geocode(start_text + ", Singapore")
-        end_coords = ox.geocode(end_text + ", Singapore")
-
-        # Parse time
-        sgt_zone = pytz.timezone('Asia/Singapore')
-        if time_text:
-            try:
-                hour, minute = map(int, time_text.split(':'))
-                departure_time = datetime.now(sgt_zone).replace(hour=hour, minute=minute, second=0)
-            except:
-                departure_time = datetime.now(sgt_zone)
-        else:
-            departure_time = datetime.now(sgt_zone)
-
-        # Calculate route using v5.3 logic
-        G, r_fast, r_cool, amenities_list, fast_distance, cool_distance = calculate_route_v53(
-            start_coords[0], start_coords[1],
-            end_coords[0], end_coords[1],
-            departure_time
-        )
-
-        if G is None or r_fast is None:
-            return jsonify({"status": "error", "message": "Route calculation failed"}), 500
-
-        # Convert to KML
-        kml = simplekml.Kml()
-
-        def route_to_kml(route, color, name, desc):
-            coords = []
-            for u, v in zip(route[:-1], route[1:]):
-                edge_data = G.get_edge_data(u, v)[0]
-                if 'geometry' in edge_data:
-                    xs, ys = edge_data['geometry'].xy
-                    coords.extend([(float(x), float(y)) for x, y in zip(xs, ys)])
-                else:
-                    coords.append((float(G.nodes[u]['x']), float(G.nodes[u]['y'])))
-                    coords.append((float(G.nodes[v]['x']), float(G.nodes[v]['y'])))
+        for event, payload in route_events(data):
+            if event == "error":
+                return make_response(jsonify(payload), 500)
+            if event == "done":
+                return make_response(jsonify(payload))
+        return make_response(jsonify({"status": "error", "message": "Route calculation failed"}), 500)
+
+    except AdmissionError as e:
+        return admission_response(e)
+    except ProfileError as e:
+        return make_response(jsonify({"status": "error", "message": str(e)}), 400)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return make_response(jsonify({"status": "error", "message": str(e)}), 500)
+
+def admin_token():
+    """Token sent as X-Admin-Token or Authorization: Bearer"""
+    auth = request.headers.get('Authorization', '')
+    return request.headers.get('X-Admin-Token') or (auth[7:] if auth.startswith('Bearer ') else '')
+
+def admin_denied():
+    """Error response unless the request carries the admin token (404 when no token is configured)"""
+    if not ADMIN_TOKEN:
+        return jsonify({"status": "error", "message": "Not found"}), 404
+    if not authorized(admin_token()):
+        return jsonify({"status": "error", "message": "Forbidden"}), 403
+    return None
+
+@app.route('/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """Stored request profiles, newest first"""
+    return admin_denied() or jsonify({"profiles": list_profiles()})
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+def admin_profile(profile_id):
+    """One profile's summary and heaviest functions"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    record = get_profile(profile_id)
+    if record is None:
+        return jsonify({"status": "error", "message": "Unknown or evicted profile"}), 404
+    # From the record already in hand: it may be evicted from the store by now
+    return jsonify(dict(profile_summary(record), top=top_functions(record)))
+
+@app.route('/admin/profiles/<profile_id>/pstats', methods=['GET'])
+def admin_profile_pstats(profile_id):
+    """cProfile dump (python -m pstats <file>, snakeviz)"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    record = get_profile(profile_id)
+    if record is None:
+        return jsonify({"status": "error", "message": "Unknown or evicted profile"}), 404
+    return Response(record["pstats"], mimetype='application/octet-stream',
+                    headers={'Content-Disposition': f'attachment; filename={profile_id}.prof'})
+
+@app.route('/admin/profiles/<profile_id>/collapsed', methods=['GET'])
+def admin_profile_collapsed(profile_id):
+    """Collapsed stacks (flamegraph.pl, speedscope)"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    record = get_profile(profile_id)
+    if record is None:
+        return jsonify({"status": "error", "message": "Unknown or evicted profile"}), 404
+    return Response(record["collapsed"], mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={profile_id}.folded'})
+
+def render_thermal_tile(z, x, y, slot_start, generation, deadline=None):
+    """MVT bytes of every cached-area edge in the tile with its thermal layers.
+
+    Tiles are cached, so they are never drawn without building shadows: raises
+    BuildingsUnavailable if an area's footprints can't be loaded within deadline."""
+    if z < MIN_ZOOM:
+        return b""
+    west, south, east, north = tile_bounds(z, x, y)
+    features = []
+    for i, name in enumerate(available_networks()):
+        cg = load_compact(name)
+        minx, miny, maxx, maxy = cg.bounds()
+        if maxx < west or minx > east or maxy < south or miny > north:
+            continue
+        if not (buildings_ready(name) or load_shade_matrix(name) is not None):
+            load_buildings(name, deadline.budget_for("buildings") if deadline else None)
+        layers = area_thermal_layers(name, slot_start, generation)
+        shaded = layers["tree"] + layers["shadow"] - layers["both"]
+
+        def properties(edges, layers=layers, shaded=shaded, name=name):
+            return [{"factor": round(float(layers["factor"][e]), 2),
+                     "shade": round(float(shaded[e]), 2),
+                     "pcn": bool(layers["pcn"][e]),
+                     "water": bool(layers["water"][e]),
+                     "area": name} for e in edges.tolist()]
+
+        # Areas overlap, so feature ids are offset per area
+        features += edge_features(cg, name, z, x, y, properties, id_offset=i * 10**7)
+    return encode_layer("cool_edges", features) if features else b""
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.pbf', methods=['GET'])
+def thermal_tile(z, x, y):
+    """Vector tile (layer "cool_edges") of per-edge thermal factors for ?time=HH:MM (default now)"""
+    slot_start = sun_slot(parse_departure_time(request.args.get('time', '')))
+    generation = overlay_generation()
+
+    def render():
+        # A miss may compute an area's thermal layers (and load its buildings): take a tile slot
+        deadline = Deadline()
+        with TILES.admit(deadline):
+            return render_thermal_tile(z, x, y, slot_start, generation, deadline)
 
-            ls = kml.newlinestring(name=name)
-            ls.coords = coords
-            ls.style.linestyle.color = color
-            ls.style.linestyle.width = 5
-            ls.description = desc
+    try:
+        etag, payload = TILE_CACHE.get((z, x, y, slot_start, generation), render)
+    except AdmissionError as e:
+        return admission_response(e)
+    except BuildingsUnavailable as e:
+        response = jsonify({"status": "error", "message": str(e), "reason": "loading"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(RETRY_AFTER_S)
+        return response
+    response = Response(payload, mimetype='application/vnd.mapbox-vector-tile')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={SUN_SLOT_MINUTES * 60}'
+    return response.make_conditional(request)
+
+def admission_payload(e):
+    return {"status": "error", "message": str(e), "reason": e.reason}
+
+def admission_response(e):
+    """503 (with Retry-After), 504, or 400 for a bad deadline_s: a request turned away by admission control"""
+    response = jsonify(admission_payload(e))
+    response.status_code = e.status
+    if e.status == 503:
+        response.headers['Retry-After'] = str(RETRY_AFTER_S)
+    return response
 
-        # Check similarity
-        set_fast = set(r_fast)
-        set_cool = set(r_cool)
-        similarity = len(set_fast.intersection(set_cool)) / len(set_fast.union(set_cool))
+def sse(event, payload):
+    """One server-sent event frame"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-        print(f"   🔍 Similarity: {similarity*100:.1f}%")
+@app.route('/calculate_route/stream', methods=['GET', 'POST', 'OPTIONS'])
+def calculate_route_stream():
+    """Same pipeline as /calculate_route, streamed as server-sent events.
 
-        # Calculate durations for display
-        CYCLING_SPEED_KMH = 15
-        CYCLING_SPEED_MS = CYCLING_SPEED_KMH * 1000 / 3600
+    POST takes the same JSON body; GET takes start/end/time query parameters
+    (for EventSource). Events: geocoded, fast, cool, profiles (several
+    profiles only), amenities, weather, then done with the full
+    /calculate_route response, or error.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+    data = data or {}
+
+    def generate():
+        try:
+            for event, payload in route_events(data):
+                yield sse(event, payload)
+        except AdmissionError as e:
+            yield sse("error", admission_payload(e))
+        except ProfileError as e:
+            yield sse("error", {"status": "error", "message": str(e)})
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            import traceback
+            traceback.print_exc()
+            yield sse("error", {"status": "error", "message": str(e)})
 
-        fast_duration_seconds = fast_distance / CYCLING_SPEED_MS
-        cool_duration_seconds = cool_distance / CYCLING_SPEED_MS
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-        fast_duration_str = f"{int(fast_duration_seconds // 60)}:{int(fast_duration_seconds % 60):02d}"
-        cool_duration_str = f"{int(cool_duration_seconds // 60)}:{int(cool_duration_seconds % 60):02d}"
+@app.route('/isochrone', methods=['GET', 'POST', 'OPTIONS'])
+def isochrone():
+    """Area reachable within `minutes` (default 15) of riding from `start` at `time`.
 
-        if similarity > 0.90:
-            # Routes are similar - show only cool route
-            route_to_kml(r_cool, simplekml.Color.green, "Recommended Route",
-                        f"<b>Smart Choice</b><br>The fastest path is also the coolest!<br><br>📏 Distance: {cool_distance:.0f}m ({cool_distance/1000:.1f} km)<br>⏱️ Time: {cool_duration_str} min")
-        else:
-            # Show both routes
-            route_to_kml(r_fast, simplekml.Color.red, "Fastest Route",
-                        f"<b>Direct Path</b><br>Shortest time, higher exposure<br><br>📏 Distance: {fast_distance:.0f}m ({fast_distance/1000:.1f} km)<br>⏱️ Time: {fast_duration_str} min")
-            route_to_kml(r_cool, simplekml.Color.green, "Cool Route",
-                        f"<b>Shaded Path</b><br>More shade, slightly longer<br><br>📏 Distance: {cool_distance:.0f}m ({cool_distance/1000:.1f} km)<br>⏱️ Time: {cool_duration_str} min")
-
-        # Add amenities to KML
-        for name, lat, lon, type_label in amenities_list:
-            # Map type to emoji
-            emoji_map = {
-                "Hawker": "🍜",
-                "Supermarket": "🛒",
-                "MRT": "🚇"
-            }
-            emoji = emoji_map.get(type_label, "📍")
-
-            p = kml.newpoint(name=f"{emoji} {name}")
-            p.coords = [(lon, lat)]
-            p.style.iconstyle.icon.href = 'http://maps.google.com/mapfiles/kml/paddle/red-circle.png'
-            p.description = f"<b>{type_label}</b><br>{name}"
-
-        # GET WEATHER DATA & AI PREDICTION
-        print("\n🌡️ Fetching Real-Time Weather Data...")
-        current_wbgt, station_name = get_nearest_wbgt_station(start_coords[0], start_coords[1])
-        pred_wbgt, trend, confidence = predict_trend(station_name, current_wbgt)
-        effective_wbgt = max(current_wbgt, pred_wbgt)
-
-        # SAFETY RECOMMENDATION
-        safety_status, safety_color, safety_advice = get_safety_recommendation(effective_wbgt)
-
-        # Duration already calculated above for KML descriptions
-        print(f"\n📊 WEATHER REPORT: {station_name}")
-        print(f"   Current WBGT: {current_wbgt}°C")
-        print(f"   Forecast (15min): {pred_wbgt:.1f}°C ({trend})")
-        print(f"   Safety: {safety_status}")
-        print(f"\n📏 ROUTE STATS:")
-        print(f"   Fast Route: {fast_distance:.0f}m ({fast_duration_str})")
-        print(f"   Cool Route: {cool_distance:.0f}m ({cool_duration_str})")
-        print("✅ Route generated successfully!\n")
-
-        # Build comprehensive insight
-        route_insight = f"🟢 Green route is cooler with {int((1 - similarity) * 100)}% more shade. 🔴 Red route is faster but more sun exposure."
-        full_insight = f"{route_insight}\n\n{safety_status}: {safety_advice}"
-
-        return jsonify({
-            "status": "success",
-            "kml_data": kml.kml(),
-            "meta": {
-                "start_point": start_coords,
-                "end_point": end_coords,
-                "similarity": f"{similarity*100:.1f}%",
-                "weather_station": station_name,
-                "fast_distance": f"{fast_distance:.0f}",
-                "cool_distance": f"{cool_distance:.0f}",
-                "fast_duration": fast_duration_str,
-                "cool_duration": cool_duration_str
-            },
-            "ai_data": {
-                "current_temp": f"{current_wbgt:.1f}",
-                "forecast_temp": f"{pred_wbgt:.1f}",
-                "trend": trend,
-                "confidence": confidence,
-                "insight": full_insight,
-                "safety_status": safety_status,
-                "safety_color": safety_color,
-                "safety_advice": safety_advice,
-                "color": safety_color,
-                "shade_gain": int((1 - similarity) * 100)
-            }
-        })
+    by=cool (default) follows the cool cost of `profile` (and `weights`, as for
+    /calculate_route), by=fast the quickest streets; edges=true adds the reached edges as a GeoJSON FeatureCollection.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'})
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+    data = data or {}
+    try:
+        minutes = min(max(float(data.get('minutes', 15)), 1.0), ISOCHRONE_MAX_MINUTES)
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "minutes must be a number"}), 400
+    by = data.get('by', 'cool')
+    if by not in ('cool', 'fast'):
+        return jsonify({"status": "error", "message": "by must be 'cool' or 'fast'"}), 400
+    with_edges = str(data.get('edges', '')).lower() in ('1', 'true', 'yes')
+    try:
+        profile, = request_profiles(dict(data, profiles=None))
+    except ProfileError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
+    try:
+        deadline = Deadline(request_budget(data))
+        with REQUESTS.admit(deadline):
+            lat, lon = geocode_place(data.get('start', 'Tampines MRT'))
+            result = compute_isochrone(lat, lon, parse_departure_time(data.get('time', '')),
+                                       minutes=minutes, by=by, with_edges=with_edges, profile=profile,
+                                       deadline=deadline)
+    except AdmissionError as e:
+        return admission_response(e)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         print(f"❌ Error: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({"status": "error", "message": str(e)}), 500
+    print(f"   🗺️ Isochrone {minutes:g} min ({by}): {result['reachable_km']} km, "
+          f"{result['stats']['settled_nodes']} nodes in {result['stats']['search_ms']} ms")
+    return jsonify(dict(result, status="success"))
 
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("🚀 SIMPLE COOLRIDE SERVER")
     print("📡 URL: http://localhost:5001")
     print("="*60 + "\n")
+    start_background_warm_up()
     app.run(host='0.0.0.0', port=5001, debug=False)
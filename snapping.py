@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Per-area snapping index: project coordinates onto the nearest edge.
+
+Snapping to the nearest node can land tens of metres away on long edges.
+SnapIndex keeps an STRtree of every edge segment in a local metric frame,
+built once per area and process, and projects query points onto the closest
+segment. snapped_route() then routes from the projected point by splitting the
+snapped edges virtually instead of modifying the shared graph.
+"""
+
+import math
+import numpy as np
+import shapely
+from compact_graph import Route
+
+M_PER_DEG_LAT = 110574.0
+M_PER_DEG_LON_EQUATOR = 111320.0
+# Snaps this close to an edge end start/finish at the node itself
+NODE_TOLERANCE_M = 1.0
+
+
+class Snap:
+    """Projection of one or more points onto graph edges (arrays, or scalars for one point)"""
+
+    def __init__(self, edge, t, lon, lat, distance_m):
+        self.edge = edge              # edge id
+        self.t = t                    # fraction along the edge, 0 at its tail node
+        self.lon = lon                # projected coordinate
+        self.lat = lat
+        self.distance_m = distance_m  # query point -> projected coordinate
+
+    def __len__(self):
+        return len(self.edge)
+
+    def __getitem__(self, i):
+        return Snap(int(self.edge[i]), float(self.t[i]), float(self.lon[i]),
+                    float(self.lat[i]), float(self.distance_m[i]))
+
+
+class SnapIndex:
+    """STRtree over the edge segments of one CompactGraph"""
+
+    def __init__(self, cg):
+        self.cg = cg
+        xy = np.asarray(cg.geom_xy)
+        ptr = np.asarray(cg.geom_ptr)
+        self.lon0 = float(np.mean(cg.x))
+        self.lat0 = float(np.mean(cg.y))
+        self.kx = M_PER_DEG_LON_EQUATOR * math.cos(math.radians(self.lat0))
+        px, py = self._project(xy[:, 0], xy[:, 1])
+
+        # Segment i joins points i and i+1 unless i is the last point of an edge
+        points_per_edge = np.diff(ptr)
+        seg_start = np.ones(len(xy), dtype=bool)
+        seg_start[ptr[1:] - 1] = False
+        seg_start = np.flatnonzero(seg_start)
+        self.seg_edge = np.repeat(np.arange(cg.num_edges), points_per_edge - 1)
+        self.x0, self.y0 = px[seg_start], py[seg_start]
+        self.x1, self.y1 = px[seg_start + 1], py[seg_start + 1]
+        self.seg_len = np.hypot(self.x1 - self.x0, self.y1 - self.y0)
+
+        # Offset of each segment from the start of its edge, and each edge's drawn length
+        cum = np.concatenate([[0.0], np.cumsum(self.seg_len)])
+        first_seg = np.concatenate([[0], np.cumsum(points_per_edge - 1)])[:-1]
+        self.seg_offset = cum[:-1] - cum[first_seg[self.seg_edge]]
+        self.edge_geo_len = np.bincount(self.seg_edge, weights=self.seg_len, minlength=cg.num_edges)
+
+        segments = np.stack([np.column_stack([self.x0, self.y0]),
+                             np.column_stack([self.x1, self.y1])], axis=1)
+        self.tree = shapely.STRtree(shapely.linestrings(segments))
+        self.twin = self._find_twins()
+
+    def _project(self, lons, lats):
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        return (lons - self.lon0) * self.kx, (lats - self.lat0) * M_PER_DEG_LAT
+
+    def _find_twins(self):
+        """Reverse edge (v -> u, same length) of every edge, or -1 for one-way edges"""
+        cg = self.cg
+        edge_u = cg.edge_u.tolist()
+        edge_v = cg.edge_v.tolist()
+        lengths = cg.edge_length.tolist()
+        by_ends = {}
+        for e, (u, v) in enumerate(zip(edge_u, edge_v)):
+            by_ends.setdefault((u, v), []).append(e)
+        ptr = cg.geom_ptr.tolist()
+        xy = cg.geom_xy
+
+        def reverses(r, e):
+            # r runs e backwards if r's second-to-last point is e's second point
+            return np.allclose(xy[ptr[r + 1] - 2], xy[ptr[e] + 1])
+
+        twin = np.full(cg.num_edges, -1, dtype=np.int64)
+        for e, (u, v) in enumerate(zip(edge_u, edge_v)):
+            candidates = [r for r in by_ends.get((v, u), ())
+                          if r != e and abs(lengths[r] - lengths[e]) < 1.0 and reverses(r, e)]
+            if candidates:
+                twin[e] = min(candidates, key=lambda r: abs(lengths[r] - lengths[e]))
+        return twin
+
+    def snap(self, lons, lats):
+        """Vectorized projection of many points; returns a Snap of arrays"""
+        qx, qy = self._project(np.atleast_1d(lons), np.atleast_1d(lats))
+        hits = self.tree.query_nearest(shapely.points(qx, qy), all_matches=False)
+        seg = np.empty(len(qx), dtype=np.int64)
+        seg[hits[0]] = hits[1]
+
+        x0, y0 = self.x0[seg], self.y0[seg]
+        dx, dy = self.x1[seg] - x0, self.y1[seg] - y0
+        denom = dx * dx + dy * dy
+        s = np.divide((qx - x0) * dx + (qy - y0) * dy, denom, out=np.zeros_like(denom), where=denom > 0)
+        s = np.clip(s, 0.0, 1.0)
+        sx, sy = x0 + s * dx, y0 + s * dy
+
+        edge = self.seg_edge[seg]
+        geo_len = self.edge_geo_len[edge]
+        along = self.seg_offset[seg] + s * self.seg_len[seg]
+        t = np.divide(along, geo_len, out=np.zeros_like(along), where=geo_len > 0)
+        return Snap(edge, np.clip(t, 0.0, 1.0), sx / self.kx + self.lon0, sy / M_PER_DEG_LAT + self.lat0,
+                    np.hypot(qx - sx, qy - sy))
+
+    def snap_point(self, lon, lat):
+        """Snap a single coordinate"""
+        return self.snap([lon], [lat])[0]
+
+
+def snap_exits(index, snap):
+    """Ways to leave a snapped point: (node, edge, t) reaches node by riding edge from t to its head.
+
+    edge is None when the point is within NODE_TOLERANCE_M of the node itself.
+    """
+    cg = index.cg
+    e, t, twin = snap.edge, snap.t, int(index.twin[snap.edge])
+    exits = []
+    geo_len = index.edge_geo_len[e]
+    if t * geo_len <= NODE_TOLERANCE_M:
+        exits.append((int(cg.edge_u[e]), None, 0.0))
+    if (1.0 - t) * geo_len <= NODE_TOLERANCE_M:
+        exits.append((int(cg.edge_v[e]), None, 0.0))
+    exits.append((int(cg.edge_v[e]), e, t))
+    if twin >= 0:
+        exits.append((int(cg.edge_v[twin]), twin, 1.0 - t))
+    return exits
+
+
+def snap_entries(index, snap):
+    """Ways to arrive at a snapped point: (node, edge, t) rides edge from node (its tail) up to t.
+
+    edge is None when the point is within NODE_TOLERANCE_M of the node itself.
+    """
+    cg = index.cg
+    e, t, twin = snap.edge, snap.t, int(index.twin[snap.edge])
+    entries = []
+    geo_len = index.edge_geo_len[e]
+    if t * geo_len <= NODE_TOLERANCE_M:
+        entries.append((int(cg.edge_u[e]), None, 0.0))
+    if (1.0 - t) * geo_len <= NODE_TOLERANCE_M:
+        entries.append((int(cg.edge_v[e]), None, 0.0))
+    entries.append((int(cg.edge_u[e]), e, t))
+    if twin >= 0:
+        entries.append((int(cg.edge_u[twin]), twin, 1.0 - t))
+    return entries
+
+
+def snapped_route(index, origin, dest, weights=None, search=None):
+    """Cheapest Route between two Snaps, entering and leaving the snapped edges part-way.
+
+    search(sources, targets) defaults to Dijkstra over `weights`; pass a
+    Hierarchy.search built for the same weights to use the CH instead.
+    """
+    cg = index.cg
+    w = cg.edge_length if weights is None else weights
+    if search is None:
+        def search(sources, targets):
+            return cg.search(sources, targets, w)
+    e_o, t_o, twin_o = origin.edge, origin.t, int(index.twin[origin.edge])
+    e_d, t_d = dest.edge, dest.t
+
+    # Leave the origin edge forwards (towards its head) or backwards along its twin;
+    # entry is None when the route starts exactly at a node
+    sources, entry = {}, {}
+    for node, edge, t in snap_exits(index, origin):
+        cost = 0.0 if edge is None else (1.0 - t) * w[edge]
+        if cost < sources.get(node, float('inf')):
+            sources[node] = cost
+            entry[node] = None if edge is None else (edge, t)
+
+    # Arrive at the destination edge from its tail, or from the far end along its twin
+    targets, exit_ = {}, {}
+
+    def add_target(node, cost, edge_t):
+        if cost < targets.get(node, float('inf')):
+            targets[node] = cost
+            exit_[node] = edge_t
+
+    for node, edge, t in snap_entries(index, dest):
+        add_target(node, 0.0 if edge is None else t * w[edge], None if edge is None else (edge, t))
+
+    best_cost, best = float('inf'), None
+    found = search(sources, targets)
+    if found is not None:
+        cost, path, source, target = found
+        edges, start_t, end_t = list(path), 0.0, 1.0
+        if entry[source] is not None:
+            edges.insert(0, entry[source][0])
+            start_t = entry[source][1]
+        if exit_[target] is not None:
+            edges.append(exit_[target][0])
+            end_t = exit_[target][1]
+        best_cost, best = cost, Route(edges, start_t, end_t)
+
+    # Both points on the same street: ride straight along it
+    if e_d == e_o:
+        t_same = t_d
+    elif e_d == twin_o:
+        t_same = 1.0 - t_d
+    else:
+        t_same = None
+    if t_same is not None:
+        if t_same >= t_o and (t_same - t_o) * w[e_o] <= best_cost:
+            best = Route([e_o], t_o, t_same)
+        elif t_same < t_o and twin_o >= 0 and (t_o - t_same) * w[twin_o] <= best_cost:
+            best = Route([twin_o], 1.0 - t_o, 1.0 - t_same)
+    return best
+
+
+def snapped_costs(index, origin, dests, weights=None, values=None):
+    """(cost, value) of the cheapest route from one Snap to each of several, or None if unreachable.
+
+    One Dijkstra over `weights` settles every destination at once; value sums
+    the per-edge `values` (default: weights) along each cheapest route, split
+    edges pro rata. Costs match snapped_route for the same weights.
+    """
+    cg = index.cg
+    w = cg.edge_length if weights is None else weights
+    v = w if values is None else values
+    sources = {}
+    for node, edge, t in snap_exits(index, origin):
+        label = (0.0, 0.0) if edge is None else ((1.0 - t) * w[edge], (1.0 - t) * v[edge])
+        if label[0] < sources.get(node, (float('inf'),))[0]:
+            sources[node] = label
+    entries = [snap_entries(index, dest) for dest in dests]
+    settled = cg.bounded_search(sources, w, v, float('inf'),
+                                targets={node for ways in entries for node, _, _ in ways})
+
+    e_o, t_o, twin_o = origin.edge, origin.t, int(index.twin[origin.edge])
+    results = []
+    for dest, ways in zip(dests, entries):
+        best = None
+        for node, edge, t in ways:
+            if node not in settled:
+                continue
+            cost, value, _ = settled[node]
+            if edge is not None:
+                cost, value = cost + t * w[edge], value + t * v[edge]
+            if best is None or cost < best[0]:
+                best = (cost, value)
+        # Both points on the same street: ride straight along it
+        if dest.edge == e_o:
+            t_same = dest.t
+        elif dest.edge == twin_o:
+            t_same = 1.0 - dest.t
+        else:
+            t_same = None
+        if t_same is not None:
+            if t_same >= t_o:
+                edge, span = e_o, t_same - t_o
+            else:
+                edge, span = twin_o, t_o - t_same
+            if edge >= 0 and (best is None or span * w[edge] <= best[0]):
+                best = (span * w[edge], span * v[edge])
+        results.append(best)
+    return results
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the upstream services the server calls on every request:
+  - NEA real-time WBGT API (get_nearest_wbgt_station, fetch_historical_data)
+  - Nominatim (ox.geocode)
+  - Overpass (ox.features_from_point, ox.graph_from_point)
+
+Each stub replays recorded responses (output/stub_recordings/<service>.json,
+keyed by path and query) and otherwise synthesizes one in the upstream's
+response shape, after a configurable latency, failing a configurable share of
+requests. With --record, requests are proxied to the real service and the
+responses saved for later replays.
+
+Point the server at the stubs with:
+  COOLRIDE_NEA_API_URL=http://127.0.0.1:9101/v2/real-time/api
+  COOLRIDE_NOMINATIM_URL=http://127.0.0.1:9102
+  COOLRIDE_OVERPASS_URL=http://127.0.0.1:9103/api
+
+Usage: python stub_services.py [--latency-ms 150] [--failure-rate nea=0.05] [--record]
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+RECORDINGS_DIR = "output/stub_recordings"
+
+UPSTREAMS = {
+    "nea": "https://api-open.data.gov.sg",
+    "nominatim": "https://nominatim.openstreetmap.org",
+    "overpass": "https://overpass-api.de",
+}
+DEFAULT_PORTS = {"nea": 9101, "nominatim": 9102, "overpass": 9103}
+
+# A subset of the NEA WBGT stations (name, latitude, longitude)
+WBGT_STATIONS = [
+    ("Upper Changi Road North", 1.3678, 103.9826),
+    ("Pasir Ris Street 51", 1.3625, 103.9548),
+    ("Bedok North Street 2", 1.3340, 103.9362),
+    ("Marine Parade Road", 1.3025, 103.9067),
+    ("Bishan Street 22", 1.3560, 103.8490),
+    ("Ang Mo Kio Avenue 5", 1.3764, 103.8492),
+    ("Kent Ridge Road", 1.2934, 103.7792),
+    ("Jurong West Street 93", 1.3377, 103.6968),
+    ("Sentosa Palawan Green", 1.2494, 103.8232),
+    ("Orchard Boulevard", 1.3065, 103.8297),
+]
+
+
+def wbgt_at(minute_of_day, station_index):
+    """Plausible diurnal WBGT curve: ~26°C at night, ~31°C mid-afternoon"""
+    peak = math.cos((minute_of_day - 14 * 60) / (24 * 60) * 2 * math.pi)
+    return round(28.5 + 2.5 * peak + 0.2 * (station_index % 3), 1)
+
+
+def wbgt_record(dt):
+    minute = dt.hour * 60 + dt.minute
+    return {
+        "datetime": dt.isoformat(timespec="seconds"),
+        "item": {
+            "type": "observation",
+            "isStationData": True,
+            "readings": [{
+                "station": {"id": f"S{100 + i}", "name": name, "townCenter": name.split()[0]},
+                "location": {"latitude": f"{lat:.4f}", "longtitude": f"{lon:.4f}"},
+                "wbgt": f"{wbgt_at(minute, i):.1f}",
+                "heatStress": "Moderate" if wbgt_at(minute, i) >= 31 else "Low",
+            } for i, (name, lat, lon) in enumerate(WBGT_STATIONS)],
+        },
+        "updatedTimestamp": dt.isoformat(timespec="seconds"),
+    }
+
+
+def synth_nea(path, query, body):
+    """NEA v2 weather API: latest reading, or every 15 minutes of ?date=YYYY-MM-DD"""
+    now = datetime.now().astimezone()
+    date = query.get("date")
+    if date:
+        day = datetime.strptime(date[:10], "%Y-%m-%d").replace(tzinfo=now.tzinfo)
+        records = [wbgt_record(day + timedelta(minutes=m)) for m in range(0, 24 * 60, 15)
+                   if day + timedelta(minutes=m) <= now]
+    else:
+        records = [wbgt_record(now.replace(minute=now.minute - now.minute % 15, second=0, microsecond=0))]
+    return 200, "application/json", {"code": 0, "errorMsg": "", "data": {"records": records}}
+
+
+def synth_nominatim(path, query, body):
+    """Nominatim /search: names mentioning a cached area land near its center"""
+    from networks import CACHED_NETWORKS
+    text = query.get("q", "")
+    digest = int(hashlib.md5(text.encode()).hexdigest(), 16)
+    names = list(CACHED_NETWORKS)
+    area = next((n for n in names if n.replace("_", " ") in text.lower()), names[digest % len(names)])
+    lat, lon, radius = CACHED_NETWORKS[area]
+    # Deterministic offset within half the area radius
+    angle = (digest % 3600) / 3600 * 2 * math.pi
+    dist = ((digest >> 12) % 1000) / 1000 * radius * 0.5 / 111000
+    lat, lon = lat + dist * math.sin(angle), lon + dist * math.cos(angle)
+    return 200, "application/json", [{
+        "place_id": digest % 10**8, "osm_type": "node", "osm_id": digest % 10**10,
+        "lat": f"{lat:.7f}", "lon": f"{lon:.7f}", "display_name": f"{text}, Singapore",
+        "class": "place", "type": "locality", "importance": 0.5,
+        "boundingbox": [f"{lat - 0.001:.7f}", f"{lat + 0.001:.7f}", f"{lon - 0.001:.7f}", f"{lon + 0.001:.7f}"],
+    }]
+
+
+OVERPASS_STATUS = """Connected as: 1
+Current time: {now}
+Announced endpoint: none
+Rate limit: 0
+4 slots available now.
+Currently running queries (pid, space limit, time limit, start time):
+"""
+
+
+def _overpass_bbox(query):
+    """(south, west, north, east) of the poly:"lat lon ..." filters in an Overpass query"""
+    values = [float(v) for poly in re.findall(r'poly:\s*["\']([-\d. ]+)["\']', query) for v in poly.split()]
+    if not values:
+        return None
+    lats, lons = values[0::2], values[1::2]
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+def synth_overpass(path, query, body):
+    """Overpass: /status for osmnx's slot check; /interpreter synthesizes a street grid or buildings"""
+    if path.endswith("/status"):
+        return 200, "text/plain", OVERPASS_STATUS.format(now=datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"))
+    data = parse_qs(body.decode()).get("data", [""])[0] if body else query.get("data", "")
+    bbox = _overpass_bbox(data)
+    elements = []
+    if bbox is not None:
+        south, west, north, east = bbox
+        step = 100 / 111000
+        node_id = [1]
+
+        def node(lat, lon):
+            elements.append({"type": "node", "id": node_id[0], "lat": round(lat, 7), "lon": round(lon, 7)})
+            node_id[0] += 1
+            return node_id[0] - 1
+
+        rows = max(int((north - south) / step), 1)
+        cols = max(int((east - west) / step), 1)
+        if '"highway"' in data:
+            # Street grid: one way per row and per column through shared corner nodes
+            grid = [[node(south + r * step, west + c * step) for c in range(cols + 1)] for r in range(rows + 1)]
+            ways = [row for row in grid] + [[grid[r][c] for r in range(rows + 1)] for c in range(cols + 1)]
+            for i, refs in enumerate(ways):
+                elements.append({"type": "way", "id": 10**6 + i, "nodes": refs,
+                                 "tags": {"highway": "residential", "name": f"Stub Street {i}"}})
+        elif "building" in data:
+            # One 20 m square block per grid cell (capped)
+            side = 20 / 111000
+            for i in range(min(rows * cols, 400)):
+                lat, lon = south + (i // cols + 0.4) * step, west + (i % cols + 0.4) * step
+                refs = [node(lat, lon), node(lat, lon + side), node(lat + side, lon + side), node(lat + side, lon)]
+                elements.append({"type": "way", "id": 2 * 10**6 + i, "nodes": refs + refs[:1],
+                                 "tags": {"building": "yes"}})
+        elif "amenity" in data:
+            for i in range(min(rows * cols, 20)):
+                nid = node(south + (i // cols + 0.5) * step, west + (i % cols + 0.5) * step)
+                elements[-1]["tags"] = {"amenity": "food_court", "name": f"Stub Food Court {nid}"}
+    return 200, "application/json", {"version": 0.6, "generator": "coolride stub", "elements": elements}
+
+
+SYNTHESIZERS = {"nea": synth_nea, "nominatim": synth_nominatim, "overpass": synth_overpass}
+
+
+def request_key(method, path, query, body):
+    """Recording key: method, path, sorted query and a hash of the body"""
+    key = f"{method} {path}?{urlencode(sorted(query.items()))}"
+    if body:
+        key += " #" + hashlib.sha1(body).hexdigest()[:16]
+    return key
+
+
+class StubService:
+    """One stand-in HTTP service with latency, failure injection and record/replay"""
+
+    def __init__(self, name, port, latency_ms=0.0, jitter_ms=0.0, failure_rate=0.0, record=False, seed=None):
+        self.name = name
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.record = record
+        self.random = random.Random(seed)
+        self.recordings_path = os.path.join(RECORDINGS_DIR, f"{name}.json")
+        self.recordings = {}
+        if os.path.exists(self.recordings_path):
+            with open(self.recordings_path) as f:
+                self.recordings = json.load(f)
+        self.counts = {"requests": 0, "failures": 0, "replayed": 0, "synthesized": 0, "recorded": 0}
+        self._lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def respond(self, method, raw_path, body):
+        """(status, content type, payload bytes) for one request"""
+        parts = urlsplit(raw_path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        key = request_key(method, parts.path, query, body)
+        with self._lock:
+            self.counts["requests"] += 1
+            delay = max(self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms), 0.0)
+            fail = self.random.random() < self.failure_rate
+        time.sleep(delay / 1000)
+        if fail:
+            with self._lock:
+                self.counts["failures"] += 1
+            return 503, "application/json", b'{"error": "stub injected failure"}'
+
+        if self.record:
+            status, ctype, payload = self._proxy(method, raw_path, body)
+            with self._lock:
+                self.recordings[key] = {"status": status, "content_type": ctype, "body": payload.decode("utf-8", "replace")}
+                self.counts["recorded"] += 1
+            return status, ctype, payload
+        if key in self.recordings:
+            entry = self.recordings[key]
+            with self._lock:
+                self.counts["replayed"] += 1
+            return entry["status"], entry["content_type"], entry["body"].encode()
+
+        status, ctype, payload = SYNTHESIZERS[self.name](parts.path, query, body)
+        with self._lock:
+            self.counts["synthesized"] += 1
+        payload = payload if isinstance(payload, str) else json.dumps(payload)
+        return status, ctype, payload.encode()
+
+    def _proxy(self, method, raw_path, body):
+        import requests
+        resp = requests.request(method, UPSTREAMS[self.name] + raw_path, data=body or None, timeout=60,
+                                headers={"User-Agent": "coolride-stub-recorder",
+                                         "Content-Type": "application/x-www-form-urlencoded"} if body else
+                                        {"User-Agent": "coolride-stub-recorder"})
+        return resp.status_code, resp.headers.get("Content-Type", "application/json").split(";")[0], resp.content
+
+    def save_recordings(self):
+        os.makedirs(RECORDINGS_DIR, exist_ok=True)
+        with open(self.recordings_path, "w") as f:
+            json.dump(self.recordings, f, indent=1)
+
+    def start(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, ctype, payload = service.respond(method, self.path, body)
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name=f"stub-{self.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.record:
+            self.save_recordings()
+
+
+def per_service(value, cast=float):
+    """'150' applies to every service; 'nea=100,overpass=800' sets them one by one"""
+    if value is None:
+        return {}
+    if "=" not in value:
+        return {name: cast(value) for name in SYNTHESIZERS}
+    return {k.strip(): cast(v) for k, v in (item.split("=", 1) for item in value.split(","))}
+
+
+def start_stubs(latency_ms=None, jitter_ms=None, failure_rate=None, record=False, ports=None, seed=None):
+    """Start all three stubs; returns {name: StubService}"""
+    latency, jitter, failures = per_service(latency_ms), per_service(jitter_ms), per_service(failure_rate)
+    ports = dict(DEFAULT_PORTS, **(ports or {}))
+    return {name: StubService(name, ports[name], latency.get(name, 0.0), jitter.get(name, 0.0),
+                              failures.get(name, 0.0), record=record, seed=seed).start()
+            for name in SYNTHESIZERS}
+
+
+def stub_environment(stubs):
+    """Environment variables that point the server at running stubs"""
+    return {
+        "COOLRIDE_NEA_API_URL": stubs["nea"].url + "/v2/real-time/api",
+        "COOLRIDE_NOMINATIM_URL": stubs["nominatim"].url,
+        "COOLRIDE_OVERPASS_URL": stubs["overpass"].url + "/api",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", help="added latency, e.g. 150 or nea=100,overpass=800")
+    parser.add_argument("--jitter-ms", help="uniform +/- jitter, same format")
+    parser.add_argument("--failure-rate", help="share of requests answered 503, e.g. 0.05 or nea=0.1")
+    parser.add_argument("--record", action="store_true", help="proxy to the real services and save responses")
+    args = parser.parse_args()
+
+    stubs = start_stubs(args.latency_ms, args.jitter_ms, args.failure_rate, record=args.record)
+    print("🧪 Stub services running (Ctrl+C to stop):")
+    for key, value in stub_environment(stubs).items():
+        print(f"   export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for stub in stubs.values():
+            stub.stop()
+            print(f"   {stub.name}: {stub.counts}")
+
+
+if __name__ == "__main__":
+    main()
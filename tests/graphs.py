@@ -0,0 +1,53 @@
+"""Small synthetic CompactGraphs for the tests"""
+
+import numpy as np
+from compact_graph import CompactGraph
+from snapping import M_PER_DEG_LON_EQUATOR, M_PER_DEG_LAT
+
+LAT = 1.35
+M_PER_DEG_LON = M_PER_DEG_LON_EQUATOR * np.cos(np.radians(LAT))
+
+
+def compact_graph(x_m, y_m, pairs, lengths):
+    """CompactGraph with nodes at (x_m, y_m) metres from (103.9E, LAT) and straight edges (u, v)"""
+    x = 103.9 + np.asarray(x_m, dtype=np.float64) / M_PER_DEG_LON
+    y = LAT + np.asarray(y_m, dtype=np.float64) / M_PER_DEG_LAT
+    order = sorted(range(len(pairs)), key=lambda i: pairs[i])
+    edge_u = np.array([pairs[i][0] for i in order], dtype=np.int32)
+    edge_v = np.array([pairs[i][1] for i in order], dtype=np.int32)
+    edge_length = np.asarray(lengths, dtype=np.float64)[order]
+    geom_xy = np.array([[(x[u], y[u]), (x[v], y[v])] for u, v in zip(edge_u, edge_v)]).reshape(-1, 2)
+    indptr = np.zeros(len(x) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(edge_u, minlength=len(x)), out=indptr[1:])
+    return CompactGraph(np.arange(len(x), dtype=np.int64), x, y, indptr, edge_u, edge_v,
+                        np.zeros(len(pairs), dtype=np.int32), edge_length,
+                        np.arange(0, 2 * len(pairs) + 1, 2, dtype=np.int64), geom_xy)
+
+
+def street(offsets_m):
+    """Two-way straight street through nodes at these metres east of 103.9E"""
+    n = len(offsets_m)
+    pairs = [(i, i + 1) for i in range(n - 1)] + [(i + 1, i) for i in range(n - 1)]
+    lengths = [abs(offsets_m[v] - offsets_m[u]) for u, v in pairs]
+    return compact_graph(offsets_m, np.zeros(n), pairs, lengths)
+
+
+def grid(rows, cols, seed=0, spacing_m=100.0, one_way=0.15):
+    """Jittered street grid: mostly two-way, some one-way streets, lengths a little over straight-line"""
+    rng = np.random.default_rng(seed)
+    c, r = np.meshgrid(np.arange(cols), np.arange(rows))
+    x_m = c.ravel() * spacing_m + rng.uniform(-20, 20, rows * cols)
+    y_m = r.ravel() * spacing_m + rng.uniform(-20, 20, rows * cols)
+    pairs, lengths = [], []
+    for a in range(rows * cols):
+        for b in (a + 1 if (a + 1) % cols else None, a + cols if a + cols < rows * cols else None):
+            if b is None:
+                continue
+            length = float(np.hypot(x_m[b] - x_m[a], y_m[b] - y_m[a])) * rng.uniform(1.0, 1.3)
+            ends = [(a, b), (b, a)]
+            if rng.uniform() < one_way:
+                ends = [ends[rng.integers(2)]]
+            for u, v in ends:
+                pairs.append((u, v))
+                lengths.append(length)
+    return compact_graph(x_m, y_m, pairs, lengths)
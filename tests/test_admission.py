@@ -0,0 +1,75 @@
+import math
+import time
+import threading
+import pytest
+from admission import (REQUEST_DEADLINE_S, MIN_DEADLINE_S, Deadline, Lane, Overloaded, InvalidDeadline,
+                       request_budget)
+
+
+def hold(lane, deadline, entered, release, outcome):
+    """Thread body: take a slot in lane and keep it until release is set"""
+    try:
+        with lane.admit(deadline):
+            entered.set()
+            release.wait(5)
+        outcome.append("done")
+    except Overloaded:
+        outcome.append("rejected")
+
+
+def test_lane_admits_up_to_capacity_then_queues_then_rejects():
+    lane = Lane("test", capacity=1, queue=1)
+    release = threading.Event()
+    first, second = threading.Event(), threading.Event()
+    outcomes = []
+    holder = threading.Thread(target=hold, args=(lane, Deadline(10), first, release, outcomes))
+    holder.start()
+    assert first.wait(5)
+
+    queued = threading.Thread(target=hold, args=(lane, Deadline(10), second, release, outcomes))
+    queued.start()
+    while lane.waiting == 0:
+        time.sleep(0.01)
+    assert not second.is_set()
+
+    with pytest.raises(Overloaded):
+        with lane.admit(Deadline(10)):
+            pass
+
+    release.set()
+    holder.join(5)
+    queued.join(5)
+    assert second.is_set() and outcomes == ["done", "done"]
+    assert lane.stats() == {"capacity": 1, "queue": 1, "active": 0, "waiting": 0, "admitted": 2, "rejected": 1}
+
+
+def test_lane_rejects_a_queued_request_at_its_deadline():
+    lane = Lane("test", capacity=1, queue=1)
+    release, entered = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold, args=(lane, Deadline(10), entered, release, []))
+    holder.start()
+    assert entered.wait(5)
+    try:
+        with pytest.raises(Overloaded):
+            with lane.admit(Deadline(0.05)):
+                pass
+        assert lane.waiting == 0
+    finally:
+        release.set()
+        holder.join(5)
+    assert lane.active == 0
+
+
+def test_request_budget_clamps_to_the_allowed_range():
+    assert request_budget({}) == REQUEST_DEADLINE_S
+    assert request_budget({"deadline_s": "5"}) == 5.0
+    assert request_budget({"deadline_s": 10 * REQUEST_DEADLINE_S}) == REQUEST_DEADLINE_S
+    assert request_budget({"deadline_s": 0}) == MIN_DEADLINE_S
+    assert request_budget({"deadline_s": -1}) == MIN_DEADLINE_S
+
+
+@pytest.mark.parametrize("value", ["nan", math.inf, "-inf", "soon", [5]])
+def test_request_budget_rejects_non_finite(value):
+    with pytest.raises(InvalidDeadline) as error:
+        request_budget({"deadline_s": value})
+    assert error.value.status == 400
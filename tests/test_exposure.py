@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from graphs import street
+from compact_graph import Route
+from exposure import SHADE_WBGT_DROP_C, exposure_matrix, route_exposure
+
+
+def test_route_exposure_totals_partial_edges():
+    cg = street([0, 100, 300])
+    first = next(e for e in range(cg.num_edges) if (cg.edge_u[e], cg.edge_v[e]) == (0, 1))
+    second = next(e for e in range(cg.num_edges) if (cg.edge_u[e], cg.edge_v[e]) == (1, 2))
+    tree, shadow, both = (np.zeros(cg.num_edges) for _ in range(3))
+    tree[first], shadow[first], both[first] = 0.4, 0.3, 0.2    # 0.5 shaded
+    shadow[second] = 0.2
+    pcn, water = np.zeros(cg.num_edges, dtype=bool), np.zeros(cg.num_edges, dtype=bool)
+    pcn[first], water[second] = True, True
+
+    exposure = exposure_matrix(tree, shadow, both, pcn, water)
+    route = Route([first, second], start_t=0.4, end_t=0.75)  # 60 m + 150 m
+    speed_ms = 4.0
+    metrics = route_exposure(cg, route, exposure, wbgt=30.0, speed_ms=speed_ms)
+
+    assert metrics["distance_m"] == 210
+    assert metrics["shaded_m"] == 60          # 0.5 * 60 + 0.2 * 150
+    assert metrics["sun_m"] == 150
+    assert metrics["pcn_m"] == 60
+    assert metrics["water_m"] == 150
+    assert metrics["shaded_pct"] == pytest.approx(100 * 60 / 210, abs=0.06)
+    assert metrics["duration_min"] == pytest.approx(210 / speed_ms / 60, abs=0.06)
+    assert metrics["heat_dose"] == pytest.approx((210 * 30 - 60 * SHADE_WBGT_DROP_C) / speed_ms / 60, abs=0.06)
+
+
+def test_empty_route_has_no_exposure():
+    cg = street([0, 100])
+    exposure = exposure_matrix(*(np.zeros(cg.num_edges) for _ in range(5)))
+    metrics = route_exposure(cg, Route([]), exposure, wbgt=30.0, speed_ms=4.0)
+    assert metrics["distance_m"] == 0 and metrics["shaded_pct"] == 0.0 and metrics["heat_dose"] == 0.0
@@ -0,0 +1,42 @@
+from graphs import LAT, M_PER_DEG_LON, street
+from lazy_cost import LazyCost, corridor_edges
+from snapping import SnapIndex, snapped_route
+
+
+def test_corridor_keeps_long_snapped_edge():
+    # Start 95% of the way along a 300 m edge whose tail lies far outside the ellipse
+    cg = street([0, 300, 330, 360, 600])
+    index = SnapIndex(cg)
+    start = (103.9 + 285 / M_PER_DEG_LON, LAT)
+    end = (103.9 + 590 / M_PER_DEG_LON, LAT)
+    origin = index.snap_point(*start)
+    destination = index.snap_point(*end)
+    assert cg.edge_length[origin.edge] == 300
+
+    max_length = 1.2 * 305 + 50
+    plain = corridor_edges(cg, start, end, max_length)
+    assert not plain[origin.edge]
+
+    keep = [e for snap in (origin, destination) for e in (snap.edge, int(index.twin[snap.edge])) if e >= 0]
+    corridor = corridor_edges(cg, start, end, max_length, keep=keep)
+    assert corridor[keep].all()
+    route = snapped_route(index, origin, destination, LazyCost(cg, lambda edges: cg.edge_length[edges], corridor))
+    assert route is not None
+    assert abs(route.length(cg) - 305) < 1
+
+
+def test_ensure_costs_only_the_cells_asked_for():
+    cg = street([0, 100, 1000])
+    batches = []
+
+    def cost(edges):
+        batches.append(edges.tolist())
+        return cg.edge_length[edges]
+
+    lazy = LazyCost(cg, cost, cell_m=250)
+    far = [e for e in range(cg.num_edges) if cg.edge_u[e] == 2]  # alone in its cell
+    lazy.ensure(far)
+    lazy.ensure(far)
+    assert batches == [far]
+    assert lazy.stats()["costed_edges"] == len(far) < cg.num_edges
+    assert [lazy[e] for e in far] == cg.edge_length[far].tolist() and len(batches) == 1
@@ -0,0 +1,41 @@
+import threading
+import pytest
+import networks
+from networks import BuildingsUnavailable, fetch_buildings_around
+
+
+@pytest.fixture
+def slow_fetch(monkeypatch):
+    """fetch_buildings that blocks until released, recording its calls"""
+    calls, release = [], threading.Event()
+
+    def fetch(lat, lon, dist):
+        calls.append((lat, lon, dist))
+        release.wait(5)
+        return "buildings"
+
+    monkeypatch.setattr(networks, "fetch_buildings", fetch)
+    monkeypatch.setattr(networks, "MAX_BUILDING_FETCHES", 2)
+    yield calls, release
+    release.set()
+
+
+def test_nearby_fetches_share_one_in_flight(slow_fetch):
+    calls, release = slow_fetch
+    with pytest.raises(BuildingsUnavailable):
+        fetch_buildings_around(1.30001, 103.90001, 2000, timeout=0.05)
+    with pytest.raises(BuildingsUnavailable):
+        fetch_buildings_around(1.30002, 103.90002, 2000, timeout=0.05)
+    assert len(calls) == 1
+    release.set()
+    assert fetch_buildings_around(1.30002, 103.90002, 2000, timeout=5) == "buildings"
+
+
+def test_concurrent_fetches_are_capped(slow_fetch):
+    calls, release = slow_fetch
+    for lat in (1.30, 1.31):
+        with pytest.raises(BuildingsUnavailable):
+            fetch_buildings_around(lat, 103.9, 2000, timeout=0.05)
+    with pytest.raises(BuildingsUnavailable, match="already running"):
+        fetch_buildings_around(1.32, 103.9, 2000, timeout=5)
+    assert len(calls) == 2
@@ -0,0 +1,21 @@
+import profiling
+import simple_server
+from profiling import Profiled
+
+
+def test_admin_profile_survives_eviction(monkeypatch):
+    monkeypatch.setattr(simple_server, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "secret")
+    with Profiled("test", "header") as profiled:
+        sum(range(1000))
+    record = profiling.get_profile(profiled.id)
+    # Evicted by newer profiles after the handler fetched the record
+    profiling._profiles.clear()
+    monkeypatch.setattr(simple_server, "get_profile", lambda profile_id: record)
+
+    response = simple_server.app.test_client().get(f"/admin/profiles/{profiled.id}",
+                                                  headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["id"] == profiled.id and body["label"] == "test"
+    assert "pstats" not in body and isinstance(body["top"], list)
@@ -0,0 +1,59 @@
+import random
+import numpy as np
+import pytest
+from ch import build_hierarchy
+from cch import build_topology
+from snapping import SnapIndex, snapped_route
+from graphs import grid
+
+PAIRS = 150
+
+
+def path_cost(cg, path, weights):
+    assert all(cg.edge_v[a] == cg.edge_u[b] for a, b in zip(path[:-1], path[1:]))
+    return float(weights[path].sum())
+
+
+@pytest.fixture(scope="module")
+def city():
+    return grid(9, 9, seed=3)
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_ch_matches_dijkstra(city, seed):
+    cg, rng = city, random.Random(seed)
+    hierarchy = build_hierarchy(cg)
+    for _ in range(PAIRS):
+        a, b = rng.randrange(cg.num_nodes), rng.randrange(cg.num_nodes)
+        ref, path = cg.shortest_path(a, b), hierarchy.shortest_path(a, b)
+        assert (ref is None) == (path is None)
+        if path is not None:
+            assert not path or (cg.edge_u[path[0]] == a and cg.edge_v[path[-1]] == b)
+            assert path_cost(cg, path, cg.edge_length) == pytest.approx(path_cost(cg, ref, cg.edge_length))
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_cch_matches_dijkstra_under_a_random_metric(city, seed):
+    cg, rng = city, random.Random(seed)
+    cool_cost = cg.edge_length * np.random.default_rng(seed).uniform(0.35, 1.0, cg.num_edges)
+    customized = build_topology(cg).customize(cool_cost)
+    for _ in range(PAIRS):
+        a, b = rng.randrange(cg.num_nodes), rng.randrange(cg.num_nodes)
+        ref, path = cg.shortest_path(a, b, cool_cost), customized.shortest_path(a, b)
+        assert (ref is None) == (path is None)
+        if path is not None:
+            assert path_cost(cg, path, cool_cost) == pytest.approx(path_cost(cg, ref, cool_cost))
+
+
+def test_snapped_routes_match_between_ch_and_dijkstra(city):
+    cg, rng = city, np.random.default_rng(4)
+    index, hierarchy = SnapIndex(cg), build_hierarchy(cg)
+    minx, miny, maxx, maxy = cg.bounds()
+    snaps = index.snap(rng.uniform(minx, maxx, 2 * PAIRS), rng.uniform(miny, maxy, 2 * PAIRS))
+    for i in range(PAIRS):
+        origin, destination = snaps[2 * i], snaps[2 * i + 1]
+        r_dij = snapped_route(index, origin, destination)
+        r_ch = snapped_route(index, origin, destination, search=hierarchy.search)
+        assert (r_dij is None) == (r_ch is None)
+        if r_dij is not None:
+            assert r_ch.length(cg) == pytest.approx(r_dij.length(cg))
@@ -0,0 +1,26 @@
+import numpy as np
+import shapely
+from shade_raster import ShadeGrid
+
+
+def test_burn_convex_skips_polygons_off_the_grid():
+    grid = ShadeGrid(0, 0, 100, 100)
+    layer = grid.burn_convex(grid.new_layer(), [shapely.box(500, 500, 510, 510)])
+    assert not layer.any()
+
+
+def test_burn_convex_skips_degenerate_polygons():
+    grid = ShadeGrid(0, 0, 100, 100)
+    sliver = shapely.box(10, 10.2, 50, 10.8)  # between two row centres (9 and 11)
+    flat = shapely.Polygon([(10, 10), (50, 10), (30, 10)])
+    layer = grid.burn_convex(grid.new_layer(), [sliver, flat])
+    assert not layer.any()
+
+
+def test_burn_convex_matches_burn_polygons():
+    grid = ShadeGrid(0, 0, 100, 100)
+    polygons = [shapely.box(500, 500, 510, 510), shapely.box(-20, -20, 15.5, 8.5),
+                shapely.Polygon([(40.3, 40.6), (90.1, 55.2), (60.7, 95.4)])]
+    convex = grid.burn_convex(grid.new_layer(), polygons)
+    assert convex.sum() > 0
+    assert np.array_equal(convex, grid.burn_polygons(grid.new_layer(), polygons))
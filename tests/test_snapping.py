@@ -0,0 +1,46 @@
+import pytest
+from graphs import LAT, M_PER_DEG_LON, street
+from snapping import SnapIndex, snapped_route, M_PER_DEG_LAT
+
+
+def at(x_m, y_m=0.0):
+    """(lon, lat) x_m east of 103.9E and y_m north of the street"""
+    return 103.9 + x_m / M_PER_DEG_LON, LAT + y_m / M_PER_DEG_LAT
+
+
+@pytest.fixture
+def road():
+    cg = street([0, 100, 300])
+    return cg, SnapIndex(cg)
+
+
+def test_snap_splits_the_nearest_edge(road):
+    cg, index = road
+    snap = index.snap_point(*at(40, 12))
+    assert snap.distance_m == pytest.approx(12, abs=0.1)
+    assert {int(cg.edge_u[snap.edge]), int(cg.edge_v[snap.edge])} == {0, 1}
+    # t runs from the edge's tail; the twin is the same street the other way
+    along = snap.t if cg.edge_u[snap.edge] == 0 else 1.0 - snap.t
+    assert along == pytest.approx(0.4, abs=1e-3)
+    twin = int(index.twin[snap.edge])
+    assert (cg.edge_u[twin], cg.edge_v[twin]) == (cg.edge_v[snap.edge], cg.edge_u[snap.edge])
+
+
+def test_route_between_split_edges_rides_only_the_parts(road):
+    cg, index = road
+    route = snapped_route(index, index.snap_point(*at(40)), index.snap_point(*at(250)))
+    assert route.length(cg) == pytest.approx(210, abs=0.5)
+    assert [(int(cg.edge_u[e]), int(cg.edge_v[e])) for e in route.edges] == [(0, 1), (1, 2)]
+    assert route.start_t == pytest.approx(0.4, abs=1e-3)
+    assert route.end_t == pytest.approx(0.75, abs=1e-3)
+    assert route.portions().tolist() == pytest.approx([0.6, 0.75], abs=1e-3)
+
+
+@pytest.mark.parametrize("start, end", [(20, 80), (80, 20)])
+def test_route_within_one_edge_either_way(road, start, end):
+    cg, index = road
+    route = snapped_route(index, index.snap_point(*at(start)), index.snap_point(*at(end)))
+    assert len(route) == 1
+    assert route.length(cg) == pytest.approx(60, abs=0.5)
+    u, v = int(cg.edge_u[route.edges[0]]), int(cg.edge_v[route.edges[0]])
+    assert (u, v) == ((0, 1) if end > start else (1, 0))
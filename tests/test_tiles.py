@@ -0,0 +1,47 @@
+import math
+import numpy as np
+import pytest
+from graphs import street
+from tiles import EXTENT, encode_layer, edge_features, to_tile_pixels
+
+mvt = pytest.importorskip("mapbox_vector_tile")  # reference decoder, only needed by these tests
+
+
+def decode(payload):
+    return mvt.decode(payload, default_options={"y_coord_down": True})
+
+
+def test_encode_layer_round_trip():
+    line = np.array([[10, 20], [300, 20], [300, -40]])
+    parts = [np.array([[0, 0], [5, 5]]), np.array([[4000, 4100], [3900, 4000], [3800, 4050]])]
+    features = [(7, [line], {"factor": 0.75, "pcn": True, "area": "bedok", "rank": -3}),
+                (123456789, parts, {"factor": 0.75, "pcn": False, "area": "bishan", "rank": 12})]
+
+    layer = decode(encode_layer("cool_edges", features))["cool_edges"]
+
+    assert layer["extent"] == EXTENT
+    first, second = layer["features"]
+    assert first["id"] == 7 and second["id"] == 123456789
+    assert first["properties"] == {"factor": pytest.approx(0.75), "pcn": True, "area": "bedok", "rank": -3}
+    assert second["properties"]["pcn"] is False and second["properties"]["rank"] == 12
+    assert first["geometry"] == {"type": "LineString", "coordinates": line.tolist()}
+    assert second["geometry"] == {"type": "MultiLineString", "coordinates": [p.tolist() for p in parts]}
+
+
+def test_edge_features_round_trip():
+    cg = street([0, 100, 300])
+    z = 16
+    n = 2 ** z
+    x = int((103.9 + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(cg.y[0]))) / math.pi) / 2 * n)
+
+    features = edge_features(cg, "street", z, x, y, lambda edges: [{"edge": int(e)} for e in edges])
+    decoded = decode(encode_layer("cool_edges", features))["cool_edges"]["features"]
+
+    assert sorted(f["id"] for f in decoded) == list(range(cg.num_edges))
+    for feature in decoded:
+        e = feature["id"]
+        assert feature["properties"] == {"edge": e}
+        px, py = to_tile_pixels(cg.edge_coords(e)[:, 0], cg.edge_coords(e)[:, 1], z, x, y)
+        expected = np.clip(np.round(np.column_stack([px, py])), -64, EXTENT + 64)
+        assert np.allclose(feature["geometry"]["coordinates"], expected, atol=1)
@@ -0,0 +1,19 @@
+import numpy as np
+from weight_profiles import PROFILES, WeightProfile, feature_matrix, shade_multiplier
+
+
+def test_detour_covers_early_morning_building_shadow():
+    # A building-shadow weight at MIN_WEIGHT: under the 07:00 sun it is scaled below every other weight
+    profile = WeightProfile("custom", dict(PROFILES["delivery"], building=0.1))
+    multiplier = shade_multiplier(7)
+    assert multiplier < 1.0
+    rng = np.random.default_rng(0)
+    tree = rng.uniform(0, 0.5, 200)
+    shadow = rng.uniform(0, 0.5, 200)
+    both = np.minimum(tree, shadow) * rng.uniform(0, 1, 200)
+    shadow[:10], tree[:10], both[:10] = 1.0, 0.0, 0.0  # fully in a building's shadow
+    features = feature_matrix(tree, shadow, both, rng.uniform(size=200) < 0.3, rng.uniform(size=200) < 0.1,
+                              multiplier)
+    factors = features @ profile.vector
+    assert factors.min() >= profile.vector.max() / profile.detour(multiplier) - 1e-12
+    assert profile.detour(multiplier) > profile.detour()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Mapbox Vector Tiles of the area networks, for the per-edge thermal overlay.
+
+Tiles are cut from the CompactGraph edge coordinates: edges whose bounding
+box meets the tile are projected to tile pixels, clipped with a small buffer
+and encoded as MVT v2 line features (a minimal protobuf writer; the format
+only needs varints, zigzag integers and length-delimited fields). Encoded
+tiles live in an LRU keyed by tile and sun slot, with an ETag per tile.
+"""
+
+import os
+import math
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import shapely
+
+EXTENT = 4096
+BUFFER = 64
+MIN_ZOOM = 12
+TILE_CACHE_SIZE = int(os.environ.get("COOLRIDE_TILE_CACHE_SIZE", "4096"))
+
+
+# ----------------------------------------------------------------------
+# Tile math (Web Mercator, XYZ scheme)
+# ----------------------------------------------------------------------
+def tile_bounds(z, x, y):
+    """(west, south, east, north) lon/lat of a tile"""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def to_tile_pixels(lons, lats, z, x, y, extent=EXTENT):
+    """Lon/lat arrays to pixel coordinates inside tile (z, x, y)"""
+    n = 2 ** z
+    px = ((np.asarray(lons) + 180) / 360 * n - x) * extent
+    lat = np.radians(np.asarray(lats))
+    py = ((1 - np.arcsinh(np.tan(lat)) / math.pi) / 2 * n - y) * extent
+    return px, py
+
+
+# ----------------------------------------------------------------------
+# Protobuf / MVT encoding
+# ----------------------------------------------------------------------
+def _varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(number, values):
+    return _bytes_field(number, b"".join(_varint(v) for v in values))
+
+
+def _value(value):
+    """MVT Value message (bool, int, float or string)"""
+    if isinstance(value, bool):
+        return _field(7, 0) + _varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        return _field(6, 0) + _varint(_zigzag(int(value)))
+    if isinstance(value, (float, np.floating)):
+        return _field(2, 5) + struct.pack("<f", float(value))
+    return _bytes_field(1, str(value).encode())
+
+
+def _line_geometry(parts):
+    """Command stream for one (multi)linestring given as integer (k, 2) arrays"""
+    commands = []
+    cx = cy = 0
+    for part in parts:
+        commands.append((1 << 3) | 1)  # MoveTo, 1 point
+        dx, dy = int(part[0, 0]) - cx, int(part[0, 1]) - cy
+        commands += [_zigzag(dx), _zigzag(dy)]
+        deltas = np.diff(part, axis=0).astype(np.int64)
+        commands.append(((len(deltas)) << 3) | 2)  # LineTo, k-1 points
+        for ddx, ddy in deltas.tolist():
+            commands += [_zigzag(ddx), _zigzag(ddy)]
+        cx, cy = int(part[-1, 0]), int(part[-1, 1])
+    return commands
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """One MVT layer; features are (id, [int (k, 2) parts], {key: value})"""
+    keys, values = {}, {}
+    encoded = []
+    for fid, parts, properties in features:
+        tags = []
+        for key, value in properties.items():
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        feature = (_field(1, 0) + _varint(int(fid)) + _packed(2, tags) +
+                   _field(3, 0) + _varint(2) + _packed(4, _line_geometry(parts)))
+        encoded.append(_bytes_field(2, feature))
+    layer = _field(15, 0) + _varint(2) + _bytes_field(1, name.encode()) + b"".join(encoded)
+    layer += b"".join(_bytes_field(3, key.encode()) for key in keys)
+    layer += b"".join(_bytes_field(4, _value(value)) for _, value in values)
+    layer += _field(5, 0) + _varint(extent)
+    return _bytes_field(3, layer)
+
+
+# ----------------------------------------------------------------------
+# Edge tiles
+# ----------------------------------------------------------------------
+_edge_bounds = {}
+_bounds_lock = threading.Lock()
+
+
+def edge_bounds(cg, key):
+    """(E, 4) minx, miny, maxx, maxy of every edge, computed once per network"""
+    bounds = _edge_bounds.get(key)
+    if bounds is None:
+        with _bounds_lock:
+            bounds = _edge_bounds.get(key)
+            if bounds is None:
+                xy = np.asarray(cg.geom_xy)
+                starts = np.asarray(cg.geom_ptr[:-1])
+                bounds = np.column_stack([np.minimum.reduceat(xy[:, 0], starts),
+                                          np.minimum.reduceat(xy[:, 1], starts),
+                                          np.maximum.reduceat(xy[:, 0], starts),
+                                          np.maximum.reduceat(xy[:, 1], starts)])
+                _edge_bounds[key] = bounds
+    return bounds
+
+
+def edge_features(cg, key, z, x, y, properties, id_offset=0):
+    """MVT features for the edges of one network inside tile (z, x, y).
+
+    properties(edges) returns a list of property dicts for the given edge ids.
+    """
+    west, south, east, north = tile_bounds(z, x, y)
+    pad_x = (east - west) * BUFFER / EXTENT
+    pad_y = (north - south) * BUFFER / EXTENT
+    bounds = edge_bounds(cg, key)
+    edges = np.flatnonzero((bounds[:, 2] >= west - pad_x) & (bounds[:, 0] <= east + pad_x) &
+                           (bounds[:, 3] >= south - pad_y) & (bounds[:, 1] <= north + pad_y))
+    if len(edges) == 0:
+        return []
+
+    ptr = np.asarray(cg.geom_ptr)
+    starts, ends = ptr[edges], ptr[edges + 1]
+    sizes = ends - starts
+    index = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+    xy = np.asarray(cg.geom_xy)[index]
+    px, py = to_tile_pixels(xy[:, 0], xy[:, 1], z, x, y)
+    lines = shapely.linestrings(np.column_stack([px, py]), indices=np.repeat(np.arange(len(edges)), sizes))
+    clipped = shapely.clip_by_rect(lines, -BUFFER, -BUFFER, EXTENT + BUFFER, EXTENT + BUFFER)
+
+    features = []
+    keep = np.flatnonzero(~shapely.is_empty(clipped))
+    props = properties(edges[keep])
+    for i, props_i in zip(keep.tolist(), props):
+        geom = clipped[i]
+        parts = []
+        for line in (geom.geoms if hasattr(geom, "geoms") else [geom]):
+            coords = np.round(shapely.get_coordinates(line)).astype(np.int64)
+            # Drop points that collapse onto their predecessor at this zoom
+            if len(coords) > 1:
+                coords = coords[np.r_[True, np.any(np.diff(coords, axis=0) != 0, axis=1)]]
+            if len(coords) >= 2:
+                parts.append(coords)
+        if parts:
+            features.append((id_offset + int(edges[i]), parts, props_i))
+    return features
+
+
+class TileCache:
+    """LRU of encoded tiles with their ETags"""
+
+    def __init__(self, maxsize=TILE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def etag(payload):
+        return hashlib.blake2b(payload, digest_size=12).hexdigest()
+
+    def get(self, key, render):
+        """(etag, payload) for key, calling render() on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        payload = render()
+        entry = (self.etag(payload), payload)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
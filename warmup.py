@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Bounded warm-up of the shared area data, and the readiness state behind /ready.
+
+Under gunicorn the warm-up runs in the master before workers fork (see
+gunicorn.conf.py) and loads everything but the Python search lists; each
+worker then builds its own (warm_process_caches). The dev server runs the
+whole warm-up on a background thread. Steps run in order until the time
+budget is spent; whatever is left is loaded lazily by the first request
+that needs it.
+"""
+
+import os
+import time
+import threading
+
+WARMUP_BUDGET_S = float(os.environ.get("COOLRIDE_WARMUP_BUDGET_S", "60"))
+
+_state = {
+    "status": "cold",          # cold -> warming -> ready | partial | failed
+    "started_at": None,
+    "finished_at": None,
+    "duration_s": None,
+    "completed": [],
+    "skipped": [],
+    "errors": {},
+}
+_lock = threading.Lock()
+
+
+def _import_geo_stack():
+    import geopandas  # noqa: F401
+    from networks import import_osmnx
+    import_osmnx()
+
+
+def _warm_network(name):
+    from networks import load_compact, load_snap_index, load_hierarchy, load_cch
+    # Arrays and the snapping STRtree: shared across fork
+    load_compact(name)
+    load_snap_index(name)
+    load_hierarchy(name)
+    load_cch(name)._directed_arrays()
+
+
+def _warm_search_lists(name):
+    from networks import load_compact, load_hierarchy
+    # Python lists walked by every search: private to the process that builds them
+    cg = load_compact(name)
+    cg.adjacency()
+    load_hierarchy(name)._search_lists()
+
+
+def _warm_buildings(name):
+    from networks import load_buildings, buildings_path
+    if os.path.exists(buildings_path(name)):
+        load_buildings(name)
+
+
+def _warm_trees():
+    from networks import load_tree_index
+    load_tree_index()
+
+
+def _warm_overlays():
+    from networks import available_networks, load_compact
+    from overlays import load_overlays, projected_edges
+    load_overlays()
+    for name in available_networks():
+        projected_edges(load_compact(name), name)
+
+
+def _warm_shade(name):
+    from networks import load_area_shade, load_shade_matrix
+    # A precomputed matrix replaces the per-area tree raster
+    if load_shade_matrix(name) is None:
+        load_area_shade(name)
+
+
+def warm_up_steps(per_process=True):
+    """(label, callable) pairs in the order they are worth paying for;
+    per_process=False leaves out the per-process search lists"""
+    from networks import available_networks
+    names = available_networks()
+    steps = [("imports", _import_geo_stack)]
+    steps += [(f"network:{name}", lambda name=name: _warm_network(name)) for name in names]
+    if per_process:
+        steps += [(f"search:{name}", lambda name=name: _warm_search_lists(name)) for name in names]
+    steps.append(("trees", _warm_trees))
+    steps.append(("overlays", _warm_overlays))
+    steps += [(f"shade:{name}", lambda name=name: _warm_shade(name)) for name in names]
+    steps += [(f"buildings:{name}", lambda name=name: _warm_buildings(name)) for name in names]
+    return steps
+
+
+def warm_up(budget_s=WARMUP_BUDGET_S, per_process=True):
+    """Run warm-up steps until done or the budget runs out; returns the state"""
+    with _lock:
+        if _state["status"] not in ("cold", "failed"):
+            return readiness()
+        _state["status"] = "warming"
+        _state["started_at"] = time.time()
+
+    print(f"🔥 Warming up (budget {budget_s:.0f}s)...")
+    deadline = time.monotonic() + budget_s
+    try:
+        steps = warm_up_steps(per_process)
+    except Exception as e:
+        _state["errors"]["setup"] = str(e)
+        steps = []
+    for label, step in steps:
+        if time.monotonic() > deadline:
+            _state["skipped"].append(label)
+            continue
+        try:
+            step()
+            _state["completed"].append(label)
+        except Exception as e:
+            print(f"   ⚠️ Warm-up step {label} failed: {e}")
+            _state["errors"][label] = str(e)
+
+    _state["finished_at"] = time.time()
+    _state["duration_s"] = round(_state["finished_at"] - _state["started_at"], 3)
+    if _state["skipped"]:
+        _state["status"] = "partial"
+    elif _state["errors"] and not _state["completed"]:
+        _state["status"] = "failed"
+    else:
+        _state["status"] = "ready"
+    print(f"✅ Warm-up {_state['status']} in {_state['duration_s']}s "
+          f"({len(_state['completed'])} done, {len(_state['skipped'])} deferred)")
+    return readiness()
+
+
+def warm_process_caches():
+    """Build this process's search lists for the networks the master loaded (after fork)"""
+    from networks import loaded_networks
+    t0 = time.monotonic()
+    for name in loaded_networks():
+        try:
+            _warm_search_lists(name)
+        except Exception as e:
+            print(f"   ⚠️ Search lists for {name} failed: {e}")
+    print(f"🔥 Worker {os.getpid()} search lists built in {time.monotonic() - t0:.1f}s")
+
+
+def start_background_warm_up(budget_s=WARMUP_BUDGET_S):
+    """Warm up on a daemon thread (dev server / no preload)"""
+    thread = threading.Thread(target=warm_up, args=(budget_s,), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    """True once warm-up has finished; a partial warm-up still serves (lazily)"""
+    return _state["status"] in ("ready", "partial")
+
+
+def readiness():
+    """JSON-able snapshot of the warm-up state"""
+    return {
+        "status": _state["status"],
+        "ready": is_ready(),
+        "duration_s": _state["duration_s"],
+        "completed": len(_state["completed"]),
+        "deferred": list(_state["skipped"]),
+        "errors": dict(_state["errors"]),
+    }
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Thermal weight profiles: how much each kind of cover discounts an edge.
+
+thermal_layers() reduces every edge to a row of FEATURES: the share of its
+length under each kind of cover, with the v5.3 precedence (tree+shadow >
+water > tree > shadow > PCN) and the time-of-day shadow multiplier folded
+in. An edge's cool_cost multiplier is the dot product of its row with a
+profile's weights. The feature matrix is computed once per area and sun
+slot, so a profile costs one matrix-vector product and a batch of profiles
+one matrix product.
+"""
+
+import os
+import json
+import numpy as np
+
+# v5.3 weights (the default profile)
+WEIGHT_PCN = 0.5
+WEIGHT_WATER = 0.55
+WEIGHT_TREE_SHADE = 0.6
+WEIGHT_BUILDING_SHADE = 0.7
+WEIGHT_ULTIMATE = 0.35
+WEIGHT_TREE_AND_BUILDING = 0.45
+WEIGHT_SUN = 1.0
+
+FEATURES = ("tree_and_building", "tree", "building", "pcn", "sun", "water_shaded", "water")
+MIN_WEIGHT = 0.1
+MAX_WEIGHT = 1.0
+MAX_PROFILES = int(os.environ.get("COOLRIDE_MAX_PROFILES", "8"))  # per batched request
+# Under a low sun (before 10:00, after 16:00) building shadows are long: their share of an
+# edge is scaled by this in the factor, making shaded edges cheaper
+LOW_SUN_SHADE_MULTIPLIER = 0.6
+
+PROFILES = {
+    "default": {"tree_and_building": WEIGHT_TREE_AND_BUILDING, "tree": WEIGHT_TREE_SHADE,
+                "building": WEIGHT_BUILDING_SHADE, "pcn": WEIGHT_PCN, "sun": WEIGHT_SUN,
+                "water_shaded": WEIGHT_ULTIMATE, "water": WEIGHT_WATER},
+    # Heat-sensitive riders: long detours for shade are worth it
+    "elderly": {"tree_and_building": 0.3, "tree": 0.4, "building": 0.5, "pcn": 0.45, "sun": 1.0,
+                "water_shaded": 0.25, "water": 0.45},
+    # Time matters most: only small detours for shade
+    "delivery": {"tree_and_building": 0.8, "tree": 0.85, "building": 0.9, "pcn": 0.9, "sun": 1.0,
+                 "water_shaded": 0.75, "water": 0.85},
+    # Park connectors and tree cover, away from traffic
+    "family": {"tree_and_building": 0.4, "tree": 0.5, "building": 0.7, "pcn": 0.35, "sun": 1.0,
+               "water_shaded": 0.3, "water": 0.45},
+}
+
+
+class ProfileError(ValueError):
+    """Invalid profile or weights in a request (HTTP 400)"""
+
+
+class WeightProfile:
+    """Named weight vector over FEATURES"""
+
+    def __init__(self, name, weights):
+        self.name = name
+        self.weights = {feature: float(weights[feature]) for feature in FEATURES}
+        self.vector = np.array([self.weights[feature] for feature in FEATURES])
+
+    @property
+    def key(self):
+        """Hashable identity for cache keys"""
+        return (self.name,) + tuple(self.vector.tolist())
+
+    def detour(self, shade_multiplier=1.0):
+        """Longest cool route, as a multiple of the fast route's length, this profile can
+        prefer when building shadows are scaled by shade_multiplier (feature_matrix)"""
+        lowest = min(min(weight for feature, weight in self.weights.items() if feature != "building"),
+                     shade_multiplier * self.weights["building"])
+        return float(self.vector.max() / lowest)
+
+    def to_dict(self):
+        return {"name": self.name, "weights": dict(self.weights)}
+
+
+DEFAULT_PROFILE = WeightProfile("default", PROFILES["default"])
+
+
+def resolve_profile(spec=None, weights=None):
+    """WeightProfile from a request: a profile name, or {"name": ..., "weights": {...}},
+    plus optional {feature: weight} overrides. Raises ProfileError if invalid."""
+    if isinstance(spec, dict):
+        if not isinstance(spec.get("weights") or {}, dict):
+            raise ProfileError("profile weights must be an object")
+        weights = dict(spec.get("weights") or {}, **(weights or {}))
+        spec = spec.get("name")
+    name = spec or "default"
+    if not isinstance(name, str):
+        raise ProfileError("profile must be a name or an object with name and weights")
+    if not isinstance(weights or {}, dict):
+        raise ProfileError("weights must be an object")
+    base = PROFILES.get(name)
+    if base is None and not weights:
+        raise ProfileError(f"unknown profile '{name}' (known: {', '.join(PROFILES)})")
+    merged = dict(base or PROFILES["default"])
+    for feature, value in (weights or {}).items():
+        if feature not in merged:
+            raise ProfileError(f"unknown weight '{feature}' (known: {', '.join(FEATURES)})")
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ProfileError(f"weight '{feature}' must be a number")
+        if not MIN_WEIGHT <= value <= MAX_WEIGHT:
+            raise ProfileError(f"weight '{feature}' must be between {MIN_WEIGHT} and {MAX_WEIGHT}")
+        merged[feature] = value
+    if merged == base:
+        return DEFAULT_PROFILE if name == "default" else WeightProfile(name, merged)
+    # Custom weights: a new name, or the base profile's name marked as modified
+    return WeightProfile(f"{name}+custom" if base is not None else name, merged)
+
+
+def request_profiles(data):
+    """WeightProfiles a request asks for: `profiles` (a list of names or
+    {name, weights} objects; the first drives the response), else one `profile`
+    with optional `weights` overrides. Query strings pass comma-separated names
+    and weights as JSON. Raises ProfileError if invalid."""
+    specs = data.get("profiles")
+    if specs:
+        if isinstance(specs, str):
+            specs = specs.split(",")
+        if not isinstance(specs, list):
+            raise ProfileError("profiles must be a list")
+        if len(specs) > MAX_PROFILES:
+            raise ProfileError(f"at most {MAX_PROFILES} profiles per request")
+        return [resolve_profile(spec) for spec in specs]
+    weights = data.get("weights")
+    if isinstance(weights, str):
+        try:
+            weights = json.loads(weights)
+        except ValueError:
+            raise ProfileError("weights must be a JSON object")
+    return [resolve_profile(data.get("profile"), weights)]
+
+
+def shade_multiplier(hour):
+    """feature_matrix shade_multiplier for a departure hour"""
+    return LOW_SUN_SHADE_MULTIPLIER if (hour < 10 or hour > 16) else 1.0
+
+
+def feature_matrix(tree_frac, shadow_frac, both_frac, is_pcn, is_water, shade_multiplier=1.0):
+    """(E, len(FEATURES)) share of each edge's length under each kind of cover"""
+    tree_only = tree_frac - both_frac
+    shadow_only = shadow_frac - both_frac
+    open_sky = np.clip(1.0 - tree_frac - shadow_only, 0.0, 1.0)
+    water = np.asarray(is_water, dtype=np.float64)
+    pcn = np.asarray(is_pcn, dtype=np.float64)
+    dry = 1.0 - water
+    return np.column_stack([
+        both_frac * dry,
+        tree_only * dry,
+        shadow_only * shade_multiplier * dry,
+        open_sky * pcn * dry,
+        open_sky * (1.0 - pcn) * dry,
+        both_frac * water,
+        (1.0 - both_frac) * water,
+    ])
+
+
+def profile_matrix(profiles):
+    """(len(FEATURES), P) weights of several profiles, for one batched product"""
+    return np.column_stack([profile.vector for profile in profiles])